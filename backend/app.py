@@ -1,33 +1,143 @@
 from fastapi import FastAPI, status, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager 
+from starlette.websockets import WebSocketClose
+import asyncio
+import threading
+
+from config import GALLERY_SNAPSHOT_ENABLED, GALLERY_SHARED_ENABLED, RECOGNITION_PROFILES, RECOGNITION_PROFILE
 
 # Import database connection functions and route routers
+import database.mongo
 from database.mongo import connect_db, close_db
-from routes import fugitive_routes, recognition_routes
+from routes import fugitive_routes, recognition_routes, job_routes
 # Import the function to load known faces into memory on startup
-from routes.recognition_routes import load_known_faces
+from routes.recognition_routes import load_known_faces, restore_known_faces, reconcile_known_faces
+from recognition.gallery import known_faces
+from recognition.gallery_store import start_snapshot_saver, stop_snapshot_saver
+from recognition.gallery_sync import SharedGalleryStore, shared_gallery_supported, start_sync_maintenance, stop_sync_maintenance
+from recognition.artifact_store import artifact_store
+from recognition.face_detector import prefilter_stats
+from recognition.result_cache import result_cache
+from recognition.models import model_stats
+from recognition.workers import start_worker_pool, shutdown_worker_pool, warm_up_workers, worker_count
+from recognition.video_jobs import start_job_scheduler, stop_job_scheduler
+from metrics import CONTENT_TYPE, Gauge, render_metrics
+from startup import has_failed, is_ready, mark_failed, mark_ready, warmup_status, warmup_step
+
+shared_store = None # Set when the gallery is shared with other worker processes
+
+def start_shared_gallery():
+    """
+    Joins the gallery shared by all worker processes: maps the current shared snapshot and
+    replays its journal. The first process to become leader loads or reconciles the database.
+    """
+    global shared_store
+    shared_store = SharedGalleryStore()
+    known_faces.attach_shared_store(shared_store)
+    shared_store.sync(known_faces)
+    print(f"Joined shared gallery: {len(known_faces)} known faces (generation {shared_store.generation}).")
+    if shared_store.try_become_leader():
+        if len(known_faces) == 0:
+            if not load_known_faces():
+                raise RuntimeError("Could not load the known faces from the database.")
+        else:
+            threading.Thread(target=reconcile_known_faces, daemon=True).start()
+    start_sync_maintenance(known_faces, shared_store)
+
+def load_gallery():
+    """
+    Loads known faces into memory: from the local snapshot if there is one (the database is
+    then reconciled in the background), else with a full database scan.
+    """
+    if GALLERY_SNAPSHOT_ENABLED and GALLERY_SHARED_ENABLED and shared_gallery_supported():
+        start_shared_gallery()
+        return
+    if restore_known_faces():
+        threading.Thread(target=reconcile_known_faces, daemon=True).start()
+    elif not load_known_faces():
+        raise RuntimeError("Could not load the known faces from the database.")
+    if GALLERY_SNAPSHOT_ENABLED:
+        start_snapshot_saver(known_faces)
+
+async def warm_up():
+    """
+    Background warm-up phase: database connection, gallery load, worker processes (which load
+    the models) and the job scheduler. Progress is reported by /api/health/ready; a failure
+    marks the process as failed instead of leaving it running without a gallery.
+    """
+    try:
+        with warmup_step("database"):
+            await asyncio.to_thread(connect_db)
+        with warmup_step("gallery"):
+            await asyncio.to_thread(load_gallery)
+        with warmup_step("worker_pool"):
+            start_worker_pool() # Detection/encoding worker processes
+        with warmup_step("models"):
+            await warm_up_workers()
+        with warmup_step("job_scheduler"):
+            await start_job_scheduler() # Resume queued/interrupted video jobs
+        mark_ready()
+    except Exception as e:
+        mark_failed(e)
 
 # Lifespan Management (Startup/Shutdown) 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Handles startup and shutdown events for the application."""
+    """
+    Handles startup and shutdown events for the application. Startup only schedules the
+    warm-up, so the server answers liveness probes at once; API calls that need the
+    database or gallery get a 503 until it is done.
+    """
     print("Backend starting up...")
+    warm_up_task = asyncio.create_task(warm_up())
     try:
-        # Connect to the database
-        connect_db()
-        # Load known faces into memory cache
-        load_known_faces()
-        print("Startup tasks complete.")
         yield # Application runs
-    except Exception as e:
-        print(f"Error during startup: {e}")
+    finally:
+        print("Backend shutting down...")
+        warm_up_task.cancel()
+        await asyncio.gather(warm_up_task, return_exceptions=True)
+        await stop_job_scheduler()
+        shutdown_worker_pool()
+        if shared_store is not None:
+            stop_sync_maintenance(known_faces, shared_store)
+        elif GALLERY_SNAPSHOT_ENABLED:
+            stop_snapshot_saver(known_faces)
+        artifact_store.clear() # Removes spilled annotated images
+        # Close the database connection on shutdown
+        close_db()
+        print("Shutdown tasks complete.")
+
+# Available before the warm-up is done (probes and monitoring)
+ALWAYS_AVAILABLE_PATHS = ("/api/health/", "/api/status", "/api/metrics")
+
+class ReadinessGate:
+    """
+    ASGI middleware answering API calls with 503 (and Retry-After) until the warm-up is done,
+    instead of letting them stall on, or fail against, a database or gallery not loaded yet.
+    WebSocket connections are closed with 1013 (try again later).
+    """
 
-    print("Backend shutting down...")
-    # Close the database connection on shutdown
-    close_db()
-    print("Shutdown tasks complete.")
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket") and not is_ready():
+            path = scope["path"]
+            if path.startswith("/api/") and not path.startswith(ALWAYS_AVAILABLE_PATHS):
+                if scope["type"] == "websocket":
+                    await WebSocketClose(code=status.WS_1013_TRY_AGAIN_LATER, reason="Service is warming up.")(scope, receive, send)
+                else:
+                    await _not_ready_response()(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+def _not_ready_response() -> JSONResponse:
+    detail = "Service failed to start." if has_failed() else "Service is warming up, try again shortly."
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": detail, "warmup": warmup_status()}, headers={"Retry-After": "5"}
+    )
 
 
 # FastAPI Application Initialization 
@@ -38,6 +148,9 @@ app = FastAPI(
     lifespan=lifespan 
 )
 
+# Inside CORS, so 503 answers during the warm-up carry the CORS headers too
+app.add_middleware(ReadinessGate)
+
 # CORS Middleware
 app.add_middleware(
     CORSMiddleware,
@@ -51,13 +164,56 @@ app.add_middleware(
 
 app.include_router(fugitive_routes.router, prefix="/api", tags=["Fugitives"])
 app.include_router(recognition_routes.router, prefix="/api", tags=["Recognition"])
+app.include_router(job_routes.router, prefix="/api", tags=["Jobs"])
 
 # Root or Status Endpoint
 @app.get("/api/status", summary="Check Backend Status")
 async def get_status():
     """Returns a simple status message to indicate the backend is running."""
     # You could add checks here to see if the DB is connected, etc.
-    return {"status": "Backend is running", "database_connected": database.mongo.client is not None}
+    return {
+        "status": "Backend is running",
+        "database_connected": database.mongo.client is not None,
+        "gallery_size": len(known_faces),
+        "gallery_version": known_faces.version,
+        "gallery_index": known_faces.snapshot().index.stats(),
+        "shared_gallery": shared_store.stats() if shared_store is not None else None,
+        "result_cache": result_cache.stats(),
+        "artifact_store": artifact_store.stats(),
+        "detection_prefilter": prefilter_stats(),
+        "recognition_profiles": {"default": RECOGNITION_PROFILE, "available": RECOGNITION_PROFILES},
+        "warmup": warmup_status(),
+        "models": model_stats()
+    }
+
+@app.get("/api/health/live", summary="Liveness Probe")
+async def get_liveness():
+    """The process is up and serving; fails only once the warm-up has failed (restart it)."""
+    if has_failed():
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "failed", "error": warmup_status()["error"]})
+    return {"status": "alive"}
+
+@app.get("/api/health/ready", summary="Readiness Probe")
+async def get_readiness():
+    """Ready for traffic once the warm-up is done (503 until then), with the gallery and warm-up progress."""
+    warmup = warmup_status()
+    content = {
+        "status": warmup["status"],
+        "gallery_size": len(known_faces),
+        "gallery_version": known_faces.version,
+        "recognition_workers": worker_count(),
+        "warmup": warmup
+    }
+    return JSONResponse(status_code=status.HTTP_200_OK if is_ready() else status.HTTP_503_SERVICE_UNAVAILABLE, content=content)
+
+# Read when /api/metrics is scraped
+Gauge("recognition_gallery_size", "Known faces in this process's gallery.", function=lambda: len(known_faces))
+Gauge("recognition_gallery_version", "Version of this process's gallery.", function=lambda: known_faces.version)
+
+@app.get("/api/metrics", summary="Prometheus Metrics")
+async def get_metrics():
+    """Stage timings, request latencies and counters of this process, in Prometheus text format."""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
 
 # Global Exception Handler 
 @app.exception_handler(Exception)
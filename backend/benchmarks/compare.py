@@ -0,0 +1,67 @@
+"""
+Compares two benchmark reports written by benchmarks.run:
+
+    python -m benchmarks.compare before.json after.json [--threshold 10] [--fail-on-regression]
+
+Latencies (*_ms) that grew and throughputs (*_per_second) that dropped by more than the
+threshold (percent) are flagged as regressions.
+"""
+import argparse
+import json
+import sys
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    """{"stage/size/operation/metric": value} for every latency and throughput in a report."""
+    metrics = {}
+    for key, value in results.items():
+        path = f"{prefix}/{key}" if prefix else key
+        if isinstance(value, dict):
+            metrics.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and (key.endswith("_ms") or key.endswith("_per_second")):
+            metrics[path] = value
+    return metrics
+
+
+def compare(before: dict, after: dict, threshold: float) -> list[tuple]:
+    """(metric, before, after, change %, regressed) for every metric present in both reports."""
+    old, new = flatten(before["results"]), flatten(after["results"])
+    rows = []
+    for metric in sorted(old.keys() & new.keys()):
+        if not old[metric]:
+            continue
+        change = (new[metric] - old[metric]) / old[metric] * 100
+        higher_is_worse = metric.endswith("_ms")
+        regressed = change > threshold if higher_is_worse else change < -threshold
+        rows.append((metric, old[metric], new[metric], change, regressed))
+    return rows
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", default=10.0, type=float, help="Percent change reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 if anything regressed")
+    args = parser.parse_args(argv)
+
+    with open(args.before) as file_object:
+        before = json.load(file_object)
+    with open(args.after) as file_object:
+        after = json.load(file_object)
+
+    print(f"before: {before['environment'].get('commit')} {before['environment'].get('commit_subject')}")
+    print(f"after:  {after['environment'].get('commit')} {after['environment'].get('commit_subject')}")
+    rows = compare(before, after, args.threshold)
+    for metric, old, new, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{metric:<70} {old:>14.4f} {new:>14.4f} {change:>+8.1f}%{flag}")
+
+    regressions = sum(1 for row in rows if row[4])
+    print(f"{len(rows)} metrics compared, {regressions} regression(s) beyond {args.threshold}%.")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import gc
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+
+def percentiles(samples_ms: list[float]) -> dict:
+    """Latency summary (milliseconds) of a list of samples."""
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    if samples.size == 0:
+        return {"count": 0}
+    return {
+        "count": int(samples.size),
+        "mean_ms": round(float(samples.mean()), 4),
+        "min_ms": round(float(samples.min()), 4),
+        "p50_ms": round(float(np.percentile(samples, 50)), 4),
+        "p90_ms": round(float(np.percentile(samples, 90)), 4),
+        "p99_ms": round(float(np.percentile(samples, 99)), 4),
+        "max_ms": round(float(samples.max()), 4)
+    }
+
+
+def measure(func, repeat: int, warmup: int = 1, items_per_call: int = 1, item_name: str = "items", trace_memory: bool = True) -> dict:
+    """
+    Calls func() `warmup` times untimed, then `repeat` times timed. Returns the latency
+    percentiles, the throughput in `item_name`/s (each call processing `items_per_call`)
+    and, with `trace_memory`, the peak Python/numpy allocation of one extra traced call.
+    """
+    for _ in range(warmup):
+        func()
+
+    gc.collect()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    result = percentiles(samples)
+    total_seconds = sum(samples) / 1000
+    if total_seconds > 0:
+        result[f"{item_name}_per_second"] = round(repeat * items_per_call / total_seconds, 2)
+    if trace_memory:
+        result["peak_traced_bytes"] = traced_peak(func)
+    return result
+
+
+def traced_peak(func) -> int:
+    """Peak bytes allocated (Python objects and numpy buffers) while running func() once."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def timed(func):
+    """(result, elapsed milliseconds) of a single call."""
+    started = time.perf_counter()
+    result = func()
+    return result, round((time.perf_counter() - started) * 1000, 4)
+
+
+def peak_rss_bytes() -> int:
+    """High-water mark of the resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024 # Linux reports kilobytes
+
+
+def environment() -> dict:
+    """Where the results come from, so runs can be compared across commits and machines."""
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+        except Exception:
+            return None
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "commit_subject": git("log", "-1", "--format=%s"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": __import__("os").cpu_count(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    }
@@ -0,0 +1,124 @@
+import copy
+import itertools
+import pymongo
+import pymongo.errors
+from bson.objectid import ObjectId
+
+
+class _InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class _BulkWriteResult:
+    def __init__(self, modified_count: int):
+        self.modified_count = modified_count
+
+
+def _matches(doc: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            for operator, operand in condition.items():
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$type" and (operand == "array") != isinstance(value, list):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(doc: dict, projection: dict | None) -> dict:
+    if not projection:
+        return copy.copy(doc)
+    if any(projection.values()):
+        return {k: v for k, v in doc.items() if projection.get(k) or k == "_id"}
+    return {k: v for k, v in doc.items() if k not in projection}
+
+
+class _Cursor:
+    def __init__(self, docs: list[dict], projection: dict | None):
+        self._docs = docs
+        self._projection = projection
+        self._skip = 0
+        self._limit = None
+
+    def sort(self, key: str, direction: int = 1):
+        self._docs = sorted(self._docs, key=lambda d: d[key], reverse=direction < 0)
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def __iter__(self):
+        stop = None if self._limit is None else self._skip + self._limit
+        for doc in itertools.islice(self._docs, self._skip, stop):
+            yield _project(doc, self._projection)
+
+
+class MemoryCollection:
+    """
+    In-process stand-in for the fugitives collection, implementing just the pymongo calls
+    database/mongo.py makes. Lets the benchmarks exercise the real database code offline.
+    """
+
+    def __init__(self):
+        self._docs = {} # _id -> document, in insertion (= _id) order
+
+    def insert_one(self, document: dict) -> _InsertOneResult:
+        document.setdefault("_id", ObjectId())
+        self._docs[document["_id"]] = copy.copy(document)
+        return _InsertOneResult(document["_id"])
+
+    def insert_many(self, documents: list[dict], ordered: bool = True):
+        errors = []
+        for index, document in enumerate(documents):
+            document.setdefault("_id", ObjectId())
+            if document["_id"] in self._docs:
+                errors.append({"index": index, "errmsg": "E11000 duplicate key error"})
+                if ordered:
+                    break
+                continue
+            self._docs[document["_id"]] = copy.copy(document)
+        if errors:
+            raise pymongo.errors.BulkWriteError({"writeErrors": errors})
+
+    def find(self, query: dict | None = None, projection: dict | None = None, batch_size: int | None = None, sort=None) -> _Cursor:
+        cursor = _Cursor([d for d in self._docs.values() if _matches(d, query or {})], projection)
+        for key, direction in sort or []:
+            cursor.sort(key, direction)
+        return cursor
+
+    def find_one(self, query: dict | None = None, projection: dict | None = None, sort=None) -> dict | None:
+        return next(iter(self.find(query, projection, sort=sort)), None)
+
+    def find_one_and_delete(self, query: dict, projection: dict | None = None) -> dict | None:
+        found = self.find_one(query)
+        if found is None:
+            return None
+        return _project(self._docs.pop(found["_id"]), projection)
+
+    def estimated_document_count(self) -> int:
+        return len(self._docs)
+
+    def count_documents(self, query: dict) -> int:
+        return sum(1 for d in self._docs.values() if _matches(d, query))
+
+    def bulk_write(self, requests: list[pymongo.UpdateOne], ordered: bool = True) -> _BulkWriteResult:
+        modified = 0
+        for request in requests:
+            # pymongo keeps the operation as (_filter, _doc); the migration filters by _id
+            doc = self._docs.get(request._filter.get("_id"))
+            if doc is not None and _matches(doc, request._filter):
+                doc.update(request._doc["$set"])
+                modified += 1
+        return _BulkWriteResult(modified)
+
+    def drop(self):
+        self._docs.clear()
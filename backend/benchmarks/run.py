@@ -0,0 +1,362 @@
+"""
+Benchmarks for the recognition pipeline. Runs offline: the database is an in-memory stand-in
+for the fugitives collection, galleries are random embeddings and images/videos are generated.
+
+    cd backend
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --stages gallery,load --sizes 1k,100k,1M --output bench-1m.json
+    python -m benchmarks.compare before.json after.json
+
+Stages:
+    gallery   index build, search latency (1 and 8 faces per query), find_best_match_index,
+              recall of the (approximate) index against exact search
+    quantization
+              the configured index with float32, float16 and int8 first-pass scans: memory
+              of the scanned structures, search latency and recall against exact search
+    load      load_known_faces() from the database stand-in, snapshot save and restore
+    detect    detect_faces_in_frame() per resolution, full size and downscaled, and on an
+              empty scene with and without the Haar cascade pre-filter
+    encode    get_face_encodings_from_frame() with 1 and 4 faces
+    profiles  detection and encoding of one frame per resolution with each recognition profile
+              (RECOGNITION_PROFILES), and the faces each one finds
+    endpoint  POST /api/recognize/ with an image (uncached, cached) and a video, and the
+              first fetch of an annotated image
+
+Generated media contain no real faces unless --face-image points to a face photo, which is
+pasted into every image and video frame; without it detection runs on face-less frames and
+the encoder on given boxes. Results (latency percentiles, throughput, peak memory) are
+written as JSON together with the commit they were measured on.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+import cv2
+import numpy as np
+
+from benchmarks.harness import environment, measure, peak_rss_bytes, timed, traced_peak
+from benchmarks.memory_collection import MemoryCollection
+from benchmarks.synthetic import encode_jpeg, load_face, random_gallery, random_probes, synthetic_image, synthetic_video
+
+STAGES = ("gallery", "quantization", "load", "detect", "encode", "profiles", "endpoint")
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    multiplier = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+
+def parse_resolution(text: str) -> tuple[int, int]:
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def synthetic_infos(size: int) -> list[dict]:
+    from recognition.gallery import make_face_info
+    return [make_face_info(f"{row:024x}", f"Person {row}", 30, "unknown", "synthetic.jpg") for row in range(size)]
+
+
+@contextmanager
+def patched(module, name: str, value):
+    """Temporarily overrides a module-level setting (e.g. to keep snapshots out of uploads/)."""
+    original = getattr(module, name)
+    setattr(module, name, value)
+    try:
+        yield
+    finally:
+        setattr(module, name, original)
+
+
+def bench_gallery(size: int, args) -> dict:
+    from recognition.face_matcher import BruteForceIndex, find_best_match_index
+    from recognition.gallery import FaceGallery
+
+    matrix = random_gallery(size)
+    probes, sources = random_probes(matrix, args.queries)
+    infos = synthetic_infos(size)
+    gallery = FaceGallery()
+    _, build_ms = timed(lambda: gallery.replace(matrix, infos))
+    snapshot = gallery.snapshot()
+
+    rows = itertools.cycle(range(0, max(1, len(probes) - 8)))
+    result = {
+        "index": type(snapshot.index).__name__,
+        "build_ms": build_ms,
+        "build_peak_traced_bytes": traced_peak(lambda: FaceGallery().replace(matrix, infos)) if args.trace_build else None,
+        "search_1": measure(lambda: snapshot.search(probes[(row := next(rows)):row + 1]), args.repeat, item_name="faces"),
+        "search_8": measure(lambda: snapshot.search(probes[(row := next(rows)):row + 8]), args.repeat, items_per_call=8, item_name="faces"),
+        "find_best_match_index": measure(
+            lambda: find_best_match_index(probes[next(rows)], matrix), max(1, args.repeat // 4), item_name="faces", trace_memory=False
+        ),
+    }
+
+    # Quality next to speed, so approximate or quantized search cannot silently trade recall away
+    indices, _ = snapshot.search(probes)
+    exact_indices, _ = BruteForceIndex(matrix).search(probes)
+    result.update(match_quality(indices, exact_indices, sources))
+    return result
+
+
+def match_quality(indices: np.ndarray, exact_indices: np.ndarray, sources: np.ndarray) -> dict:
+    """Agreement with exact search, and match rates of enrolled / unknown probes."""
+    exact_matched = exact_indices >= 0
+    enrolled = sources >= 0
+    return {
+        "recall_vs_exact": round(float((indices[exact_matched] == exact_indices[exact_matched]).mean()), 4) if exact_matched.any() else None,
+        "true_match_rate": round(float((indices[enrolled] == sources[enrolled]).mean()), 4) if enrolled.any() else None,
+        "false_match_rate": round(float((indices[~enrolled] >= 0).mean()), 4) if (~enrolled).any() else None
+    }
+
+
+def bench_quantization(size: int, args) -> dict:
+    from config import ANN_INDEX_TYPE
+    from recognition.face_matcher import QUANTIZATION_TYPES, BruteForceIndex, build_index
+
+    matrix = random_gallery(size)
+    probes, sources = random_probes(matrix, args.queries)
+    exact_indices, _ = BruteForceIndex(matrix).search(probes)
+    rows = itertools.cycle(range(0, max(1, len(probes) - 8)))
+    result = {}
+    for quantization in QUANTIZATION_TYPES:
+        # min_ann_size=0: the trade-off is measured even below the size that switches indexing on
+        index, build_ms = timed(lambda: build_index(matrix, index_type=ANN_INDEX_TYPE, min_ann_size=0, quantization=quantization))
+        indices, _ = index.search(probes)
+        result[quantization] = {
+            **index.stats(),
+            "build_ms": build_ms,
+            "search_8": measure(lambda: index.search(probes[(row := next(rows)):row + 8]), args.repeat, items_per_call=8, item_name="faces"),
+            **match_quality(indices, exact_indices, sources)
+        }
+        del index
+    return result
+
+
+def bench_load(size: int, args) -> dict:
+    import database.mongo as mongo
+    from recognition.gallery import known_faces
+    from recognition.gallery_store import load_gallery_snapshot, save_gallery_snapshot
+    from routes import recognition_routes
+
+    collection = MemoryCollection()
+    matrix = random_gallery(size)
+    for start in range(0, size, 10000):
+        collection.insert_many([
+            mongo.fugitive_document(f"Person {row}", 30, "unknown", "synthetic.jpg", matrix[row])
+            for row in range(start, min(size, start + 10000))
+        ])
+
+    result = {}
+    with patched(mongo, "fugitives_collection", collection), patched(recognition_routes, "GALLERY_SNAPSHOT_ENABLED", False):
+        result["load_fugitive_embeddings"] = measure(mongo.load_fugitive_embeddings, args.load_repeat, warmup=0, items_per_call=size, item_name="faces")
+        result["load_known_faces"] = measure(recognition_routes.load_known_faces, args.load_repeat, warmup=0, items_per_call=size, item_name="faces")
+
+    snapshot = known_faces.snapshot()
+    with tempfile.TemporaryDirectory() as folder:
+        result["snapshot_save"] = measure(
+            lambda: save_gallery_snapshot(snapshot, folder), args.load_repeat, warmup=0, items_per_call=size, item_name="faces", trace_memory=False
+        )
+
+        def restore():
+            stored = load_gallery_snapshot(folder)
+            known_faces.replace(stored["matrix"], stored["infos"], adopt=True, centroids=stored["centroids"], index=stored["index"])
+
+        result["snapshot_restore"] = measure(restore, args.load_repeat, warmup=0, items_per_call=size, item_name="faces")
+        known_faces.replace(np.empty((0, matrix.shape[1]), dtype=np.float32), []) # Drop the memory map before the folder goes
+    return result
+
+
+def bench_detect(resolution: tuple[int, int], args, face) -> dict:
+    from config import DETECTION_SCALE
+    from recognition.face_detector import detect_faces_in_frame, prefilter_stats
+
+    width, height = resolution
+    image, _ = synthetic_image(width, height, args.faces, face)
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    result = {
+        "faces_found": len(detect_faces_in_frame(rgb_image, detection_scale=1.0, prefilter=False)),
+        "faces_found_prefiltered": len(detect_faces_in_frame(rgb_image, detection_scale=1.0, prefilter=True))
+    }
+    result["full_scale"] = measure(lambda: detect_faces_in_frame(rgb_image, detection_scale=1.0, prefilter=False), args.repeat, item_name="frames")
+    result["full_scale_prefiltered"] = measure(lambda: detect_faces_in_frame(rgb_image, detection_scale=1.0, prefilter=True), args.repeat, item_name="frames")
+    for scale in sorted({DETECTION_SCALE, 0.5} - {1.0}):
+        result[f"scale_{scale}"] = measure(lambda: detect_faces_in_frame(rgb_image, detection_scale=scale, prefilter=False), args.repeat, item_name="frames")
+
+    # Most sampled CCTV frames show nobody: the pre-filter should reject them cheaply
+    empty, _ = synthetic_image(width, height, 0)
+    rgb_empty = cv2.cvtColor(empty, cv2.COLOR_BGR2RGB)
+    result["empty_scene"] = measure(lambda: detect_faces_in_frame(rgb_empty, detection_scale=1.0, prefilter=False), args.repeat, item_name="frames")
+    result["empty_scene_prefiltered"] = measure(lambda: detect_faces_in_frame(rgb_empty, detection_scale=1.0, prefilter=True), args.repeat, item_name="frames")
+    result["prefilter"] = prefilter_stats()
+    return result
+
+
+def bench_encode(args, face) -> dict:
+    from recognition.face_encoder import get_face_encodings_from_frame
+
+    result = {}
+    for num_faces in (1, 4):
+        image, boxes = synthetic_image(1280, 720, num_faces, face)
+        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        result[f"faces_{num_faces}"] = measure(
+            lambda: get_face_encodings_from_frame(rgb_image, boxes), args.repeat, items_per_call=num_faces, item_name="faces"
+        )
+    return result
+
+
+def bench_profiles(resolution: tuple[int, int], args, face) -> dict:
+    from config import RECOGNITION_PROFILES
+    from recognition.face_detector import detect_faces_in_frame
+    from recognition.face_encoder import get_face_encodings_from_frame
+    from recognition.profiles import resolve_profile, profile_detection_options, profile_encoding_options
+
+    width, height = resolution
+    image, boxes = synthetic_image(width, height, args.faces, face)
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    result = {}
+    for name in RECOGNITION_PROFILES:
+        profile = resolve_profile(name)
+        detection_options, encoding_options = profile_detection_options(profile), profile_encoding_options(profile)
+        found = detect_faces_in_frame(rgb_image, **detection_options)
+        # Encoding cost is measured on the generated boxes, so every profile encodes the same faces
+        result[name] = {
+            "faces_found": len(found),
+            "detect": measure(lambda: detect_faces_in_frame(rgb_image, **detection_options), args.repeat, item_name="frames"),
+            "encode": measure(
+                lambda: get_face_encodings_from_frame(rgb_image, boxes, **encoding_options), args.repeat,
+                items_per_call=max(1, len(boxes)), item_name="faces"
+            )
+        }
+    return result
+
+
+def bench_endpoint(args, face) -> dict:
+    try:
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+    except ImportError as e: # TestClient needs httpx
+        return {"skipped": str(e)}
+    from recognition.gallery import known_faces
+    from recognition.result_cache import result_cache
+    from recognition.workers import start_worker_pool, shutdown_worker_pool
+    from routes import recognition_routes
+
+    matrix = random_gallery(args.endpoint_gallery_size)
+    known_faces.replace(matrix, synthetic_infos(len(matrix)))
+    app = FastAPI()
+    app.include_router(recognition_routes.router, prefix="/api")
+    client = TestClient(app)
+    start_worker_pool(args.workers)
+    result = {"gallery_size": len(matrix), "workers": args.workers}
+    try:
+        image, _ = synthetic_image(1280, 720, args.faces, face)
+        jpeg = encode_jpeg(image)
+
+        def recognize(data: bytes, filename: str, mime_type: str, use_cache: bool) -> dict:
+            response = client.post("/api/recognize/", files={"file": (filename, data, mime_type)}, data={"use_cache": str(use_cache).lower()})
+            response.raise_for_status()
+            return response.json()
+
+        result["image_uncached"] = measure(lambda: recognize(jpeg, "bench.jpg", "image/jpeg", False), args.repeat, item_name="images", trace_memory=False)
+        result["image_cached"] = measure(lambda: recognize(jpeg, "bench.jpg", "image/jpeg", True), args.repeat, item_name="images", trace_memory=False)
+        annotated_url = recognize(jpeg, "bench.jpg", "image/jpeg", False)["annotated_image_url"]
+        _, result["annotated_first_fetch_ms"] = timed(lambda: client.get(annotated_url).raise_for_status())
+        _, result["annotated_second_fetch_ms"] = timed(lambda: client.get(annotated_url).raise_for_status())
+
+        with tempfile.TemporaryDirectory() as folder:
+            video_path = synthetic_video(os.path.join(folder, "bench.avi"), seconds=args.video_seconds, num_faces=args.faces, face=face)
+            with open(video_path, "rb") as file_object:
+                video = file_object.read()
+        first = recognize(video, "bench.avi", "video/x-msvideo", False)
+        result["video_decode_stats"] = first.get("decode_stats")
+        result["video_tracking_stats"] = first.get("tracking_stats")
+        frames = first["decode_stats"]["frames_sampled"]
+        result["video_uncached"] = measure(
+            lambda: recognize(video, "bench.avi", "video/x-msvideo", False), max(1, args.repeat // 10), warmup=0,
+            items_per_call=frames, item_name="frames", trace_memory=False
+        )
+        result["result_cache"] = result_cache.stats()
+    finally:
+        shutdown_worker_pool()
+    return result
+
+
+def run(args) -> dict:
+    stages = args.stages.split(",")
+    face = load_face(args.face_image)
+    report = {"environment": environment(), "settings": vars(args), "results": {}}
+    results = report["results"]
+
+    for stage in stages:
+        started = time.perf_counter()
+        print(f"Benchmark stage: {stage}")
+        if stage == "gallery":
+            results[stage] = {str(size): bench_gallery(size, args) for size in args.sizes}
+        elif stage == "quantization":
+            results[stage] = {str(size): bench_quantization(size, args) for size in args.sizes}
+        elif stage == "load":
+            results[stage] = {str(size): bench_load(size, args) for size in args.sizes if size <= args.max_load_size}
+        elif stage == "detect":
+            results[stage] = {f"{w}x{h}": bench_detect((w, h), args, face) for w, h in args.resolutions}
+        elif stage == "encode":
+            results[stage] = bench_encode(args, face)
+        elif stage == "profiles":
+            results[stage] = {f"{w}x{h}": bench_profiles((w, h), args, face) for w, h in args.resolutions}
+        elif stage == "endpoint":
+            results[stage] = bench_endpoint(args, face)
+        else:
+            raise ValueError(f"Unknown stage {stage!r}; expected one of {', '.join(STAGES)}")
+        print(f"  done in {time.perf_counter() - started:.1f} s")
+
+    report["peak_rss_bytes"] = peak_rss_bytes()
+    return report
+
+
+def print_summary(report: dict, prefix: str = ""):
+    """One line per measured operation: p50/p99 latency and throughput."""
+    for key, value in report.items():
+        if not isinstance(value, dict):
+            continue
+        if "p50_ms" in value:
+            throughput = ", ".join(f"{k} {v}" for k, v in value.items() if k.endswith("_per_second"))
+            print(f"{prefix}{key:<28} p50 {value['p50_ms']:>10.3f} ms   p99 {value['p99_ms']:>10.3f} ms   {throughput}")
+        else:
+            print(f"{prefix}{key}")
+            print_summary(value, prefix + "  ")
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Benchmark the recognition pipeline offline.")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of: {', '.join(STAGES)}")
+    parser.add_argument("--sizes", default="1k,10k,100k", type=lambda s: [parse_size(x) for x in s.split(",")], help="Gallery sizes, e.g. 1k,10k,100k,1M")
+    parser.add_argument("--max-load-size", default=parse_size("1M"), type=parse_size, help="Largest gallery loaded through the database stand-in")
+    parser.add_argument("--resolutions", default="640x480,1280x720,1920x1080", type=lambda s: [parse_resolution(x) for x in s.split(",")])
+    parser.add_argument("--queries", default=2000, type=int, help="Probe embeddings per gallery (recall is measured on all of them)")
+    parser.add_argument("--repeat", default=50, type=int, help="Timed calls per measurement")
+    parser.add_argument("--load-repeat", default=3, type=int, help="Timed calls per load/snapshot measurement")
+    parser.add_argument("--faces", default=1, type=int, help="Faces per generated image/frame")
+    parser.add_argument("--face-image", default=None, help="Face photo pasted into generated media so detection finds faces")
+    parser.add_argument("--endpoint-gallery-size", default=parse_size("10k"), type=parse_size)
+    parser.add_argument("--video-seconds", default=10.0, type=float)
+    parser.add_argument("--workers", default=2, type=int, help="Worker processes for the endpoint stage")
+    parser.add_argument("--trace-build", action="store_true", help="Also measure peak memory of the index build (slow at 1M)")
+    parser.add_argument("--output", default=None, help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_summary(report["results"])
+    print(f"peak RSS {report['peak_rss_bytes'] / 2**20:.1f} MiB")
+    if args.output:
+        with open(args.output, "w") as file_object:
+            json.dump(report, file_object, indent=2, default=str)
+        print(f"Wrote {args.output}")
+    else:
+        json.dump(report, sys.stdout, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
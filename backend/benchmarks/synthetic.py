@@ -0,0 +1,103 @@
+import os
+import cv2
+import numpy as np
+
+from recognition.face_matcher import ENCODING_DIMENSIONS
+
+# Scale of the random embeddings: independent rows end up about 0.9 apart and probes of an
+# enrolled identity about 0.35 from it, the typical dlib distances for different/same people
+_EMBEDDING_STD = 0.9 / np.sqrt(2 * ENCODING_DIMENSIONS)
+_PROBE_NOISE_STD = 0.35 / np.sqrt(ENCODING_DIMENSIONS)
+
+
+def random_gallery(size: int, seed: int = 0) -> np.ndarray:
+    """(size x 128) float32 embeddings of `size` distinct synthetic identities."""
+    rng = np.random.default_rng(seed)
+    gallery = np.empty((size, ENCODING_DIMENSIONS), dtype=np.float32)
+    for start in range(0, size, 100000): # Chunked, so 1M rows never need a float64 copy
+        stop = min(size, start + 100000)
+        gallery[start:stop] = rng.normal(0.0, _EMBEDDING_STD, (stop - start, ENCODING_DIMENSIONS))
+    return gallery
+
+
+def random_probes(gallery: np.ndarray, count: int, enrolled_fraction: float = 0.5, seed: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Query embeddings: a share of them are noisy views of gallery rows (expected to match),
+    the rest are unknown people. Returns (probes, source row per probe or -1).
+    """
+    rng = np.random.default_rng(seed)
+    sources = np.where(rng.random(count) < enrolled_fraction, rng.integers(0, len(gallery), count), -1)
+    probes = rng.normal(0.0, _EMBEDDING_STD, (count, ENCODING_DIMENSIONS)).astype(np.float32)
+    enrolled = sources >= 0
+    probes[enrolled] = gallery[sources[enrolled]] + rng.normal(0.0, _PROBE_NOISE_STD, (int(enrolled.sum()), ENCODING_DIMENSIONS))
+    return probes, sources
+
+
+def _background(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    """Smooth textured BGR background (upscaled noise), cheap to generate at any size."""
+    small = rng.integers(0, 256, (max(2, height // 40), max(2, width // 40), 3), dtype=np.uint8)
+    return cv2.GaussianBlur(cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC), (0, 0), 3)
+
+
+def face_boxes(width: int, height: int, num_faces: int, face_size: int | None = None, offset: int = 0) -> list[tuple]:
+    """(top, right, bottom, left) locations of `num_faces` faces laid out on a row."""
+    face_size = face_size or max(48, min(width, height) // 5)
+    gap = max(1, (width - num_faces * face_size) // (num_faces + 1))
+    top = max(0, min(height - face_size, height // 3 + offset // 3))
+    boxes = []
+    for i in range(num_faces):
+        left = max(0, min(width - face_size, gap + i * (face_size + gap) + offset))
+        boxes.append((top, left + face_size, top + face_size, left))
+    return boxes
+
+
+def synthetic_image(width: int, height: int, num_faces: int = 0, face: np.ndarray | None = None, seed: int = 0, offset: int = 0) -> tuple[np.ndarray, list[tuple]]:
+    """
+    A generated BGR image and the face locations in it. With a `face` photo (BGR), it is pasted
+    at each location so detection finds real faces; without one the locations are still
+    returned, for benchmarking the encoder on given boxes.
+    """
+    image = _background(width, height, np.random.default_rng(seed))
+    boxes = face_boxes(width, height, num_faces, offset=offset)
+    if face is not None:
+        for top, right, bottom, left in boxes:
+            image[top:bottom, left:right] = cv2.resize(face, (right - left, bottom - top), interpolation=cv2.INTER_AREA)
+    return image, boxes
+
+
+def encode_jpeg(image: np.ndarray) -> bytes:
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def load_face(path: str | None) -> np.ndarray | None:
+    """A face photo to paste into generated media (cropped to its largest square)."""
+    if not path:
+        return None
+    face = cv2.imread(path)
+    if face is None:
+        raise ValueError(f"Could not read face image {path}")
+    side = min(face.shape[:2])
+    top, left = (face.shape[0] - side) // 2, (face.shape[1] - side) // 2
+    return face[top:top + side, left:left + side]
+
+
+def synthetic_video(
+    path: str, width: int = 640, height: int = 480, fps: float = 30.0, seconds: float = 10.0,
+    num_faces: int = 1, face: np.ndarray | None = None, static_fraction: float = 0.5
+) -> str:
+    """
+    Writes an MJPG .avi of moving faces over a fixed background. The first `static_fraction`
+    of the video is a still scene (exercises motion gating), the rest pans the faces.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    total = max(1, int(fps * seconds))
+    static_frames = int(total * static_fraction)
+    try:
+        for frame_index in range(total):
+            offset = 0 if frame_index < static_frames else (frame_index - static_frames) * 2 % max(1, width // 3)
+            frame, _ = synthetic_image(width, height, num_faces, face, seed=0, offset=offset)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
@@ -0,0 +1,241 @@
+import json
+import sqlite3
+import threading
+import time
+from config import JOBS_DB_PATH
+
+# Local persistent queue for video recognition jobs (SQLite, so queued and partially
+# processed jobs survive a restart). Results are stored one row per processed frame.
+# Several worker processes share the database: a process runs a job only after claiming it
+# (queued -> running with itself as owner, atomically) and keeps renewing the claim's lease;
+# cancellation is a flag the owner polls.
+
+_connection = None
+_lock = threading.Lock()
+
+JOB_STATUSES = ("queued", "running", "completed", "failed", "cancelled")
+ACTIVE_STATUSES = ("queued", "running")
+
+_JOB_FIELDS = (
+    "job_id", "status", "filename", "video_path", "sample_interval_ms", "frames_total", "frames_done",
+    "last_frame_index", "fps", "error", "gallery_version", "created_at", "started_at", "finished_at",
+    "owner", "lease_expires", "cancel_requested"
+)
+_ADDED_COLUMNS = {"owner": "TEXT", "lease_expires": "REAL", "cancel_requested": "INTEGER NOT NULL DEFAULT 0"} # Not in older databases
+
+
+def connect_job_store(db_path: str = JOBS_DB_PATH):
+    """Opens (and if needed creates) the job database."""
+    global _connection
+    with _lock:
+        if _connection is not None:
+            return
+        _connection = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                filename TEXT,
+                video_path TEXT NOT NULL,
+                sample_interval_ms REAL,
+                frames_total INTEGER,
+                frames_done INTEGER NOT NULL DEFAULT 0,
+                last_frame_index INTEGER NOT NULL DEFAULT -1,
+                fps REAL,
+                error TEXT,
+                gallery_version INTEGER,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                owner TEXT,
+                lease_expires REAL,
+                cancel_requested INTEGER NOT NULL DEFAULT 0
+            )""")
+        columns = {row[1] for row in _connection.execute("PRAGMA table_info(jobs)")}
+        for column, definition in _ADDED_COLUMNS.items():
+            if column not in columns:
+                _connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+        _connection.execute("""
+            CREATE TABLE IF NOT EXISTS job_results (
+                job_id TEXT NOT NULL,
+                frame_index INTEGER NOT NULL,
+                timestamp_ms REAL,
+                faces TEXT NOT NULL,
+                PRIMARY KEY (job_id, frame_index)
+            )""")
+        _connection.commit()
+        print(f"Job store opened at {db_path}")
+
+
+def close_job_store():
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+            print("Job store closed.")
+
+
+def _require_connection():
+    if _connection is None:
+        raise ConnectionError("Job store not connected. Call connect_job_store() first.")
+    return _connection
+
+
+def _row_to_job(row) -> dict | None:
+    return dict(zip(_JOB_FIELDS, row)) if row else None
+
+
+def create_job(job_id: str, filename: str, video_path: str, sample_interval_ms: float | None) -> dict:
+    conn = _require_connection()
+    with _lock:
+        conn.execute(
+            "INSERT INTO jobs (job_id, status, filename, video_path, sample_interval_ms, created_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+            (job_id, filename, video_path, sample_interval_ms, time.time())
+        )
+        conn.commit()
+    return get_job(job_id)
+
+
+def get_job(job_id: str) -> dict | None:
+    conn = _require_connection()
+    with _lock:
+        row = conn.execute(f"SELECT {', '.join(_JOB_FIELDS)} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return _row_to_job(row)
+
+
+def list_jobs(statuses: tuple = JOB_STATUSES, limit: int = 100) -> list[dict]:
+    conn = _require_connection()
+    placeholders = ", ".join("?" for _ in statuses)
+    with _lock:
+        rows = conn.execute(
+            f"SELECT {', '.join(_JOB_FIELDS)} FROM jobs WHERE status IN ({placeholders}) ORDER BY created_at LIMIT ?",
+            (*statuses, limit)
+        ).fetchall()
+    return [_row_to_job(row) for row in rows]
+
+
+def count_jobs(statuses: tuple) -> int:
+    conn = _require_connection()
+    placeholders = ", ".join("?" for _ in statuses)
+    with _lock:
+        return conn.execute(f"SELECT COUNT(*) FROM jobs WHERE status IN ({placeholders})", statuses).fetchone()[0]
+
+
+def update_job(job_id: str, **fields):
+    unknown = set(fields) - set(_JOB_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+    conn = _require_connection()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with _lock:
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+        conn.commit()
+
+
+def update_owned_job(job_id: str, owner: str, **fields) -> bool:
+    """update_job() only if `owner` still holds the job's claim; False if it lost it."""
+    unknown = set(fields) - set(_JOB_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+    conn = _require_connection()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with _lock:
+        updated = conn.execute(
+            f"UPDATE jobs SET {assignments} WHERE job_id = ? AND owner = ? AND status = 'running'", (*fields.values(), job_id, owner)
+        ).rowcount
+        conn.commit()
+    return updated == 1
+
+
+def claim_job(job_id: str, owner: str, lease_seconds: float) -> bool:
+    """Atomically moves a queued job to running for `owner`. False if it is not queued (anymore)."""
+    conn = _require_connection()
+    with _lock:
+        claimed = conn.execute(
+            "UPDATE jobs SET status = 'running', owner = ?, lease_expires = ? WHERE job_id = ? AND status = 'queued'",
+            (owner, time.time() + lease_seconds, job_id)
+        ).rowcount
+        conn.commit()
+    return claimed == 1
+
+
+def renew_job_lease(job_id: str, owner: str, lease_seconds: float) -> dict | None:
+    """Extends `owner`'s claim on a running job; returns the job, or None if the claim was lost."""
+    if not update_owned_job(job_id, owner, lease_expires=time.time() + lease_seconds):
+        return None
+    return get_job(job_id)
+
+
+def release_job(job_id: str, owner: str) -> bool:
+    """Puts a job `owner` is running back in the queue (e.g. on shutdown), to be resumed by any process."""
+    return update_owned_job(job_id, owner, status="queued", owner=None, lease_expires=None)
+
+
+def requeue_expired_jobs() -> list[str]:
+    """Re-queues running jobs whose owner stopped renewing the lease (the process died). Returns their IDs."""
+    conn = _require_connection()
+    now = time.time()
+    with _lock:
+        rows = conn.execute(
+            "SELECT job_id FROM jobs WHERE status = 'running' AND (lease_expires IS NULL OR lease_expires < ?)", (now,)
+        ).fetchall()
+        requeued = []
+        for (job_id,) in rows:
+            # Re-checked in the UPDATE: the owner may have renewed the lease in between
+            if conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, lease_expires = NULL "
+                "WHERE job_id = ? AND status = 'running' AND (lease_expires IS NULL OR lease_expires < ?)", (job_id, now)
+            ).rowcount:
+                requeued.append(job_id)
+        conn.commit()
+    return requeued
+
+
+def request_job_cancel(job_id: str) -> str | None:
+    """
+    Cancels a queued job at once ("cancelled"), or flags a running one for its owner, in any
+    process, to stop ("cancel_requested"). None if the job is not active.
+    """
+    conn = _require_connection()
+    with _lock:
+        outcome = None
+        if conn.execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE job_id = ? AND status = 'queued'", (time.time(), job_id)
+        ).rowcount:
+            outcome = "cancelled"
+        elif conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND status = 'running'", (job_id,)).rowcount:
+            outcome = "cancel_requested"
+        conn.commit()
+    return outcome
+
+
+def append_frame_result(job_id: str, owner: str, frame_index: int, timestamp_ms: float, faces: list, fps: float | None) -> bool:
+    """
+    Stores one frame's results and advances the job's resume point in one transaction, if
+    `owner` still holds the job's claim. False (nothing written) if it lost it.
+    """
+    conn = _require_connection()
+    with _lock:
+        advanced = conn.execute(
+            "UPDATE jobs SET frames_done = frames_done + 1, last_frame_index = ?, fps = ? WHERE job_id = ? AND owner = ? AND status = 'running'",
+            (frame_index, fps, job_id, owner)
+        ).rowcount
+        if advanced:
+            conn.execute(
+                "INSERT OR REPLACE INTO job_results (job_id, frame_index, timestamp_ms, faces) VALUES (?, ?, ?, ?)",
+                (job_id, frame_index, timestamp_ms, json.dumps(faces))
+            )
+        conn.commit()
+    return advanced == 1
+
+
+def get_frame_results(job_id: str, offset: int = 0, limit: int = 500) -> list[dict]:
+    conn = _require_connection()
+    with _lock:
+        rows = conn.execute(
+            "SELECT frame_index, timestamp_ms, faces FROM job_results WHERE job_id = ? ORDER BY frame_index LIMIT ? OFFSET ?",
+            (job_id, limit, offset)
+        ).fetchall()
+    return [{"frame_index": frame_index, "timestamp_ms": timestamp_ms, "faces": json.loads(faces)} for frame_index, timestamp_ms, faces in rows]
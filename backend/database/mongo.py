@@ -1,9 +1,16 @@
+import pymongo
 from pymongo import MongoClient
 from pymongo.server_api import ServerApi
 import pymongo.errors
 import numpy as np
+import bson.errors
+from bson.binary import Binary
 from bson.objectid import ObjectId
-from config import MONGO_URI, MONGO_DB_NAME, FUGITIVES_COLLECTION
+from config import MONGO_URI, MONGO_DB_NAME, FUGITIVES_COLLECTION, MONGO_CURSOR_BATCH_SIZE, EMBEDDING_MIGRATION_BATCH_SIZE
+from metrics import timed_db_call
+
+EMBEDDING_DTYPE = np.dtype("<f4") # Embeddings are stored as packed little-endian float32 (512 bytes for 128 dims)
+LISTING_PROJECTION = {"embedding": False}
 
 # Global client and database objects
 client = None
@@ -37,21 +44,34 @@ def close_db():
         client.close()
         print("MongoDB connection closed.")
 
-def insert_fugitive(name: str, age: int, gender: str, photo_path: str, embedding: np.ndarray):
-    """Inserts fugitive data into the database."""
-    if fugitives_collection is None:
-        raise ConnectionError("MongoDB not connected. Call connect_db() first.")
+def encode_embedding(embedding: np.ndarray) -> Binary:
+    """Packs an embedding as float32 bytes (about 4x smaller than a BSON array of doubles)."""
+    return Binary(np.ascontiguousarray(embedding, dtype=EMBEDDING_DTYPE).tobytes())
 
-    embedding_list = embedding.tolist()
+def decode_embedding(stored) -> np.ndarray:
+    """Reads a stored embedding: packed float32 bytes, or a legacy array of doubles."""
+    if isinstance(stored, bytes): # bson Binary is a bytes subclass
+        return np.frombuffer(stored, dtype=EMBEDDING_DTYPE)
+    return np.asarray(stored, dtype=np.float32)
 
-    fugitive_data = {
+def fugitive_document(name: str, age: int, gender: str, photo_path: str, embedding: np.ndarray) -> dict:
+    """Builds the stored form of a fugitive."""
+    return {
         "name": name,
         "age": age,
         "gender": gender,
         "photo_path": photo_path, 
-        "embedding": embedding_list
+        "embedding": encode_embedding(embedding)
     }
 
+@timed_db_call("insert_fugitive")
+def insert_fugitive(name: str, age: int, gender: str, photo_path: str, embedding: np.ndarray):
+    """Inserts fugitive data into the database."""
+    if fugitives_collection is None:
+        raise ConnectionError("MongoDB not connected. Call connect_db() first.")
+
+    fugitive_data = fugitive_document(name, age, gender, photo_path, embedding)
+
     try:
         result = fugitives_collection.insert_one(fugitive_data)
         print(f"Inserted fugitive: {name} with ID: {result.inserted_id}")
@@ -60,6 +80,29 @@ def insert_fugitive(name: str, age: int, gender: str, photo_path: str, embedding
         print(f"Error inserting fugitive {name} into DB: {e}")
         raise
 
+@timed_db_call("insert_fugitives")
+def insert_fugitives(documents: list[dict]) -> tuple[list, dict]:
+    """
+    Inserts many fugitive documents (see fugitive_document()) with one unordered insert_many.
+    Returns (inserted_ids, errors) where `errors` maps the index of each document that could
+    not be inserted to the error message; the other documents are inserted regardless.
+    """
+    if fugitives_collection is None:
+        raise ConnectionError("MongoDB not connected. Call connect_db() first.")
+    if not documents:
+        return [], {}
+
+    errors = {}
+    try:
+        fugitives_collection.insert_many(documents, ordered=False)
+    except pymongo.errors.BulkWriteError as e:
+        errors = {error["index"]: error.get("errmsg", "Write error") for error in e.details.get("writeErrors", [])}
+        print(f"Bulk insert: {len(errors)} of {len(documents)} fugitives failed.")
+    # insert_many assigns the _id of every document client-side before sending them
+    inserted_ids = [document["_id"] for i, document in enumerate(documents) if i not in errors]
+    return inserted_ids, errors
+
+@timed_db_call("get_all_fugitives")
 def get_all_fugitives():
      """Retrieves all fugitive data, converting embedding back to numpy array."""
      if fugitives_collection is None:
@@ -68,11 +111,128 @@ def get_all_fugitives():
      fugitives = []
      try:
          # Retrieve all documents
-         cursor = fugitives_collection.find({})
+         cursor = fugitives_collection.find({}, batch_size=MONGO_CURSOR_BATCH_SIZE)
          for doc in cursor:
-             doc['embedding'] = np.array(doc['embedding'])
+             doc['embedding'] = decode_embedding(doc['embedding'])
              fugitives.append(doc)
          return fugitives
      except Exception as e:
          print(f"Error fetching all fugitives from DB: {e}")
-         raise
\ No newline at end of file
+         raise
+
+@timed_db_call("list_fugitives")
+def list_fugitives(offset: int = 0, limit: int | None = None, batch_size: int = MONGO_CURSOR_BATCH_SIZE) -> list[dict]:
+    """Fugitives for display, in insertion order, without their embeddings (projected out server-side)."""
+    if fugitives_collection is None:
+        raise ConnectionError("MongoDB not connected. Call connect_db() first.")
+
+    try:
+        cursor = fugitives_collection.find({}, projection=LISTING_PROJECTION, batch_size=batch_size).sort("_id", 1).skip(offset)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+    except Exception as e:
+        print(f"Error listing fugitives from DB: {e}")
+        raise
+
+@timed_db_call("count_fugitives")
+def count_fugitives() -> int:
+    if fugitives_collection is None:
+        raise ConnectionError("MongoDB not connected. Call connect_db() first.")
+    return fugitives_collection.count_documents({})
+
+@timed_db_call("fugitive_watermark")
+def fugitive_watermark() -> dict:
+    """Number of fugitives and the highest _id (as hex), to cheaply tell whether a local copy is current."""
+    if fugitives_collection is None:
+        raise ConnectionError("MongoDB not connected. Call connect_db() first.")
+
+    newest = fugitives_collection.find_one({}, projection={"_id": True}, sort=[("_id", -1)])
+    return {"count": fugitives_collection.count_documents({}), "max_id": str(newest["_id"]) if newest else None}
+
+@timed_db_call("list_fugitive_ids")
+def list_fugitive_ids(batch_size: int = MONGO_CURSOR_BATCH_SIZE) -> list[str]:
+    """All fugitive ids (index-only query, no document bodies)."""
+    if fugitives_collection is None:
+        raise ConnectionError("MongoDB not connected. Call connect_db() first.")
+
+    return [str(doc["_id"]) for doc in fugitives_collection.find({}, projection={"_id": True}, batch_size=batch_size)]
+
+@timed_db_call("load_fugitive_embeddings")
+def load_fugitive_embeddings(batch_size: int = MONGO_CURSOR_BATCH_SIZE, ids: list[str] | None = None) -> tuple[list[dict], np.ndarray]:
+    """
+    Streams every fugitive (or only those in `ids`) for the in-memory gallery. Embeddings are
+    decoded straight into one preallocated float32 (N x dims) matrix; the returned documents
+    (same order) do not carry them. Legacy array embeddings found on the way are rewritten
+    in packed form.
+    """
+    if fugitives_collection is None:
+        raise ConnectionError("MongoDB not connected. Call connect_db() first.")
+
+    fugitives = []
+    matrix = None
+    legacy = [] # (_id, row) of documents still storing a BSON array
+    try:
+        # Metadata-based estimate; the matrix grows if documents were added meanwhile
+        if ids is None:
+            query = {}
+            capacity = max(1, fugitives_collection.estimated_document_count())
+        else:
+            query = {"_id": {"$in": [ObjectId(i) for i in ids]}}
+            capacity = max(1, len(ids))
+        cursor = fugitives_collection.find(query, batch_size=batch_size)
+        for row, doc in enumerate(cursor):
+            stored = doc.pop("embedding")
+            embedding = decode_embedding(stored)
+            if matrix is None:
+                matrix = np.empty((capacity, embedding.shape[0]), dtype=np.float32)
+            elif row == matrix.shape[0]:
+                matrix = np.concatenate([matrix, np.empty_like(matrix)])
+            matrix[row] = embedding
+            if not isinstance(stored, bytes):
+                legacy.append((doc["_id"], row))
+            fugitives.append(doc)
+    except Exception as e:
+        print(f"Error loading fugitive embeddings from DB: {e}")
+        raise
+
+    if matrix is None:
+        return fugitives, np.empty((0, 0), dtype=np.float32)
+    matrix = matrix[:len(fugitives)]
+    if legacy:
+        _migrate_embeddings(legacy, matrix)
+    return fugitives, matrix
+
+def _migrate_embeddings(legacy: list[tuple], matrix: np.ndarray, batch_size: int = EMBEDDING_MIGRATION_BATCH_SIZE):
+    """Lazy migration: rewrites legacy array embeddings as packed float32, in bulk batches."""
+    migrated = 0
+    for start in range(0, len(legacy), batch_size):
+        requests = [
+            # The $type guard leaves documents alone that were changed since they were read
+            pymongo.UpdateOne({"_id": _id, "embedding": {"$type": "array"}}, {"$set": {"embedding": encode_embedding(matrix[row])}})
+            for _id, row in legacy[start:start + batch_size]
+        ]
+        try:
+            migrated += fugitives_collection.bulk_write(requests, ordered=False).modified_count
+        except Exception as e:
+            # Not fatal: the remaining documents are simply migrated on a later load
+            print(f"Error migrating fugitive embeddings to binary: {e}")
+            break
+    print(f"Migrated {migrated} fugitive embeddings to packed float32.")
+
+@timed_db_call("delete_fugitive")
+def delete_fugitive(fugitive_id: str):
+    """Deletes a fugitive by id. Returns the deleted document, or None if it did not exist."""
+    if fugitives_collection is None:
+        raise ConnectionError("MongoDB not connected. Call connect_db() first.")
+
+    try:
+        deleted = fugitives_collection.find_one_and_delete({"_id": ObjectId(fugitive_id)}, projection={"embedding": False})
+        if deleted:
+            print(f"Deleted fugitive with ID: {fugitive_id}")
+        return deleted
+    except bson.errors.InvalidId:
+        return None
+    except Exception as e:
+        print(f"Error deleting fugitive {fugitive_id} from DB: {e}")
+        raise
@@ -0,0 +1,283 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Minimal Prometheus instrumentation (text exposition format 0.0.4), served at /api/metrics.
+# Each process has its own registry: with several uvicorn workers a scrape sees the worker
+# that answered it. Stage timings and counter increments recorded inside the recognition
+# worker processes are sent back with each job's result and recorded here (see run_collecting()).
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_current_timings = ContextVar("current_timings", default=None) # stage -> seconds for the current request
+_request_started = ContextVar("request_started", default=None) # perf_counter() when the current request started
+_deferred = ContextVar("deferred", default=None) # Inside a worker job: counter increments collected for the caller
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, le: str | None = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {} # label values tuple -> metric-specific state
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key: tuple, value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        deferred = _deferred.get()
+        if deferred is not None:
+            deferred.append((self.name, key, amount))
+            return
+        self._add(key, amount)
+
+    def _add(self, key: tuple, amount: float):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), function=None):
+        super().__init__(name, documentation, labels)
+        self._function = function # Unlabelled gauge read when rendered (e.g. gallery size)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> list[str]:
+        if self._function is not None:
+            try:
+                self.set(self._function())
+            except Exception as e:
+                print(f"Error reading metric {self.name}: {e}")
+        return super().render()
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0] # bucket counts, sum, count
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _render_series(self, key: tuple, state) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state[0]):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, _format_value(bound))} {cumulative}")
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, '+Inf')} {state[2]}")
+        lines.append(f"{self.name}_sum{labels} {_format_value(state[1])}")
+        lines.append(f"{self.name}_count{labels} {state[2]}")
+        return lines
+
+
+REGISTRY = []
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "recognition_stage_seconds", "Time spent in each processing stage (decode, detect, encode, match, annotate, ...).", ("stage",)
+)
+REQUEST_SECONDS = Histogram("recognition_request_seconds", "End-to-end handling time per operation.", ("operation",))
+REQUESTS_IN_FLIGHT = Gauge("recognition_requests_in_flight", "Requests currently being handled per operation.", ("operation",))
+REQUEST_ERRORS = Counter("recognition_request_errors_total", "Requests that failed per operation.", ("operation",))
+FACES_PROCESSED = Counter("recognition_faces_processed_total", "Faces detected, by operation.", ("operation",))
+FRAMES_PROCESSED = Counter("recognition_frames_processed_total", "Video frames processed (sampled and recognized).")
+IMAGES_PROCESSED = Counter("recognition_images_processed_total", "Still images processed, by operation.", ("operation",))
+PREFILTER_FRAMES = Counter(
+    "recognition_prefilter_frames_total", "Frames seen by the detection pre-filter, by outcome (rejected, regions, full_frame).", ("outcome",)
+)
+PREFILTER_REGIONS = Counter("recognition_prefilter_regions_total", "Candidate regions passed to the detector, by outcome (hit, miss).", ("outcome",))
+LIVE_FRAMES_DROPPED = Counter("recognition_live_frames_dropped_total", "Live stream frames dropped instead of recognized, by reason.", ("reason",))
+LIVE_FRAME_LATENCY = Histogram("recognition_live_frame_latency_seconds", "Live stream frames: time from receipt to result.")
+MONGO_SECONDS = Histogram("mongo_operation_seconds", "Duration of MongoDB calls.", ("operation",))
+MONGO_ERRORS = Counter("mongo_operation_errors_total", "MongoDB calls that raised.", ("operation",))
+
+
+def record_stage(stage: str, seconds: float):
+    """Adds a stage duration to the current request's breakdown and to the stage histogram."""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+    if _deferred.get() is None:
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+def record_stages(timings: dict):
+    for stage, seconds in timings.items():
+        record_stage(stage, seconds)
+
+
+def record_collected(collected: dict):
+    """Records what run_collecting() collected in a worker: stage timings and counter increments."""
+    record_stages(collected["stages"])
+    counters = {metric.name: metric for metric in REGISTRY if isinstance(metric, Counter)}
+    for name, key, amount in collected["counts"]:
+        counters[name]._add(key, amount)
+
+
+@contextmanager
+def timed_stage(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+@contextmanager
+def track_request(operation: str):
+    """
+    Counts the request as in flight, times it and collects its per-stage breakdown; yields
+    the dict (stage -> seconds) that stages recorded during the request add to.
+    """
+    timings = {}
+    started = time.perf_counter()
+    token = _current_timings.set(timings)
+    started_token = _request_started.set(started)
+    REQUESTS_IN_FLIGHT.inc(operation=operation)
+    try:
+        yield timings
+    except BaseException:
+        REQUEST_ERRORS.inc(operation=operation)
+        raise
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, operation=operation)
+        REQUESTS_IN_FLIGHT.dec(operation=operation)
+        _request_started.reset(started_token)
+        _current_timings.reset(token)
+
+
+def tracked_request(operation: str):
+    """Decorator for async route handlers: runs the whole handler inside track_request()."""
+    def decorator(func):
+        @functools.wraps(func) # FastAPI reads the handler's parameters through __wrapped__
+        async def wrapper(*args, **kwargs):
+            with track_request(operation):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def request_timings_ms() -> dict:
+    """
+    The current request's stage breakdown for a response body, in milliseconds, plus the
+    total time elapsed since the request started. Stages can overlap (frames in flight).
+    """
+    timings = _current_timings.get() or {}
+    breakdown = {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
+    started = _request_started.get()
+    if started is not None:
+        breakdown["total"] = round((time.perf_counter() - started) * 1000, 3)
+    return breakdown
+
+
+def run_collecting(func, *args):
+    """
+    Runs func(*args) (in a worker process or thread), collecting the stages and counter
+    increments it records instead of recording them there. Returns (result, collected); the
+    caller passes `collected` to record_collected() so they reach this process's registry
+    and the request breakdown.
+    """
+    timings_token = _current_timings.set({})
+    deferred_token = _deferred.set([])
+    try:
+        result = func(*args)
+        return result, {"stages": _current_timings.get(), "counts": _deferred.get()}
+    finally:
+        _deferred.reset(deferred_token)
+        _current_timings.reset(timings_token)
+
+
+def timed_db_call(operation: str):
+    """Decorator for database functions: duration histogram, error counter and a "mongo" stage."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                MONGO_ERRORS.inc(operation=operation)
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                MONGO_SECONDS.observe(elapsed, operation=operation)
+                record_stage("mongo", elapsed)
+        return wrapper
+    return decorator
@@ -0,0 +1,310 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+from config import (
+    TEMP_FOLDER, ARTIFACT_SHARED_FOLDER, ARTIFACT_STORE_MAX_BYTES, ARTIFACT_STORE_MAX_ENTRIES, ARTIFACT_STORE_TTL_SECONDS,
+    ARTIFACT_STORE_SPILL_TO_DISK, ARTIFACT_STORE_SHARED
+)
+from metrics import timed_stage
+
+_SPILL_PURGE_INTERVAL = 60 # Seconds between scans for expired spilled (or shared) files
+
+
+class LazyImage:
+    """
+    An annotated image that is only drawn and JPEG-encoded the first time it is requested.
+    `render(frame)` returns the annotated copy; after encoding only the JPEG bytes are kept.
+    """
+
+    def __init__(self, frame: np.ndarray, render):
+        self._frame = frame
+        self._render = render
+        self._jpeg = None
+        self._lock = threading.Lock() # Concurrent fetches encode once
+
+    @property
+    def encoded(self) -> bool:
+        return self._jpeg is not None
+
+    @property
+    def nbytes(self) -> int:
+        jpeg = self._jpeg
+        return len(jpeg) if jpeg is not None else self._frame.nbytes
+
+    def jpeg_bytes(self) -> bytes:
+        with self._lock:
+            if self._jpeg is None:
+                with timed_stage("annotate"):
+                    self._jpeg = cv2.imencode(".jpg", self._render(self._frame))[1].tobytes()
+                self._frame = self._render = None
+            return self._jpeg
+
+
+class ArtifactStore:
+    """
+    Annotated images served under /api/temp/, kept in memory as LazyImages: LRU with a TTL,
+    bounded by entry count and by a byte budget (raw frame size until encoded, JPEG size after).
+
+    Over the byte budget, the least recently used entries that are still raw frames are
+    encoded first (a JPEG is a small fraction of the frame); only then are entries evicted.
+    With a spill folder, entries evicted before their TTL are written there instead of being
+    dropped, and served from disk until they expire.
+
+    With a shared folder (several worker processes), every artifact is encoded when it is
+    put and written there, so a URL works whichever process serves it; the memory entries
+    are then only a local cache. Expired files are removed by whichever process finds them.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = ARTIFACT_STORE_MAX_BYTES,
+        max_entries: int = ARTIFACT_STORE_MAX_ENTRIES,
+        ttl_seconds: float = ARTIFACT_STORE_TTL_SECONDS,
+        spill_folder: str | None = TEMP_FOLDER if ARTIFACT_STORE_SPILL_TO_DISK else None,
+        shared_folder: str | None = ARTIFACT_SHARED_FOLDER if ARTIFACT_STORE_SHARED else None,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared_folder = shared_folder
+        self.spill_folder = spill_folder if shared_folder is None else None # Shared artifacts are on disk already
+        self._entries = OrderedDict() # name -> (expires_at, nbytes, LazyImage), least recently used first
+        self._spilled = {} # name -> (expires_at, path)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._next_spill_purge = 0.0
+        self._next_shared_purge = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spills = 0
+        self.encodes = 0
+
+    def put(self, name: str, artifact: LazyImage):
+        """
+        Stores an artifact under `name`. Fitting the budget may encode older entries (and a
+        shared store encodes and writes this one), so call it off the event loop.
+        """
+        if self.shared_folder is not None:
+            self._write_shared(name, artifact.jpeg_bytes())
+        with self._lock:
+            if name in self._entries:
+                self._drop(name)
+            self._entries[name] = (time.monotonic() + self.ttl_seconds, artifact.nbytes, artifact)
+            self._bytes += artifact.nbytes
+        self._fit_budget()
+        if self.spill_folder is not None and time.monotonic() >= self._next_spill_purge:
+            self._purge_spilled(time.monotonic())
+        if self.shared_folder is not None and time.monotonic() >= self._next_shared_purge:
+            self._purge_shared()
+
+    def get(self, name: str) -> bytes | None:
+        """The artifact's JPEG bytes, encoding it on first access (call off the event loop)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] < now:
+                self._drop(name)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(name)
+                self.hits += 1
+            spilled = self._spilled.get(name) if entry is None else None
+
+        if entry is not None:
+            artifact = entry[2]
+            jpeg_bytes = artifact.jpeg_bytes()
+            self._resized(name, artifact)
+            return jpeg_bytes
+
+        if spilled is not None and spilled[0] >= now:
+            try:
+                with open(spilled[1], "rb") as file_object:
+                    data = file_object.read()
+                with self._lock:
+                    self.hits += 1
+                return data
+            except FileNotFoundError:
+                pass
+
+        if self.shared_folder is not None:
+            data = self._read_shared(name)
+            if data is not None:
+                with self._lock:
+                    self.hits += 1
+                return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def renew(self, names: list[str]) -> bool:
+        """
+        Restarts the TTL of stored artifacts, e.g. URLs handed out again for a cached result.
+        Returns False if any of them is no longer stored (call off the event loop).
+        """
+        now = time.monotonic()
+        with self._lock:
+            for name in names:
+                entry = self._entries.get(name)
+                spilled = self._spilled.get(name)
+                if entry is not None and entry[0] >= now:
+                    self._entries[name] = (now + self.ttl_seconds, entry[1], entry[2])
+                    self._entries.move_to_end(name)
+                elif spilled is not None and spilled[0] >= now:
+                    self._spilled[name] = (now + self.ttl_seconds, spilled[1])
+                elif self.shared_folder is None:
+                    return False
+        if self.shared_folder is not None:
+            for name in names:
+                path = os.path.join(self.shared_folder, name)
+                try:
+                    if os.path.getmtime(path) + self.ttl_seconds < time.time():
+                        return False
+                    os.utime(path) # Other processes expire shared files by modification time
+                except FileNotFoundError:
+                    return False
+        return True
+
+    def _write_shared(self, name: str, data: bytes):
+        """Writes a file other processes only ever see complete (renamed into place)."""
+        path = os.path.join(self.shared_folder, name)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as file_object:
+                file_object.write(data)
+            os.replace(temp_path, path)
+        except Exception as e:
+            print(f"Error writing shared artifact {name}: {e}")
+
+    def _read_shared(self, name: str) -> bytes | None:
+        path = os.path.join(self.shared_folder, name)
+        try:
+            if os.path.getmtime(path) + self.ttl_seconds < time.time():
+                return None
+            with open(path, "rb") as file_object:
+                return file_object.read()
+        except FileNotFoundError:
+            return None
+
+    def _resized(self, name: str, artifact: LazyImage):
+        """Charges an entry's new (encoded) size instead of its raw frame size."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry[2] is not artifact or entry[1] == artifact.nbytes:
+                return
+            self._bytes += artifact.nbytes - entry[1]
+            self._entries[name] = (entry[0], artifact.nbytes, artifact)
+            self.encodes += 1
+
+    def discard(self, names: list[str]):
+        with self._lock:
+            for name in names:
+                if name in self._entries:
+                    self._drop(name)
+        if self.shared_folder is not None:
+            for name in names:
+                path = os.path.join(self.shared_folder, name)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _drop(self, name: str):
+        self._bytes -= self._entries.pop(name)[1]
+
+    def _fit_budget(self):
+        while True:
+            with self._lock:
+                if self._bytes <= self.max_bytes and len(self._entries) <= self.max_entries:
+                    return
+                pending = None
+                if self._bytes > self.max_bytes:
+                    pending = next(((name, entry[2]) for name, entry in self._entries.items() if not entry[2].encoded), None)
+                if pending is None:
+                    evicted = self._evict()
+                    break
+            name, artifact = pending
+            artifact.jpeg_bytes()
+            self._resized(name, artifact)
+        self._spill(evicted)
+
+    def _evict(self) -> list:
+        """Drops least recently used entries beyond the budgets; returns them for spilling. Caller holds the lock."""
+        evicted = []
+        while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            name = next(iter(self._entries))
+            evicted.append((name, self._entries[name]))
+            self._drop(name)
+            self.evictions += 1
+        return evicted
+
+    def _spill(self, evicted: list):
+        if self.spill_folder is None:
+            return
+        now = time.monotonic()
+        for name, (expires_at, _, artifact) in evicted:
+            if expires_at < now:
+                continue
+            path = os.path.join(self.spill_folder, name)
+            try:
+                with open(path, "wb") as file_object:
+                    file_object.write(artifact.jpeg_bytes())
+            except Exception as e:
+                print(f"Error spilling artifact {name} to disk: {e}")
+                continue
+            with self._lock:
+                self._spilled[name] = (expires_at, path)
+                self.spills += 1
+
+    def _purge_spilled(self, now: float):
+        with self._lock:
+            self._next_spill_purge = now + _SPILL_PURGE_INTERVAL
+            expired = [name for name, (expires_at, _) in self._spilled.items() if expires_at < now]
+            paths = [self._spilled.pop(name)[1] for name in expired]
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _purge_shared(self):
+        """Removes shared files past their TTL, whichever process wrote them (by modification time)."""
+        self._next_shared_purge = time.monotonic() + _SPILL_PURGE_INTERVAL
+        expired_before = time.time() - self.ttl_seconds
+        for entry in os.scandir(self.shared_folder):
+            try:
+                if entry.stat().st_mtime < expired_before:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass # Purged by another process meanwhile
+
+    def clear(self):
+        """Drops every artifact, removing spilled files too (shared files stay for the other processes)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            paths = [path for _, path in self._spilled.values()]
+            self._spilled.clear()
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "shared": self.shared_folder is not None,
+                "spilled": len(self._spilled),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "spills": self.spills,
+                "encodes": self.encodes
+            }
+
+
+# Annotated images and frames produced by /api/recognize/, fetched through /api/temp/<name>
+artifact_store = ArtifactStore()
@@ -1,19 +1,208 @@
-import face_recognition
+import os
 import numpy as np
 import cv2
+from config import (
+    DETECTION_SCALE, DETECTION_ROI, DETECTION_MODEL, DETECTION_UPSAMPLE, DETECTION_PREFILTER_ENABLED, DETECTION_PREFILTER_CASCADES, DETECTION_PREFILTER_WIDTH,
+    DETECTION_PREFILTER_SCALE_FACTOR, DETECTION_PREFILTER_MIN_NEIGHBORS, DETECTION_PREFILTER_MIN_FACE_SIZE, DETECTION_PREFILTER_PADDING, DETECTION_PREFILTER_MAX_COVERAGE,
+    DETECTOR_MIN_FACE_SIZES
+)
+from metrics import PREFILTER_FRAMES, PREFILTER_REGIONS, timed_stage
+from recognition.models import face_recognition_api
 
-def detect_faces_in_image_file(image_path: str) -> list:
+_cascades = None # Haar cascades of the pre-filter, loaded on first use
+
+def _to_detected_faces(face_locations: list) -> list:
+    detected_faces_info = []
+    for (top, right, bottom, left) in face_locations:
+         detected_faces_info.append({
+             "box": [left, top, right - left, bottom - top],
+             "location": (top, right, bottom, left)
+         })
+    return detected_faces_info
+
+def _roi_bounds(roi, frame_shape: tuple) -> tuple[int, int, int, int]:
+    """(top, right, bottom, left) crop for an [x, y, w, h] rectangle or the bounding box of a mask."""
+    height, width = frame_shape[:2]
+    if isinstance(roi, np.ndarray) and roi.ndim == 2:
+        ys, xs = np.nonzero(roi)
+        if ys.size == 0:
+            return 0, 0, 0, 0
+        return int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1, int(xs.min())
+    x, y, w, h = (int(v) for v in roi)
+    return max(0, y), min(width, x + w), min(height, y + h), max(0, x)
+
+def _load_cascades() -> list:
+    """The pre-filter's Haar cascades, loaded once per process (worker processes included)."""
+    global _cascades
+    if _cascades is None:
+        _cascades = []
+        if not hasattr(cv2, "CascadeClassifier"):
+            print("Detection pre-filter unavailable: this OpenCV build has no CascadeClassifier.")
+            return _cascades
+        for filename in DETECTION_PREFILTER_CASCADES:
+            cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, filename))
+            if cascade.empty():
+                print(f"Could not load Haar cascade {filename} for the detection pre-filter.")
+            else:
+                _cascades.append(cascade)
+    return _cascades
+
+def _merge_boxes(boxes: list[list[float]]) -> list[list[float]]:
+    """Unions overlapping [x0, y0, x1, y1] boxes until none overlap, so no area is searched twice."""
+    merged_any = True
+    while merged_any:
+        merged_any = False
+        merged = []
+        for box in boxes:
+            for other in merged:
+                if box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]:
+                    other[:] = [min(box[0], other[0]), min(box[1], other[1]), max(box[2], other[2]), max(box[3], other[3])]
+                    merged_any = True
+                    break
+            else:
+                merged.append(list(box))
+        boxes = merged
+    return boxes
+
+def detector_min_face_size(model: str = DETECTION_MODEL, upsample: int = DETECTION_UPSAMPLE, scale: float = 1.0) -> float:
+    """Smallest face (pixels of the full-size image) the dlib detector finds at these settings."""
+    return DETECTOR_MIN_FACE_SIZES.get(model, min(DETECTOR_MIN_FACE_SIZES.values())) / (2 ** upsample) / scale
+
+def propose_face_regions(rgb_image: np.ndarray, min_face_size: float | None = None) -> list[tuple] | None:
+    """
+    Candidate face regions (top, right, bottom, left) from the Haar cascades, run on a small
+    equalized grayscale copy; boxes are padded and merged where they overlap. An empty list
+    means the frame has no face candidates, None that the pre-filter is unavailable.
+
+    The copy is DETECTION_PREFILTER_WIDTH wide unless faces of `min_face_size` pixels (default:
+    the smallest the dlib detector finds) would then be below the cascade's minimum size.
+    """
+    cascades = _load_cascades()
+    if not cascades:
+        return None
+    height, width = rgb_image.shape[:2]
+    min_face_size = min_face_size or detector_min_face_size()
+    factor = min(1.0, max(DETECTION_PREFILTER_WIDTH / width, DETECTION_PREFILTER_MIN_FACE_SIZE / min_face_size))
+    gray = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY)
+    if factor < 1.0:
+        gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    cv2.equalizeHist(gray, dst=gray)
+
+    boxes = []
+    min_size = (DETECTION_PREFILTER_MIN_FACE_SIZE, DETECTION_PREFILTER_MIN_FACE_SIZE)
+    for cascade in cascades:
+        candidates = cascade.detectMultiScale(
+            gray, scaleFactor=DETECTION_PREFILTER_SCALE_FACTOR, minNeighbors=DETECTION_PREFILTER_MIN_NEIGHBORS, minSize=min_size
+        )
+        for (x, y, w, h) in candidates:
+            pad_x, pad_y = DETECTION_PREFILTER_PADDING * w, DETECTION_PREFILTER_PADDING * h
+            boxes.append([(x - pad_x) / factor, (y - pad_y) / factor, (x + w + pad_x) / factor, (y + h + pad_y) / factor])
+    return [
+        (max(0, int(y0)), min(width, int(np.ceil(x1))), min(height, int(np.ceil(y1))), max(0, int(x0)))
+        for x0, y0, x1, y1 in _merge_boxes(boxes)
+    ]
+
+def _face_locations(image: np.ndarray, scale: float, model: str, upsample: int) -> list[tuple]:
+    """face_recognition.face_locations() on a copy downscaled by `scale`, in `image` coordinates."""
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return [
+        (int(round(top / scale)), int(round(right / scale)), int(round(bottom / scale)), int(round(left / scale)))
+        for (top, right, bottom, left) in face_recognition_api().face_locations(image, number_of_times_to_upsample=upsample, model=model)
+    ]
+
+def _prefiltered_face_locations(image: np.ndarray, scale: float, model: str, upsample: int) -> list[tuple]:
+    """
+    Staged detection: the cascade pre-filter rejects frames without candidates and the dlib
+    detector runs only on the candidate regions (or on the whole frame if they cover most of it).
+    """
+    regions = propose_face_regions(image, detector_min_face_size(model, upsample, scale))
+    if regions is None:
+        return _face_locations(image, scale, model, upsample)
+    if not regions:
+        PREFILTER_FRAMES.inc(outcome="rejected")
+        return []
+    region_area = sum((bottom - top) * (right - left) for top, right, bottom, left in regions)
+    if region_area > DETECTION_PREFILTER_MAX_COVERAGE * image.shape[0] * image.shape[1]:
+        PREFILTER_FRAMES.inc(outcome="full_frame")
+        return _face_locations(image, scale, model, upsample)
+
+    PREFILTER_FRAMES.inc(outcome="regions")
+    face_locations = []
+    for region_top, region_right, region_bottom, region_left in regions:
+        found = _face_locations(image[region_top:region_bottom, region_left:region_right], scale, model, upsample)
+        PREFILTER_REGIONS.inc(outcome="hit" if found else "miss")
+        face_locations.extend(
+            (top + region_top, right + region_left, bottom + region_top, left + region_left) for (top, right, bottom, left) in found
+        )
+    return face_locations
+
+def locate_faces(
+    rgb_image: np.ndarray, detection_scale: float = DETECTION_SCALE, roi=DETECTION_ROI, prefilter: bool = DETECTION_PREFILTER_ENABLED,
+    detection_model: str = DETECTION_MODEL, upsample: int = DETECTION_UPSAMPLE
+) -> list[tuple]:
+    """
+    face_recognition.face_locations() (`detection_model` "hog" or "cnn", upsampled `upsample`
+    times) on a downscaled copy and/or a region of interest, with the locations mapped back to
+    full-resolution image coordinates.
+
+    `roi` is an [x, y, w, h] rectangle or a 2D mask (non-zero = keep); with a mask, only faces
+    whose center lies inside it are kept. With `prefilter`, the dlib detector only runs where
+    the Haar cascade pre-filter found candidate faces.
+    """
+    height, width = rgb_image.shape[:2]
+    crop_top, crop_left = 0, 0
+    image = rgb_image
+    if roi is not None:
+        crop_top, crop_right, crop_bottom, crop_left = _roi_bounds(roi, rgb_image.shape)
+        if crop_bottom <= crop_top or crop_right <= crop_left:
+            return []
+        image = rgb_image[crop_top:crop_bottom, crop_left:crop_right]
+
+    scale = float(detection_scale) if detection_scale else 1.0
+    if not 0 < scale < 1.0:
+        scale = 1.0
+
+    if prefilter:
+        found = _prefiltered_face_locations(image, scale, detection_model, upsample)
+    else:
+        found = _face_locations(image, scale, detection_model, upsample)
+
+    face_locations = []
+    for (top, right, bottom, left) in found:
+        location = (
+            max(0, top + crop_top),
+            min(width, right + crop_left),
+            min(height, bottom + crop_top),
+            max(0, left + crop_left)
+        )
+        if isinstance(roi, np.ndarray) and roi.ndim == 2:
+            center_y, center_x = (location[0] + location[2]) // 2, (location[1] + location[3]) // 2
+            if not roi[min(center_y, height - 1), min(center_x, width - 1)]:
+                continue
+        face_locations.append(location)
+    return face_locations
+
+def prefilter_stats() -> dict:
+    """Rejection rate and candidate-region hit rate of the pre-filter in this process (worker jobs included)."""
+    frames = {outcome: int(PREFILTER_FRAMES.value(outcome=outcome)) for outcome in ("rejected", "regions", "full_frame")}
+    regions = {outcome: int(PREFILTER_REGIONS.value(outcome=outcome)) for outcome in ("hit", "miss")}
+    total_frames, total_regions = sum(frames.values()), sum(regions.values())
+    return {
+        "enabled": DETECTION_PREFILTER_ENABLED,
+        "frames": total_frames,
+        "frames_rejected": frames["rejected"],
+        "frames_full_frame": frames["full_frame"],
+        "rejection_rate": round(frames["rejected"] / total_frames, 4) if total_frames else None,
+        "regions": total_regions,
+        "region_hit_rate": round(regions["hit"] / total_regions, 4) if total_regions else None
+    }
+
+def detect_faces_in_image_file(image_path: str, detection_scale: float = DETECTION_SCALE, roi=DETECTION_ROI, prefilter: bool = False) -> list:
     try:
-        image = face_recognition.load_image_file(image_path)
-        face_locations = face_recognition.face_locations(image) 
-
-        detected_faces_info = []
-        for (top, right, bottom, left) in face_locations:
-             detected_faces_info.append({
-                 "box": [left, top, right - left, bottom - top], 
-                 "location": (top, right, bottom, left)          
-             })
-        return detected_faces_info
+        image = face_recognition_api().load_image_file(image_path)
+        face_locations = locate_faces(image, detection_scale, roi, prefilter)
+        return _to_detected_faces(face_locations)
     except FileNotFoundError:
         print(f"Error: Image file not found at {image_path}")
         return []
@@ -21,18 +210,14 @@ def detect_faces_in_image_file(image_path: str) -> list:
         print(f"Error detecting faces in {image_path}: {e}")
         return []
 
-def detect_faces_in_frame(frame: np.ndarray) -> list:
+def detect_faces_in_frame(
+    frame: np.ndarray, detection_scale: float = DETECTION_SCALE, roi=DETECTION_ROI, prefilter: bool = DETECTION_PREFILTER_ENABLED,
+    detection_model: str = DETECTION_MODEL, upsample: int = DETECTION_UPSAMPLE
+) -> list:
      try:
-         
-         face_locations = face_recognition.face_locations(frame) 
-
-         detected_faces_info = []
-         for (top, right, bottom, left) in face_locations:
-              detected_faces_info.append({
-                  "box": [left, top, right - left, bottom - top], 
-                  "location": (top, right, bottom, left)          
-              })
-         return detected_faces_info
+         with timed_stage("detect"):
+             face_locations = locate_faces(frame, detection_scale, roi, prefilter, detection_model, upsample)
+         return _to_detected_faces(face_locations)
      except Exception as e:
          print(f"Error detecting faces in frame: {e}") # Might be too noisy for videos
-         return []
\ No newline at end of file
+         return []
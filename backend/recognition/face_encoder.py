@@ -1,9 +1,13 @@
-import face_recognition
 import numpy as np
 import cv2
 
+from config import ENCODING_NUM_JITTERS, ENCODING_LANDMARK_MODEL
+from metrics import timed_stage
+from recognition.models import face_recognition_api
+
 def get_face_encoding_from_image_file(image_path: str, known_face_location: tuple | None = None) -> np.ndarray | None:
     try:
+        face_recognition = face_recognition_api()
         image = face_recognition.load_image_file(image_path)
         # rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB) # face_recognition loads as RGB already
 
@@ -37,14 +41,17 @@ def get_face_encoding_from_image_file(image_path: str, known_face_location: tupl
         print(f"Error getting face encoding from {image_path}: {e}")
         return None
 
-def get_face_encodings_from_frame(frame: np.ndarray, face_locations: list[tuple]) -> list[np.ndarray]:
+def get_face_encodings_from_frame(
+    frame: np.ndarray, face_locations: list[tuple], num_jitters: int = ENCODING_NUM_JITTERS, landmark_model: str = ENCODING_LANDMARK_MODEL
+) -> list[np.ndarray]:
 
      if not face_locations:
          return []
 
      try:
          # face_recognition takes frame (numpy array) and locations
-         encodings = face_recognition.face_encodings(frame, known_face_locations=face_locations)
+         with timed_stage("encode"):
+             encodings = face_recognition_api().face_encodings(frame, known_face_locations=face_locations, num_jitters=num_jitters, model=landmark_model)
          return encodings
      except Exception as e:
          print(f"Error getting face encodings from frame: {e}")
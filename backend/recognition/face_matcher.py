@@ -1,25 +1,501 @@
-import face_recognition
+from abc import ABC, abstractmethod
 import numpy as np
-from config import RECOGNITION_TOLERANCE
+from config import (
+    RECOGNITION_TOLERANCE, ANN_INDEX_TYPE, ANN_MIN_GALLERY_SIZE, ANN_NLIST, ANN_NPROBE,
+    ANN_RERANK_K, ANN_TRAIN_SAMPLE_SIZE, ANN_TRAIN_ITERATIONS, GALLERY_QUANTIZATION
+)
 
-def find_best_match_index(unknown_encoding: np.ndarray, known_encodings: list[np.ndarray]) -> int | None:
+ENCODING_DIMENSIONS = 128
 
-    if not known_encodings or unknown_encoding is None:
+# Upper bound on the number of float32 cells in one (queries x gallery) distance block,
+# so very large batches against very large galleries do not allocate unbounded memory.
+_MAX_DISTANCE_BLOCK_CELLS = 1 << 24
+
+# Rows of quantized codes widened to float32 at a time by the first-pass scan
+_QUANTIZED_BLOCK_ROWS = 8192
+
+
+def build_encoding_matrix(encodings: list[np.ndarray]) -> np.ndarray:
+    """Packs a list of encodings into one preallocated, C-contiguous float32 (N x 128) matrix."""
+    matrix = np.empty((len(encodings), ENCODING_DIMENSIONS), dtype=np.float32)
+    for row, encoding in enumerate(encodings):
+        matrix[row] = encoding
+    return matrix
+
+
+def compute_squared_norms(matrix: np.ndarray) -> np.ndarray:
+    """Squared L2 norm of every row, precomputed once per gallery."""
+    return np.einsum("ij,ij->i", matrix, matrix)
+
+
+def find_best_matches(
+    unknown_encodings: list[np.ndarray] | np.ndarray,
+    known_matrix: np.ndarray,
+    known_sq_norms: np.ndarray | None = None,
+    tolerance: float = RECOGNITION_TOLERANCE,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Matches every unknown encoding against the gallery in one matrix operation.
+
+    Returns (indices, distances): for each query the index of the closest known encoding,
+    or -1 when the closest one is not within tolerance, and the euclidean distance to it.
+    """
+    queries = np.asarray(unknown_encodings, dtype=np.float32).reshape(-1, ENCODING_DIMENSIONS)
+    num_queries = queries.shape[0]
+    indices = np.full(num_queries, -1, dtype=np.int64)
+    distances = np.full(num_queries, np.inf, dtype=np.float32)
+
+    if num_queries == 0 or known_matrix.shape[0] == 0:
+        return indices, distances
+
+    if known_sq_norms is None:
+        known_sq_norms = compute_squared_norms(known_matrix)
+
+    # ||q - g||^2 = ||q||^2 + ||g||^2 - 2 q.g ; ||q||^2 is constant per row, so argmin only
+    # needs ||g||^2 - 2 q.g. The expansion loses precision to cancellation, so the distance
+    # compared against the tolerance is recomputed directly for the winning entry only.
+    block_rows = max(1, _MAX_DISTANCE_BLOCK_CELLS // known_matrix.shape[0])
+
+    for start in range(0, num_queries, block_rows):
+        stop = min(start + block_rows, num_queries)
+        partial = queries[start:stop] @ known_matrix.T
+        partial *= -2.0
+        partial += known_sq_norms
+        best = np.argmin(partial, axis=1)
+        diff = known_matrix[best] - queries[start:stop]
+        indices[start:stop] = best
+        distances[start:stop] = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+
+    indices[distances >= tolerance] = -1
+    return indices, distances
+
+
+def _exact_distances(query: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """Direct euclidean distances, free of the cancellation error of the norm expansion."""
+    diff = candidates - query
+    return np.sqrt(np.einsum("ij,ij->i", diff, diff))
+
+
+class ScalarQuantizer:
+    """
+    Compressed copy of the gallery for the first-pass distance scan: "float16" (2 bytes per
+    dimension) or "int8" (1 byte per dimension, each dimension mapped linearly from its
+    [min, max] range onto 0..255). Encodings are reconstructed as offset + scale * code, so
+    q.x = q.offset + (q * scale).code and a block of codes is scanned with one matrix product.
+    Distances are approximate; callers re-rank a shortlist against the float32 rows.
+    """
+
+    CODE_TYPES = {"float16": np.float16, "int8": np.uint8}
+    _ENCODE_CHUNK_ROWS = 65536 # Rows converted at a time, bounding temporary memory
+
+    def __init__(self, kind: str, offset: np.ndarray, scale: np.ndarray):
+        if kind not in self.CODE_TYPES:
+            raise ValueError(f"Unknown quantization '{kind}'. Expected one of: {', '.join(QUANTIZATION_TYPES)}")
+        self.kind = kind
+        self.code_type = self.CODE_TYPES[kind]
+        self.offset = offset.astype(np.float32)
+        self.scale = scale.astype(np.float32)
+
+    @classmethod
+    def train(cls, kind: str, known_matrix: np.ndarray) -> "ScalarQuantizer":
+        """Fits the per-dimension value range of the gallery (int8); float16 needs no training."""
+        if kind != "int8" or known_matrix.shape[0] == 0:
+            return cls(kind, np.zeros(ENCODING_DIMENSIONS), np.ones(ENCODING_DIMENSIONS))
+        minimum = np.full(ENCODING_DIMENSIONS, np.inf, dtype=np.float32)
+        maximum = np.full(ENCODING_DIMENSIONS, -np.inf, dtype=np.float32)
+        for start in range(0, known_matrix.shape[0], cls._ENCODE_CHUNK_ROWS):
+            chunk = known_matrix[start:start + cls._ENCODE_CHUNK_ROWS]
+            np.minimum(minimum, chunk.min(axis=0), out=minimum)
+            np.maximum(maximum, chunk.max(axis=0), out=maximum)
+        scale = np.maximum(maximum - minimum, 1e-12) / 255.0
+        return cls(kind, minimum, scale)
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return ENCODING_DIMENSIONS * np.dtype(self.code_type).itemsize
+
+    def encode(self, known_matrix: np.ndarray, order: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """Returns (codes, squared norms of the reconstructed rows), optionally of the rows in `order`."""
+        num_rows = known_matrix.shape[0] if order is None else order.shape[0]
+        codes = np.empty((num_rows, ENCODING_DIMENSIONS), dtype=self.code_type)
+        sq_norms = np.empty(num_rows, dtype=np.float32)
+        for start in range(0, num_rows, self._ENCODE_CHUNK_ROWS):
+            rows = slice(start, start + self._ENCODE_CHUNK_ROWS)
+            chunk = np.asarray(known_matrix[rows] if order is None else known_matrix[order[rows]], dtype=np.float32)
+            if self.kind == "int8":
+                codes[rows] = np.clip(np.rint((chunk - self.offset) / self.scale), 0, 255)
+            else:
+                codes[rows] = chunk
+            sq_norms[rows] = compute_squared_norms(self.decode(codes[rows]))
+        return codes, sq_norms
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        reconstructed = codes.astype(np.float32)
+        if self.kind == "int8":
+            reconstructed *= self.scale
+            reconstructed += self.offset
+        return reconstructed
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray, code_sq_norms: np.ndarray) -> np.ndarray:
+        """(queries x rows) ||x||^2 - 2 q.x over the reconstructed rows: ranks like the squared distance."""
+        partial = codes.astype(np.float32) @ (queries * self.scale).T
+        partial += queries @ self.offset
+        partial *= -2.0
+        partial += code_sq_norms[:, None]
+        return partial.T
+
+
+QUANTIZATION_TYPES = ("none",) + tuple(ScalarQuantizer.CODE_TYPES)
+
+
+def _make_quantizer(quantization: str | None, known_matrix: np.ndarray) -> ScalarQuantizer | None:
+    if quantization in (None, "none"):
         return None
+    return ScalarQuantizer.train(quantization, known_matrix)
 
-    try:
-        face_distances = face_recognition.face_distance(known_encodings, unknown_encoding)
 
-        if not face_distances.size > 0:
-             return None
+def _rerank(queries: np.ndarray, shortlists: np.ndarray, known_matrix: np.ndarray, tolerance: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Exact distances from each query to its shortlisted rows (-1 entries are padding); returns
+    the closest row per query, or -1 when it is not within tolerance, and the distance to it.
+    """
+    indices = np.full(queries.shape[0], -1, dtype=np.int64)
+    distances = np.full(queries.shape[0], np.inf, dtype=np.float32)
+    for q, query in enumerate(queries):
+        shortlist = shortlists[q][shortlists[q] >= 0]
+        if shortlist.size == 0:
+            continue
+        shortlist = np.sort(shortlist) # Ascending rows: sequential reads from a memory-mapped matrix
+        exact = _exact_distances(query, known_matrix[shortlist])
+        best = int(np.argmin(exact))
+        distances[q] = exact[best]
+        if exact[best] < tolerance:
+            indices[q] = shortlist[best]
+    return indices, distances
+
+
+class FaceIndex(ABC):
+    """Common interface of the gallery search structures."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def search(self, unknown_encodings, tolerance: float = RECOGNITION_TOLERANCE) -> tuple[np.ndarray, np.ndarray]:
+        """Returns (indices, distances) like find_best_matches(); -1 marks no match within tolerance."""
+
+    def stats(self) -> dict:
+        """
+        Size of the structures scanned by every search ("scan_bytes", kept resident) and of
+        the full-precision rows only read for the shortlisted candidates ("rerank_bytes").
+        """
+        return {"type": type(self).__name__, "size": len(self), "quantization": "none", "scan_bytes": len(self) * 4 * (ENCODING_DIMENSIONS + 1), "rerank_bytes": 0}
+
+
+class BruteForceIndex(FaceIndex):
+    """Exact linear scan over the whole gallery."""
+
+    def __init__(self, known_matrix: np.ndarray, known_sq_norms: np.ndarray | None = None, **_options):
+        self.known_matrix = known_matrix
+        self.known_sq_norms = compute_squared_norms(known_matrix) if known_sq_norms is None else known_sq_norms
+
+    def __len__(self) -> int:
+        return self.known_matrix.shape[0]
+
+    def search(self, unknown_encodings, tolerance: float = RECOGNITION_TOLERANCE) -> tuple[np.ndarray, np.ndarray]:
+        return find_best_matches(unknown_encodings, self.known_matrix, self.known_sq_norms, tolerance)
 
-        best_match_index = np.argmin(face_distances)
 
-        if face_distances[best_match_index] < RECOGNITION_TOLERANCE:
-            return int(best_match_index) 
+class QuantizedIndex(FaceIndex):
+    """
+    Linear scan over scalar-quantized codes (float16 or int8) instead of the float32 rows;
+    the `rerank_k` closest candidates are re-ranked with exact distances before the tolerance
+    decision. Only the codes are scanned, so with the gallery matrix memory-mapped from a
+    snapshot the float32 rows stay on disk except for the shortlisted ones.
+    """
+
+    def __init__(
+        self,
+        known_matrix: np.ndarray,
+        known_sq_norms: np.ndarray | None = None,
+        quantization: str = "int8",
+        rerank_k: int = ANN_RERANK_K,
+        **_options,
+    ):
+        self.known_matrix = known_matrix
+        self.quantizer = ScalarQuantizer.train(quantization, known_matrix)
+        self.codes, self.code_sq_norms = self.quantizer.encode(known_matrix)
+        self.rerank_k = max(1, int(rerank_k))
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    def search(self, unknown_encodings, tolerance: float = RECOGNITION_TOLERANCE) -> tuple[np.ndarray, np.ndarray]:
+        queries = np.asarray(unknown_encodings, dtype=np.float32).reshape(-1, ENCODING_DIMENSIONS)
+        num_queries, num_known = queries.shape[0], len(self)
+        if num_queries == 0 or num_known == 0:
+            return np.full(num_queries, -1, dtype=np.int64), np.full(num_queries, np.inf, dtype=np.float32)
+
+        # First pass over the codes in row blocks, keeping the best rerank_k rows per query
+        k = min(self.rerank_k, num_known)
+        best_rows = np.full((num_queries, 0), -1, dtype=np.int64)
+        best_scores = np.empty((num_queries, 0), dtype=np.float32)
+        # Small blocks: each one is widened to float32 for the product, which must stay cache-sized
+        block_rows = max(k, min(_QUANTIZED_BLOCK_ROWS, _MAX_DISTANCE_BLOCK_CELLS // num_queries))
+        for start in range(0, num_known, block_rows):
+            stop = min(start + block_rows, num_known)
+            scores = np.concatenate([best_scores, self.quantizer.scores(queries, self.codes[start:stop], self.code_sq_norms[start:stop])], axis=1)
+            rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, stop), (num_queries, stop - start))], axis=1)
+            if scores.shape[1] > k:
+                top = np.argpartition(scores, k - 1, axis=1)[:, :k]
+                scores, rows = np.take_along_axis(scores, top, axis=1), np.take_along_axis(rows, top, axis=1)
+            best_scores, best_rows = scores, rows
+
+        return _rerank(queries, best_rows, self.known_matrix, tolerance)
+
+    def stats(self) -> dict:
+        return {
+            "type": type(self).__name__, "size": len(self), "quantization": self.quantizer.kind,
+            "scan_bytes": self.codes.nbytes + self.code_sq_norms.nbytes, "rerank_bytes": self.known_matrix.nbytes
+        }
+
+
+def _kmeans(samples: np.ndarray, num_clusters: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Plain Lloyd's k-means on float32 samples; empty clusters are re-seeded from random samples."""
+    centroids = samples[rng.choice(samples.shape[0], num_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments, _ = find_best_matches(samples, centroids, tolerance=np.inf)
+        counts = np.bincount(assignments, minlength=num_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, samples)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = samples[rng.choice(samples.shape[0], int(empty.sum()), replace=False)]
+    return centroids
+
+
+class IVFIndex(FaceIndex):
+    """
+    Inverted-file index: the gallery is partitioned by coarse k-means and each query only
+    scans the `nprobe` partitions whose centroids are closest to it. The top `rerank_k`
+    candidates are re-ranked with exact distances before the tolerance decision.
+
+    Gallery rows are stored in a partition-sorted contiguous copy so every probed partition
+    is scanned as one slice. With `quantization` that copy holds float16/int8 codes instead
+    of float32 rows, and the shortlist is re-ranked against the gallery matrix itself.
+    """
+
+    def __init__(
+        self,
+        known_matrix: np.ndarray,
+        known_sq_norms: np.ndarray | None = None,
+        nlist: int | None = ANN_NLIST,
+        nprobe: int = ANN_NPROBE,
+        rerank_k: int = ANN_RERANK_K,
+        train_sample_size: int = ANN_TRAIN_SAMPLE_SIZE,
+        train_iterations: int = ANN_TRAIN_ITERATIONS,
+        seed: int = 0,
+        centroids: np.ndarray | None = None,
+        quantization: str = GALLERY_QUANTIZATION,
+    ):
+        num_known = known_matrix.shape[0]
+        if centroids is not None:
+            # Reuse an already trained partitioning (e.g. when re-indexing a grown gallery)
+            nlist = centroids.shape[0]
+        elif nlist is None:
+            nlist = int(4 * np.sqrt(num_known))
+        if centroids is None:
+            rng = np.random.default_rng(seed)
+            if num_known > train_sample_size:
+                samples = known_matrix[rng.choice(num_known, max(1, int(train_sample_size)), replace=False)]
+            else:
+                samples = known_matrix
+            # k-means seeds every centroid from a distinct sample: no more lists than training samples
+            nlist = max(1, min(int(nlist), samples.shape[0]))
+            centroids = _kmeans(np.ascontiguousarray(samples, dtype=np.float32), nlist, train_iterations, rng)
+        self.nlist = int(nlist)
+        self.nprobe = max(1, min(int(nprobe), self.nlist))
+        self.rerank_k = max(1, int(rerank_k))
+        self.trained_size = num_known
+        self.centroids = centroids
+        self.centroid_sq_norms = compute_squared_norms(self.centroids)
+
+        assignments, _ = find_best_matches(known_matrix, self.centroids, self.centroid_sq_norms, tolerance=np.inf)
+        self.order = np.argsort(assignments, kind="stable")
+        self.list_offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=self.nlist), out=self.list_offsets[1:])
+        self.quantizer = _make_quantizer(quantization, known_matrix)
+        if self.quantizer is None:
+            self.known_matrix = None
+            self.sorted_matrix = np.ascontiguousarray(known_matrix[self.order])
+            self.sorted_sq_norms = compute_squared_norms(self.sorted_matrix)
+        else:
+            self.known_matrix = known_matrix
+            self.sorted_matrix, self.sorted_sq_norms = self.quantizer.encode(known_matrix, self.order)
+
+    @classmethod
+    def from_layout(
+        cls,
+        centroids: np.ndarray,
+        order: np.ndarray,
+        list_offsets: np.ndarray,
+        sorted_matrix: np.ndarray,
+        trained_size: int,
+        nprobe: int = ANN_NPROBE,
+        rerank_k: int = ANN_RERANK_K,
+    ) -> "IVFIndex":
+        """
+        Rebuilds an index from a saved partitioning without any training or assignment, e.g.
+        with `sorted_matrix` memory-mapped from a gallery snapshot (shared between processes).
+        """
+        index = cls.__new__(cls)
+        index.centroids = centroids
+        index.centroid_sq_norms = compute_squared_norms(centroids)
+        index.nlist = centroids.shape[0]
+        index.nprobe = max(1, min(int(nprobe), index.nlist))
+        index.rerank_k = max(1, int(rerank_k))
+        index.trained_size = trained_size
+        index.order = order
+        index.list_offsets = list_offsets
+        index.quantizer = None
+        index.known_matrix = None
+        index.sorted_matrix = sorted_matrix
+        index.sorted_sq_norms = compute_squared_norms(sorted_matrix)
+        return index
+
+    @property
+    def quantization(self) -> str:
+        return "none" if self.quantizer is None else self.quantizer.kind
+
+    def __len__(self) -> int:
+        return self.order.shape[0]
+
+    def stats(self) -> dict:
+        scan_bytes = self.sorted_matrix.nbytes + self.sorted_sq_norms.nbytes + self.order.nbytes + self.centroids.nbytes
+        return {
+            "type": type(self).__name__, "size": len(self), "quantization": self.quantization, "nlist": self.nlist, "nprobe": self.nprobe,
+            "scan_bytes": scan_bytes, "rerank_bytes": 0 if self.known_matrix is None else self.known_matrix.nbytes
+        }
+
+    def _probe_lists(self, queries: np.ndarray) -> np.ndarray:
+        coarse = queries @ self.centroids.T
+        coarse *= -2.0
+        coarse += self.centroid_sq_norms
+        if self.nprobe >= self.nlist:
+            return np.broadcast_to(np.arange(self.nlist), (queries.shape[0], self.nlist))
+        return np.argpartition(coarse, self.nprobe - 1, axis=1)[:, :self.nprobe]
+
+    def search(self, unknown_encodings, tolerance: float = RECOGNITION_TOLERANCE) -> tuple[np.ndarray, np.ndarray]:
+        queries = np.asarray(unknown_encodings, dtype=np.float32).reshape(-1, ENCODING_DIMENSIONS)
+        indices = np.full(queries.shape[0], -1, dtype=np.int64)
+        distances = np.full(queries.shape[0], np.inf, dtype=np.float32)
+        if queries.shape[0] == 0 or len(self) == 0:
+            return indices, distances
+
+        # First pass, grouped by partition: every probed partition is scanned once, as one slice,
+        # for all the queries probing it, keeping the best rerank_k rows per query
+        num_queries, k = queries.shape[0], self.rerank_k
+        best_scores = np.full((num_queries, k), np.inf, dtype=np.float32)
+        best_rows = np.full((num_queries, k), -1, dtype=np.int64)
+        probed_lists = self._probe_lists(queries).ravel()
+        probing_queries = np.repeat(np.arange(num_queries), probed_lists.shape[0] // num_queries)
+        by_list = np.argsort(probed_lists, kind="stable")
+        lists, group_starts = np.unique(probed_lists[by_list], return_index=True)
+        for l, group in zip(lists, np.split(probing_queries[by_list], group_starts[1:])):
+            start, stop = self.list_offsets[l], self.list_offsets[l + 1]
+            if stop == start:
+                continue
+            block_queries = max(1, _MAX_DISTANCE_BLOCK_CELLS // int(stop - start))
+            for block in range(0, group.shape[0], block_queries):
+                members = group[block:block + block_queries]
+                if self.quantizer is None:
+                    scores = queries[members] @ self.sorted_matrix[start:stop].T
+                    scores *= -2.0
+                    scores += self.sorted_sq_norms[start:stop]
+                else:
+                    scores = self.quantizer.scores(queries[members], self.sorted_matrix[start:stop], self.sorted_sq_norms[start:stop])
+                scores = np.concatenate([best_scores[members], scores], axis=1)
+                rows = np.concatenate([best_rows[members], np.broadcast_to(np.arange(start, stop), (members.shape[0], stop - start))], axis=1)
+                top = np.argpartition(scores, k - 1, axis=1)[:, :k]
+                best_scores[members] = np.take_along_axis(scores, top, axis=1)
+                best_rows[members] = np.take_along_axis(rows, top, axis=1)
+
+        # Exact re-rank of the shortlists; rows of the partition-sorted copy map back through `order`
+        if self.quantizer is None:
+            indices, distances = _rerank(queries, best_rows, self.sorted_matrix, tolerance)
+            indices = np.where(indices >= 0, self.order[indices], -1)
+        else:
+            shortlists = np.where(best_rows >= 0, self.order[best_rows], -1)
+            indices, distances = _rerank(queries, shortlists, self.known_matrix, tolerance)
+        return indices, distances
+
+
+INDEX_TYPES = {
+    "flat": BruteForceIndex,
+    "ivf": IVFIndex,
+}
+
+
+def build_index(
+    known_matrix: np.ndarray,
+    known_sq_norms: np.ndarray | None = None,
+    index_type: str = ANN_INDEX_TYPE,
+    min_ann_size: int = ANN_MIN_GALLERY_SIZE,
+    quantization: str = GALLERY_QUANTIZATION,
+    **options,
+) -> FaceIndex:
+    """
+    Builds the configured index, falling back to brute force for small galleries. With
+    `quantization`, the first-pass scan of a flat or IVF index runs over compressed codes.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Expected one of: {', '.join(INDEX_TYPES)}")
+    if quantization not in QUANTIZATION_TYPES:
+        raise ValueError(f"Unknown quantization '{quantization}'. Expected one of: {', '.join(QUANTIZATION_TYPES)}")
+    if known_matrix.shape[0] < min_ann_size:
+        # Small galleries are scanned exactly at full precision; their size does not matter
+        return BruteForceIndex(known_matrix, known_sq_norms)
+    if index_type == "flat" and quantization != "none":
+        return QuantizedIndex(known_matrix, known_sq_norms, quantization=quantization, **options)
+    return INDEX_TYPES[index_type](known_matrix, known_sq_norms, quantization=quantization, **options)
+
+
+def rebuild_index(known_matrix: np.ndarray, known_sq_norms: np.ndarray | None = None, previous: FaceIndex | None = None) -> FaceIndex:
+    """
+    Re-indexes a changed gallery. An existing IVF partitioning is reused (only assignment,
+    no k-means) until the gallery has doubled since it was trained.
+    """
+    if (isinstance(previous, IVFIndex) and ANN_MIN_GALLERY_SIZE <= known_matrix.shape[0] < 2 * previous.trained_size):
+        index = IVFIndex(
+            known_matrix, known_sq_norms, nprobe=previous.nprobe, rerank_k=previous.rerank_k, centroids=previous.centroids,
+            quantization=previous.quantization
+        )
+        index.trained_size = previous.trained_size
+        return index
+    return build_index(known_matrix, known_sq_norms)
+
+
+def find_best_match_index(unknown_encoding: np.ndarray, known_encodings: list[np.ndarray] | np.ndarray) -> int | None:
+
+    if unknown_encoding is None or len(known_encodings) == 0:
+        return None
+
+    try:
+        if isinstance(known_encodings, np.ndarray) and known_encodings.dtype == np.float32:
+            known_matrix = known_encodings
+        else:
+            known_matrix = build_encoding_matrix(known_encodings)
+
+        indices, _ = find_best_matches([unknown_encoding], known_matrix)
+        best_match_index = int(indices[0])
+
+        if best_match_index >= 0:
+            return best_match_index
         else:
             return None # No match found within tolerance
 
     except Exception as e:
         print(f"Error finding best match: {e}")
-        return None
\ No newline at end of file
+        return None
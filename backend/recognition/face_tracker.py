@@ -0,0 +1,124 @@
+import numpy as np
+
+from config import (
+    RECOGNITION_TOLERANCE, TRACK_IOU_THRESHOLD, TRACK_MAX_MISSED, TRACK_REVERIFY_INTERVAL, TRACK_REVERIFY_MARGIN
+)
+
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of two sets of [x, y, w, h] boxes."""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    inter_w = np.clip(np.minimum(ax2[:, None], bx2[None, :]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    inter_h = np.clip(np.minimum(ay2[:, None], by2[None, :]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    intersection = inter_w * inter_h
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+class Track:
+    def __init__(self, track_id: int, box: list):
+        self.track_id = track_id
+        self.box = box
+        self.result = None # Last verified match result (dict as built by match_faces)
+        self.encoding = None # Encoding behind that result
+        self.frames_since_verified = 0
+        self.missed = 0
+
+    def needs_verification(self, reverify_interval: int, reverify_margin: float, tolerance: float) -> bool:
+        if self.result is None or self.frames_since_verified >= reverify_interval:
+            return True
+        distance = self.result.get("distance")
+        # Low confidence: the last decision was close to the tolerance boundary
+        return distance is None or abs(distance - tolerance) < reverify_margin
+
+
+class FaceTracker:
+    """
+    Associates detections across sampled frames by greedy IoU matching of their boxes, so a
+    face that stays in view is encoded and matched once and then only re-verified every
+    `reverify_interval` frames (or every frame while its match is uncertain). The identity
+    of the last verification is carried forward along the track in between.
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float = TRACK_IOU_THRESHOLD,
+        max_missed: int = TRACK_MAX_MISSED,
+        reverify_interval: int = TRACK_REVERIFY_INTERVAL,
+        reverify_margin: float = TRACK_REVERIFY_MARGIN,
+        tolerance: float = RECOGNITION_TOLERANCE,
+    ):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.reverify_interval = max(1, int(reverify_interval))
+        self.reverify_margin = reverify_margin
+        self.tolerance = tolerance
+        self.tracks = []
+        self._next_track_id = 1
+
+        self.faces_seen = 0
+        self.faces_encoded = 0
+
+    def update(self, detected_faces: list) -> list[tuple[Track, bool]]:
+        """
+        Advances the tracker by one sampled frame. Returns, per detection, its track and
+        whether it must be encoded and matched (new track or re-verification due).
+        """
+        for track in self.tracks:
+            track.frames_since_verified += 1
+
+        assigned = [None] * len(detected_faces)
+        taken = set()
+        if detected_faces and self.tracks:
+            ious = box_iou([d["box"] for d in detected_faces], [t.box for t in self.tracks])
+            # Greedy association, best overlaps first
+            for flat in np.argsort(ious, axis=None)[::-1]:
+                det, trk = np.unravel_index(flat, ious.shape)
+                if ious[det, trk] < self.iou_threshold:
+                    break
+                if assigned[det] is None and trk not in taken:
+                    assigned[det] = self.tracks[trk]
+                    taken.add(trk)
+
+        for trk, track in enumerate(self.tracks):
+            if trk not in taken:
+                track.missed += 1
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+
+        results = []
+        for det, detected in enumerate(detected_faces):
+            track = assigned[det]
+            if track is None:
+                track = Track(self._next_track_id, detected["box"])
+                self._next_track_id += 1
+                self.tracks.append(track)
+            track.box = detected["box"]
+            track.missed = 0
+            results.append((track, track.needs_verification(self.reverify_interval, self.reverify_margin, self.tolerance)))
+
+        self.faces_seen += len(detected_faces)
+        return results
+
+    def verified(self, track: Track, face_result: dict, face_encoding: np.ndarray | None = None):
+        """Records a fresh encode+match result for a track."""
+        track.result = face_result
+        track.encoding = face_encoding
+        track.frames_since_verified = 0
+        self.faces_encoded += 1
+
+    def carried_result(self, track: Track) -> dict:
+        """The track's last verified identity, at the track's current box."""
+        if track.result is None: # Encoding failed so far
+            return {"box": track.box, "match": False, "info": None, "distance": None}
+        return {**track.result, "box": track.box}
+
+    def stats(self) -> dict:
+        return {
+            "faces_seen": self.faces_seen,
+            "faces_encoded": self.faces_encoded,
+            "tracks_created": self._next_track_id - 1,
+            "encoder_calls_saved": self.faces_seen - self.faces_encoded
+        }
@@ -0,0 +1,352 @@
+import threading
+import numpy as np
+
+from config import (
+    RECOGNITION_TOLERANCE, ANN_MIN_GALLERY_SIZE, GALLERY_INITIAL_CAPACITY, GALLERY_REINDEX_MIN_PENDING,
+    GALLERY_REINDEX_PENDING_FRACTION
+)
+from recognition.face_matcher import (
+    ENCODING_DIMENSIONS, FaceIndex, BruteForceIndex, compute_squared_norms, find_best_matches, build_index, rebuild_index
+)
+
+
+def make_face_info(fugitive_id, name: str, age: int, gender: str, photo_filename: str) -> dict:
+    """Display info stored alongside each known encoding."""
+    return {
+        "_id": str(fugitive_id),
+        "name": name,
+        "age": age,
+        "gender": gender,
+        "photo_filename": photo_filename
+    }
+
+
+_EMPTY_ROWS = np.empty((0, ENCODING_DIMENSIONS), dtype=np.float32)
+
+
+class GallerySnapshot:
+    """
+    Immutable, consistent view of the gallery at one version.
+
+    Rows [0, indexed_count) are searched through `index`; rows appended since the last
+    re-index are searched by brute force until the next one. When the gallery adopted a
+    read-only matrix (a memory-mapped snapshot), rows appended since are held in a separate
+    tail (`tail_matrix`, numbered after the `matrix` rows) rather than in a copy of it.
+    """
+
+    def __init__(
+        self, version: int, matrix: np.ndarray, sq_norms: np.ndarray, info: np.ndarray, index: FaceIndex,
+        tail_matrix: np.ndarray = _EMPTY_ROWS, tail_sq_norms: np.ndarray = _EMPTY_ROWS[:, 0]
+    ):
+        self.version = version
+        self.matrix = matrix
+        self.sq_norms = sq_norms
+        self.tail_matrix = tail_matrix
+        self.tail_sq_norms = tail_sq_norms
+        self.info = info
+        self.index = index
+        self.indexed_count = len(index)
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0] + self.tail_matrix.shape[0]
+
+    @property
+    def pending_count(self) -> int:
+        return len(self) - self.indexed_count
+
+    def rows(self) -> tuple[np.ndarray, np.ndarray]:
+        """(matrix, squared norms) of all rows; copies them into one array if there is a tail."""
+        if self.tail_matrix.shape[0] == 0:
+            return self.matrix, self.sq_norms
+        return np.concatenate([self.matrix, self.tail_matrix]), np.concatenate([self.sq_norms, self.tail_sq_norms])
+
+    def _pending_segments(self):
+        """(first row, matrix, squared norms) of the rows the index does not cover."""
+        base_count = self.matrix.shape[0]
+        if self.indexed_count < base_count:
+            yield self.indexed_count, self.matrix[self.indexed_count:], self.sq_norms[self.indexed_count:]
+        tail_start = max(0, self.indexed_count - base_count)
+        if tail_start < self.tail_matrix.shape[0]:
+            yield base_count + tail_start, self.tail_matrix[tail_start:], self.tail_sq_norms[tail_start:]
+
+    def search(self, unknown_encodings, tolerance: float = RECOGNITION_TOLERANCE) -> tuple[np.ndarray, np.ndarray]:
+        """Returns (indices, distances) over the whole snapshot; -1 marks no match within tolerance."""
+        indices, distances = self.index.search(unknown_encodings, tolerance=np.inf)
+
+        for first_row, matrix, sq_norms in self._pending_segments():
+            pending_indices, pending_distances = find_best_matches(unknown_encodings, matrix, sq_norms, tolerance=np.inf)
+            closer = pending_distances < distances
+            indices[closer] = pending_indices[closer] + first_row
+            distances[closer] = pending_distances[closer]
+
+        indices[~(distances < tolerance)] = -1
+        return indices, distances
+
+
+class FaceGallery:
+    """
+    Versioned in-memory gallery of known face encodings.
+
+    Writers (replace/append/extend/remove) are serialized by a lock and publish a new
+    GallerySnapshot by atomic reference swap, so readers only ever see complete states.
+    Appends write into spare preallocated rows that no published snapshot can see, which
+    makes them O(1) amortized; the index is rebuilt in a background thread once enough
+    rows are pending. An adopted read-only matrix is never copied for appends: they go to a
+    small tail of their own. Removals compact into new buffers (copy-on-write, O(N)).
+
+    With a shared store attached (gallery_sync), writes are published to every worker
+    process instead and applied here in the same order as everywhere else. Publishing and
+    refresh() take file locks and do file I/O, so the event loop calls them in a thread;
+    snapshot() never blocks.
+    """
+
+    def __init__(self, initial_capacity: int = GALLERY_INITIAL_CAPACITY):
+        self._lock = threading.Lock()
+        self._initial_capacity = max(1, int(initial_capacity))
+        self._row_by_id = {}
+        self._reindex_thread = None
+        self._layout = 0 # Bumped whenever rows are rewritten (replace/remove), invalidating in-flight re-indexes
+        self._tail_matrix = None # Rows appended after an adopted matrix (None while the gallery owns its buffers)
+        self._tail_sq_norms = None
+        self._shared = None
+        self._allocate(self._initial_capacity)
+        self._count = 0
+        self._snapshot = self._publish(0, build_index(self._matrix[:0], self._sq_norms[:0]))
+
+    def _allocate(self, capacity: int):
+        self._matrix = np.empty((capacity, ENCODING_DIMENSIONS), dtype=np.float32)
+        self._sq_norms = np.empty(capacity, dtype=np.float32)
+        self._info = np.empty(capacity, dtype=object)
+
+    def _publish(self, version: int, index: FaceIndex) -> GallerySnapshot:
+        n = self._count
+        if self._tail_matrix is None:
+            snapshot = GallerySnapshot(version, self._matrix[:n], self._sq_norms[:n], self._info[:n], index)
+        else:
+            tail_count = n - self._matrix.shape[0]
+            snapshot = GallerySnapshot(
+                version, self._matrix, self._sq_norms, self._info[:n], index, self._tail_matrix[:tail_count], self._tail_sq_norms[:tail_count]
+            )
+        self._snapshot = snapshot
+        return snapshot
+
+    def attach_shared_store(self, store):
+        """
+        Shares the gallery with the other worker processes through `store` (a
+        gallery_sync.SharedGalleryStore). Writes are then published through the store, and
+        refresh() applies whatever another process published since the last call.
+        """
+        self._shared = store
+
+    @property
+    def shared(self) -> bool:
+        return self._shared is not None
+
+    @property
+    def stale(self) -> bool:
+        """Whether other processes published writes that refresh() has not applied yet."""
+        return self._shared is not None and self._shared.is_stale()
+
+    def snapshot(self) -> GallerySnapshot:
+        """Current consistent view; hold on to it for the duration of a request."""
+        return self._snapshot
+
+    def refresh(self) -> GallerySnapshot:
+        """
+        Applies other processes' writes if there are any, then returns the current view.
+        May take the shared lock and re-map the shared snapshot: call it off the event loop.
+        """
+        if self.stale:
+            self._shared.sync(self)
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self.snapshot().version
+
+    def __len__(self) -> int:
+        return len(self.snapshot())
+
+    def replace(
+        self, encodings: np.ndarray | list[np.ndarray], infos: list[dict], adopt: bool = False, centroids: np.ndarray | None = None,
+        index: FaceIndex | None = None
+    ) -> GallerySnapshot:
+        """
+        Replaces the whole gallery (full load from the database or a local snapshot).
+
+        With `adopt`, a float32 (N x 128) matrix is used as the backing store without copying,
+        e.g. a read-only memory map: it is never written to, since the first append grows
+        into fresh buffers. `centroids` reuses a trained IVF partitioning (no k-means) and
+        `index` is a ready index over exactly these rows. When shared, the new contents are
+        written as the new shared snapshot, which every process then maps.
+        """
+        if self._shared is not None:
+            return self._shared.publish_replace(self, encodings, infos, centroids)
+        return self._apply_replace(encodings, infos, adopt, centroids, index)
+
+    def _apply_replace(
+        self, encodings: np.ndarray | list[np.ndarray], infos: list[dict], adopt: bool = False, centroids: np.ndarray | None = None,
+        index: FaceIndex | None = None
+    ) -> GallerySnapshot:
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIMENSIONS)
+        if encodings.shape[0] != len(infos):
+            raise ValueError("Number of encodings and info entries must match.")
+
+        with self._lock:
+            self._layout += 1
+            self._count = encodings.shape[0]
+            self._tail_matrix = self._tail_sq_norms = None
+            if adopt and self._count > 0 and encodings.flags.c_contiguous:
+                self._matrix = encodings
+                self._sq_norms = np.empty(self._count, dtype=np.float32)
+                self._info = np.empty(self._count, dtype=object)
+                self._tail_matrix, self._tail_sq_norms = _EMPTY_ROWS, _EMPTY_ROWS[:, 0]
+            else:
+                self._allocate(max(self._initial_capacity, self._count))
+                self._matrix[:self._count] = encodings
+            self._sq_norms[:self._count] = compute_squared_norms(self._matrix[:self._count])
+            for row, info in enumerate(infos):
+                self._info[row] = info
+            self._row_by_id = {info["_id"]: row for row, info in enumerate(infos)}
+            if index is None or len(index) != self._count:
+                index = build_index(self._matrix[:self._count], self._sq_norms[:self._count], centroids=centroids)
+            return self._publish(self._snapshot.version + 1, index)
+
+    def append(self, encoding: np.ndarray, info: dict) -> GallerySnapshot:
+        """Adds one known face; visible to requests that take a snapshot afterwards."""
+        return self.extend(np.asarray(encoding, dtype=np.float32).reshape(1, ENCODING_DIMENSIONS), [info])
+
+    def extend(self, encodings: np.ndarray | list[np.ndarray], infos: list[dict]) -> GallerySnapshot:
+        """Adds many known faces at once (bulk enrollment), published as a single new version."""
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIMENSIONS)
+        if encodings.shape[0] != len(infos):
+            raise ValueError("Number of encodings and info entries must match.")
+        if self._shared is not None:
+            return self._shared.publish_extend(self, encodings, infos)
+        return self._apply_extend(encodings, infos)
+
+    def _apply_extend(self, encodings: np.ndarray, infos: list[dict]) -> GallerySnapshot:
+
+        with self._lock:
+            new_count = self._count + encodings.shape[0]
+            if self._tail_matrix is not None:
+                self._extend_tail(encodings, new_count)
+            else:
+                if new_count > self._matrix.shape[0]:
+                    # Grow into fresh buffers; published snapshots keep viewing the old ones
+                    capacity = _grown_capacity(self._matrix.shape[0], new_count)
+                    old_matrix, old_sq_norms, old_info = self._matrix, self._sq_norms, self._info
+                    self._allocate(capacity)
+                    self._matrix[:self._count] = old_matrix[:self._count]
+                    self._sq_norms[:self._count] = old_sq_norms[:self._count]
+                    self._info[:self._count] = old_info[:self._count]
+
+                rows = slice(self._count, new_count)
+                self._matrix[rows] = encodings
+                self._sq_norms[rows] = compute_squared_norms(self._matrix[rows])
+            for row, info in enumerate(infos, start=self._count):
+                self._info[row] = info
+                self._row_by_id[info["_id"]] = row
+            self._count = new_count
+            index = self._snapshot.index
+            if self._tail_matrix is None and isinstance(index, BruteForceIndex) and self._count < ANN_MIN_GALLERY_SIZE:
+                # A flat index is just a view of the rows, so it can cover the new rows directly
+                index = BruteForceIndex(self._matrix[:self._count], self._sq_norms[:self._count])
+            snapshot = self._publish(self._snapshot.version + 1, index)
+            self._maybe_schedule_reindex(snapshot)
+            return snapshot
+
+    def _extend_tail(self, encodings: np.ndarray, new_count: int):
+        """Appends rows after an adopted matrix without copying it (only the tail and the info grow). Caller holds the lock."""
+        tail_count = self._count - self._matrix.shape[0]
+        new_tail_count = new_count - self._matrix.shape[0]
+        if new_tail_count > self._tail_matrix.shape[0]:
+            capacity = _grown_capacity(max(self._tail_matrix.shape[0], self._initial_capacity), new_tail_count)
+            old_matrix, old_sq_norms = self._tail_matrix, self._tail_sq_norms
+            self._tail_matrix = np.empty((capacity, ENCODING_DIMENSIONS), dtype=np.float32)
+            self._tail_sq_norms = np.empty(capacity, dtype=np.float32)
+            self._tail_matrix[:tail_count] = old_matrix[:tail_count]
+            self._tail_sq_norms[:tail_count] = old_sq_norms[:tail_count]
+        if new_count > self._info.shape[0]:
+            old_info = self._info
+            self._info = np.empty(_grown_capacity(self._info.shape[0], new_count), dtype=object)
+            self._info[:self._count] = old_info[:self._count]
+
+        rows = slice(tail_count, new_tail_count)
+        self._tail_matrix[rows] = encodings
+        self._tail_sq_norms[rows] = compute_squared_norms(self._tail_matrix[rows])
+
+    def remove(self, fugitive_id) -> bool:
+        """Removes a known face by fugitive id. Returns False if it is not in the gallery."""
+        return self.remove_many([fugitive_id]) > 0
+
+    def remove_many(self, fugitive_ids) -> int:
+        """Removes known faces by fugitive id in one compaction; returns how many were present."""
+        fugitive_ids = [str(i) for i in fugitive_ids]
+        if self._shared is not None:
+            return self._shared.publish_remove(self, fugitive_ids)
+        return self._apply_remove(fugitive_ids)
+
+    def _apply_remove(self, fugitive_ids: list[str]) -> int:
+        with self._lock:
+            rows = list({self._row_by_id[i] for i in fugitive_ids if i in self._row_by_id})
+            if not rows:
+                return 0
+
+            self._layout += 1
+            keep = np.ones(self._count, dtype=bool)
+            keep[rows] = False
+            old_count = self._count
+            (old_matrix, old_sq_norms), old_info = self._snapshot.rows(), self._info
+            old_index = self._snapshot.index
+            self._allocate(max(self._initial_capacity, self._matrix.shape[0], old_count))
+            self._tail_matrix = self._tail_sq_norms = None
+            self._count = int(keep.sum())
+            self._matrix[:self._count] = old_matrix[:old_count][keep]
+            self._sq_norms[:self._count] = old_sq_norms[:old_count][keep]
+            self._info[:self._count] = old_info[:old_count][keep]
+            self._row_by_id = {info["_id"]: r for r, info in enumerate(self._info[:self._count])}
+            index = rebuild_index(self._matrix[:self._count], self._sq_norms[:self._count], previous=old_index)
+            self._publish(self._snapshot.version + 1, index)
+            return len(rows)
+
+    def _maybe_schedule_reindex(self, snapshot: GallerySnapshot):
+        if self._shared is not None and self._tail_matrix is not None:
+            # Every process maps the same matrix: the leader's next compaction indexes the
+            # tail once for all of them, rather than each process copying the matrix to do it
+            return
+        threshold = max(GALLERY_REINDEX_MIN_PENDING, int(GALLERY_REINDEX_PENDING_FRACTION * snapshot.indexed_count))
+        if snapshot.pending_count < threshold:
+            return
+        if self._reindex_thread is not None and self._reindex_thread.is_alive():
+            return
+        self._reindex_thread = threading.Thread(target=self._reindex, args=(snapshot, self._layout), daemon=True)
+        self._reindex_thread.start()
+
+    def _reindex(self, snapshot: GallerySnapshot, layout: int):
+        """Indexes all rows of `snapshot` off the request path, then swaps the index in."""
+        try:
+            index = rebuild_index(*snapshot.rows(), previous=snapshot.index)
+        except Exception as e:
+            print(f"Error re-indexing gallery at version {snapshot.version}: {e}")
+            return
+
+        with self._lock:
+            # Rows are only ever appended between layout changes, so the new index stays
+            # valid for the current state unless a replace or removal rewrote the rows.
+            if layout != self._layout:
+                return
+            # Same rows, so the same version: results cached against it stay valid
+            current = self._publish(self._snapshot.version, index)
+            print(f"Re-indexed gallery: {len(index)} rows ({type(index).__name__}), {len(current) - len(index)} pending.")
+
+
+def _grown_capacity(capacity: int, needed: int) -> int:
+    capacity = max(1, capacity)
+    while capacity < needed:
+        capacity *= 2
+    return capacity
+
+
+# Process-wide gallery of known fugitives
+known_faces = FaceGallery()
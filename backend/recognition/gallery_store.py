@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+import time
+import uuid
+import numpy as np
+
+from config import GALLERY_SNAPSHOT_FOLDER, GALLERY_SNAPSHOT_SAVE_INTERVAL, GALLERY_QUANTIZATION
+from recognition.face_matcher import ENCODING_DIMENSIONS, IVFIndex
+from recognition.gallery import FaceGallery, GallerySnapshot
+
+# On-disk layout of the local gallery snapshot (GALLERY_SNAPSHOT_FOLDER):
+#   <name>.npy            float32 (N x 128) matrix, memory-mapped on load
+#   <name>.centroids.npy  trained IVF partitioning, if the gallery was IVF-indexed
+#   <name>.ivf-*.npy      full IVF layout (order, list offsets, partition-sorted matrix), if
+#                         the index covered every row and was not quantized; memory-mapped
+#                         on load like the matrix (quantized codes are re-encoded on load)
+#   <name>.json           metadata, watermark and the N face info dicts (row order)
+#   current.json          {"name": <name>} of the latest complete snapshot
+# Each save writes new files and then atomically repoints current.json, so a reader never
+# sees a partial snapshot and a process that still maps an older matrix keeps it intact.
+SNAPSHOT_FORMAT = 1
+_CURRENT_FILE = "current.json"
+
+_saver_thread = None
+_saver_stop = threading.Event()
+_saved_version = None
+_saved_index = None # Index of the saved version (a re-index swaps it without a new version)
+
+
+def gallery_watermark(snapshot: GallerySnapshot) -> dict:
+    """
+    What the snapshot contains, comparable with the database: the number of fugitives and the
+    highest _id (ObjectId hex strings sort like the ObjectIds, i.e. by creation time).
+    """
+    return {"count": len(snapshot), "max_id": max((info["_id"] for info in snapshot.info), default=None)}
+
+
+def _replace_atomic(path: str, write):
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temp_path, "wb") as file_object:
+        write(file_object)
+        file_object.flush()
+        os.fsync(file_object.fileno())
+    os.replace(temp_path, path)
+
+
+def save_gallery_snapshot(snapshot: GallerySnapshot, folder: str = GALLERY_SNAPSHOT_FOLDER, generation: int = 0) -> str:
+    """
+    Persists a gallery snapshot and makes it the current one. Returns its name.
+    `generation` is the shared-gallery generation the snapshot reflects (see gallery_sync).
+    """
+    name = write_gallery_snapshot(snapshot, folder, generation)
+    set_current_snapshot(name, folder)
+    return name
+
+
+def write_gallery_snapshot(snapshot: GallerySnapshot, folder: str = GALLERY_SNAPSHOT_FOLDER, generation: int = 0) -> str:
+    """Writes a snapshot's files without making it the current one (see set_current_snapshot). Returns its name."""
+    name = f"gallery-{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    index = snapshot.index
+    has_centroids = isinstance(index, IVFIndex)
+    has_layout = has_centroids and snapshot.pending_count == 0 and index.quantizer is None
+
+    def save_array(suffix: str, array: np.ndarray):
+        _replace_atomic(os.path.join(folder, f"{name}{suffix}.npy"), lambda f: np.save(f, np.ascontiguousarray(array)))
+
+    save_array("", snapshot.rows()[0])
+    if has_centroids:
+        save_array(".centroids", index.centroids)
+    if has_layout:
+        save_array(".ivf-order", index.order)
+        save_array(".ivf-offsets", index.list_offsets)
+        save_array(".ivf-sorted", index.sorted_matrix)
+    metadata = {
+        "format": SNAPSHOT_FORMAT,
+        "gallery_version": snapshot.version,
+        "generation": generation,
+        "saved_at": time.time(),
+        "watermark": gallery_watermark(snapshot),
+        "has_centroids": has_centroids,
+        "ivf_trained_size": index.trained_size if has_layout else None,
+        "infos": list(snapshot.info)
+    }
+    _replace_atomic(os.path.join(folder, f"{name}.json"), lambda f: f.write(json.dumps(metadata, separators=(",", ":")).encode()))
+    return name
+
+
+def set_current_snapshot(name: str, folder: str = GALLERY_SNAPSHOT_FOLDER):
+    """Atomically repoints current.json to a written snapshot and removes the older ones."""
+    _replace_atomic(os.path.join(folder, _CURRENT_FILE), lambda f: f.write(json.dumps({"name": name}).encode()))
+    _remove_stale_snapshots(folder, keep=name)
+
+
+def discard_gallery_snapshot(name: str, folder: str = GALLERY_SNAPSHOT_FOLDER):
+    """Removes the files of a written snapshot that never became the current one."""
+    for filename in os.listdir(folder):
+        if filename.startswith(f"{name}."):
+            try:
+                os.remove(os.path.join(folder, filename))
+            except OSError:
+                pass
+
+
+def _remove_stale_snapshots(folder: str, keep: str):
+    for filename in os.listdir(folder):
+        if filename.startswith("gallery-") and not filename.startswith(keep):
+            try:
+                os.remove(os.path.join(folder, filename))
+            except OSError:
+                pass # Still mapped on platforms that do not allow removing open files
+
+
+def load_gallery_snapshot(folder: str = GALLERY_SNAPSHOT_FOLDER) -> dict | None:
+    """
+    Opens the current snapshot with its matrix memory-mapped read-only, so no embedding is
+    read from disk until it is used. Returns None if there is no usable snapshot.
+
+    The result has the metadata plus "matrix", "centroids" and "index" (an IVFIndex over the
+    memory-mapped saved layout, or None if the index has to be built).
+    """
+    try:
+        with open(os.path.join(folder, _CURRENT_FILE), "rb") as file_object:
+            name = json.load(file_object)["name"]
+        with open(os.path.join(folder, f"{name}.json"), "rb") as file_object:
+            metadata = json.load(file_object)
+        if metadata.get("format") != SNAPSHOT_FORMAT:
+            print(f"Ignoring gallery snapshot {name}: unsupported format {metadata.get('format')}.")
+            return None
+
+        matrix = np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r")
+        if matrix.dtype != np.float32 or matrix.ndim != 2 or matrix.shape[1] != ENCODING_DIMENSIONS or matrix.shape[0] != len(metadata["infos"]):
+            print(f"Ignoring gallery snapshot {name}: matrix does not match its metadata.")
+            return None
+        centroids = np.load(os.path.join(folder, f"{name}.centroids.npy")) if metadata["has_centroids"] else None
+        index = None
+        if metadata.get("ivf_trained_size") is not None and GALLERY_QUANTIZATION == "none":
+            index = IVFIndex.from_layout(
+                centroids,
+                np.load(os.path.join(folder, f"{name}.ivf-order.npy"), mmap_mode="r"),
+                np.load(os.path.join(folder, f"{name}.ivf-offsets.npy")),
+                np.load(os.path.join(folder, f"{name}.ivf-sorted.npy"), mmap_mode="r"),
+                metadata["ivf_trained_size"]
+            )
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error reading gallery snapshot from {folder}: {e}")
+        return None
+
+    return {"name": name, "matrix": matrix, "centroids": centroids, "index": index, "generation": 0, **metadata}
+
+
+def save_if_changed(gallery: FaceGallery, folder: str = GALLERY_SNAPSHOT_FOLDER) -> bool:
+    """
+    Saves the gallery unless the current version and index are already on disk (or the
+    gallery is empty). A re-index keeps the version but still gets saved, for its IVF layout.
+    """
+    global _saved_version, _saved_index
+    snapshot = gallery.snapshot()
+    if (snapshot.version == _saved_version and snapshot.index is _saved_index) or len(snapshot) == 0:
+        return False
+    try:
+        name = save_gallery_snapshot(snapshot, folder)
+    except Exception as e:
+        print(f"Error saving gallery snapshot: {e}")
+        return False
+    _saved_version, _saved_index = snapshot.version, snapshot.index
+    print(f"Saved gallery snapshot {name} ({len(snapshot)} faces, version {snapshot.version}).")
+    return True
+
+
+def mark_saved(gallery: FaceGallery):
+    """Records that the gallery's current version matches the snapshot on disk (e.g. just restored)."""
+    global _saved_version, _saved_index
+    snapshot = gallery.snapshot()
+    _saved_version, _saved_index = snapshot.version, snapshot.index
+
+
+def start_snapshot_saver(gallery: FaceGallery, interval: float = GALLERY_SNAPSHOT_SAVE_INTERVAL):
+    """Background thread persisting the gallery every `interval` seconds if it changed, so enrollments are batched into few writes."""
+    global _saver_thread
+    if _saver_thread is not None:
+        return
+    _saver_stop.clear()
+
+    def run():
+        while not _saver_stop.wait(interval):
+            save_if_changed(gallery)
+
+    _saver_thread = threading.Thread(target=run, daemon=True)
+    _saver_thread.start()
+
+
+def stop_snapshot_saver(gallery: FaceGallery):
+    """Stops the saver thread and persists any change made since its last run."""
+    global _saver_thread
+    if _saver_thread is not None:
+        _saver_stop.set()
+        _saver_thread.join()
+        _saver_thread = None
+    save_if_changed(gallery)
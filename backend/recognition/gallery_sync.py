@@ -0,0 +1,337 @@
+import base64
+from contextlib import contextmanager
+import json
+import mmap
+import os
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError: # Not POSIX: the gallery cannot be shared between processes
+    fcntl = None
+
+from config import GALLERY_SNAPSHOT_FOLDER, GALLERY_SNAPSHOT_SAVE_INTERVAL
+from recognition.face_matcher import ENCODING_DIMENSIONS, rebuild_index
+from recognition.gallery import FaceGallery, GallerySnapshot
+from recognition.gallery_store import (
+    _CURRENT_FILE, discard_gallery_snapshot, load_gallery_snapshot, set_current_snapshot, write_gallery_snapshot
+)
+
+# Cross-process sharing of the gallery between uvicorn worker processes, next to the local
+# snapshot files (see gallery_store):
+#   generation        8-byte counter, memory-mapped by every process; bumped by each write
+#   <name>.journal    JSON lines of the writes made since snapshot <name>, each tagged with
+#                     the generation it produced ("extend" with base64 float32 embeddings,
+#                     "remove" with fugitive ids)
+#   sync.lock         flock: shared while a process catches up, exclusive while one writes
+#   leader.lock       flock held by the one process that compacts the journal into a new
+#                     snapshot (any process takes over when the leader exits); it indexes and
+#                     writes the snapshot without the sync lock, then only repoints current.json,
+#                     carries over the journal entries written meanwhile and bumps the generation
+#                     under the exclusive lock
+# A process is stale when the shared generation differs from the one it has applied; it then
+# re-maps the current snapshot if it changed and replays the journal past what it has read.
+# Since every process maps the same snapshot files read-only, the page cache holds a single
+# copy of the embedding matrix and IVF layout however many workers there are. Rows appended
+# since the snapshot sit in a small per-process tail next to the mapped matrix (see
+# FaceGallery) until the leader's next compaction indexes them into a new snapshot.
+_GENERATION_FILE = "generation"
+_SYNC_LOCK_FILE = "sync.lock"
+_LEADER_LOCK_FILE = "leader.lock"
+_INITIAL_JOURNAL = "gallery-initial" # Journal name before the first snapshot exists
+
+_maintenance_thread = None
+_maintenance_stop = threading.Event()
+
+
+def shared_gallery_supported() -> bool:
+    return fcntl is not None
+
+
+def _encode_embeddings(encodings: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(encodings, dtype="<f4").tobytes()).decode("ascii")
+
+
+def _decode_embeddings(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype="<f4").reshape(-1, ENCODING_DIMENSIONS)
+
+
+class SharedGalleryStore:
+    """
+    Keeps a FaceGallery in step with the same gallery in the other worker processes.
+
+    Writes go through publish_*(): the write is appended to the journal under the exclusive
+    lock and applied locally right away. Other processes apply it on their next
+    gallery.refresh() call or maintenance run. Writes from any process are applied in the
+    same order everywhere. Every method may wait for the file lock: call them off the event loop.
+    """
+
+    def __init__(self, folder: str = GALLERY_SNAPSHOT_FOLDER):
+        if fcntl is None:
+            raise RuntimeError("Sharing the gallery between processes requires POSIX file locks.")
+        self.folder = folder
+        self.applied_generation = -1 # Forces the first sync
+        self.snapshot_name = None
+        self.snapshot_generation = 0
+        self._journal_offset = 0
+        self._thread_lock = threading.Lock() # flock does not exclude threads sharing the descriptor
+        self._lock_fd = os.open(os.path.join(folder, _SYNC_LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        self._leader_fd = None
+
+        generation_fd = os.open(os.path.join(folder, _GENERATION_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with self._locked(fcntl.LOCK_EX):
+                if os.fstat(generation_fd).st_size < 8:
+                    os.ftruncate(generation_fd, 8)
+                self._generation_map = mmap.mmap(generation_fd, 8)
+                self._generation = np.frombuffer(self._generation_map, dtype=np.int64)
+                stored = load_gallery_snapshot(folder)
+                if stored is not None and stored["generation"] > self._generation[0]:
+                    self._generation[0] = stored["generation"] # Counter file was lost; never go backwards
+        finally:
+            os.close(generation_fd)
+
+    @contextmanager
+    def _locked(self, operation: int):
+        with self._thread_lock:
+            fcntl.flock(self._lock_fd, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    @property
+    def generation(self) -> int:
+        return int(self._generation[0])
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader_fd is not None
+
+    def is_stale(self) -> bool:
+        return self.generation != self.applied_generation
+
+    def _journal_path(self) -> str:
+        return os.path.join(self.folder, f"{self.snapshot_name or _INITIAL_JOURNAL}.journal")
+
+    def sync(self, gallery: FaceGallery):
+        """Applies everything other processes have published since the last sync."""
+        with self._locked(fcntl.LOCK_SH):
+            self._sync_locked(gallery)
+
+    def _sync_locked(self, gallery: FaceGallery):
+        stored = None
+        current_name = self._current_snapshot_name()
+        if current_name is not None and current_name != self.snapshot_name:
+            stored = load_gallery_snapshot(self.folder)
+        if stored is not None:
+            gallery._apply_replace(stored["matrix"], stored["infos"], adopt=True, centroids=stored["centroids"], index=stored["index"])
+            self.snapshot_name = stored["name"]
+            self.snapshot_generation = self.applied_generation = stored["generation"]
+            self._journal_offset = 0
+        elif self.applied_generation < 0:
+            self.applied_generation = 0
+
+        self._replay_journal(gallery)
+        self.applied_generation = self.generation
+
+    def _current_snapshot_name(self) -> str | None:
+        try:
+            with open(os.path.join(self.folder, _CURRENT_FILE), "rb") as file_object:
+                return json.load(file_object)["name"]
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+    def _replay_journal(self, gallery: FaceGallery):
+        try:
+            with open(self._journal_path(), "rb") as file_object:
+                file_object.seek(self._journal_offset)
+                data = file_object.read()
+        except FileNotFoundError:
+            return
+
+        complete = data.rfind(b"\n") + 1 # Only whole lines; a writer holds the lock until its line is complete
+        for line in data[:complete].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f"Skipping unreadable gallery journal entry in {self._journal_path()}.")
+                continue
+            if record["g"] <= self.applied_generation:
+                continue
+            self._apply(gallery, record)
+            self.applied_generation = record["g"]
+        self._journal_offset += complete
+
+    def _apply(self, gallery: FaceGallery, record: dict):
+        if record["op"] == "extend":
+            gallery._apply_extend(_decode_embeddings(record["embeddings"]), record["infos"])
+        elif record["op"] == "remove":
+            gallery._apply_remove(record["ids"])
+
+    def _append_journal(self, gallery: FaceGallery, record: dict):
+        """Catches up, then appends one write to the journal and applies it. Caller holds the exclusive lock."""
+        self._sync_locked(gallery)
+        record = {"g": self.generation + 1, **record}
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        fd = os.open(self._journal_path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self._generation[0] = record["g"]
+        self._replay_journal(gallery)
+
+    def publish_extend(self, gallery: FaceGallery, encodings: np.ndarray, infos: list[dict]) -> GallerySnapshot:
+        with self._locked(fcntl.LOCK_EX):
+            self._append_journal(gallery, {"op": "extend", "infos": infos, "embeddings": _encode_embeddings(encodings)})
+            return gallery._snapshot
+
+    def publish_remove(self, gallery: FaceGallery, fugitive_ids: list[str]) -> int:
+        with self._locked(fcntl.LOCK_EX):
+            self._sync_locked(gallery)
+            present = [i for i in fugitive_ids if i in gallery._row_by_id]
+            if present:
+                self._append_journal(gallery, {"op": "remove", "ids": present})
+            return len(present)
+
+    def publish_replace(self, gallery: FaceGallery, encodings, infos: list[dict], centroids: np.ndarray | None = None) -> GallerySnapshot:
+        """
+        Replaces the gallery in every process: the new contents become the shared snapshot
+        directly. Rare (full reloads), so it holds the exclusive lock throughout: writes made
+        meanwhile would refer to the replaced contents.
+        """
+        with self._locked(fcntl.LOCK_EX):
+            self._sync_locked(gallery)
+            gallery._apply_replace(encodings, infos, centroids=centroids)
+            name = write_gallery_snapshot(self._indexed(gallery._snapshot), self.folder, self.generation)
+            self._switch_snapshot_locked(name, self.snapshot_name, self._journal_offset)
+            self._sync_locked(gallery)
+            return gallery._snapshot
+
+    @staticmethod
+    def _indexed(snapshot: GallerySnapshot) -> GallerySnapshot:
+        """
+        The snapshot with its appended rows indexed too, so every process maps the saved index
+        layout instead of building its own.
+        """
+        if snapshot.pending_count == 0:
+            return snapshot
+        matrix, sq_norms = snapshot.rows()
+        return GallerySnapshot(snapshot.version, matrix, sq_norms, snapshot.info, rebuild_index(matrix, sq_norms, previous=snapshot.index))
+
+    def _switch_snapshot_locked(self, name: str, base_name: str | None, base_offset: int):
+        """
+        Makes written snapshot `name` the current one. Its journal starts with the entries
+        written after `base_offset` of the journal of `base_name`, the snapshot it was built
+        from (those it does not contain yet). Caller holds the exclusive lock.
+        """
+        try:
+            with open(os.path.join(self.folder, f"{base_name or _INITIAL_JOURNAL}.journal"), "rb") as file_object:
+                file_object.seek(base_offset)
+                carried = file_object.read()
+        except FileNotFoundError:
+            carried = b""
+        carried = carried[:carried.rfind(b"\n") + 1]
+        fd = os.open(os.path.join(self.folder, f"{name}.journal"), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, carried)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        set_current_snapshot(name, self.folder)
+        self._generation[0] = self.generation + 1 # Every process is now stale and re-maps
+
+    def compact_if_needed(self, gallery: FaceGallery) -> bool:
+        """
+        Folds the journal into a new snapshot if it has entries (leader only). The index and
+        the snapshot files are built without holding the sync lock, so other processes keep
+        reading and writing meanwhile; their writes carry over to the new snapshot's journal.
+        """
+        if not self.is_leader:
+            return False
+        with self._locked(fcntl.LOCK_SH):
+            self._sync_locked(gallery)
+            if self._journal_offset == 0 and self.snapshot_name is not None:
+                return False # Nothing written since the snapshot
+            snapshot = gallery._snapshot
+            if len(snapshot) == 0 and self.snapshot_name is None:
+                return False
+            base_name, base_offset, base_generation = self.snapshot_name, self._journal_offset, self.applied_generation
+
+        name = None
+        try:
+            name = write_gallery_snapshot(self._indexed(snapshot), self.folder, base_generation)
+            with self._locked(fcntl.LOCK_EX):
+                if self._current_snapshot_name() != base_name:
+                    # Replaced by another process meanwhile: this snapshot is outdated
+                    discard_gallery_snapshot(name, self.folder)
+                    return False
+                self._switch_snapshot_locked(name, base_name, base_offset)
+            self.sync(gallery) # Re-map the new snapshot here too, sharing its pages with the other processes
+        except Exception as e:
+            print(f"Error compacting shared gallery: {e}")
+            if name is not None and self._current_snapshot_name() != name:
+                discard_gallery_snapshot(name, self.folder)
+            return False
+        print(f"Compacted shared gallery into snapshot {name} ({len(snapshot)} faces, generation {base_generation}).")
+        return True
+
+    def try_become_leader(self) -> bool:
+        """Takes the leader lock if no other process holds it; kept until this process exits."""
+        if self._leader_fd is not None:
+            return True
+        fd = os.open(os.path.join(self.folder, _LEADER_LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._leader_fd = fd
+        print(f"Process {os.getpid()} is the shared gallery leader.")
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "generation": self.generation,
+            "applied_generation": self.applied_generation,
+            "snapshot": self.snapshot_name,
+            "leader": self.is_leader
+        }
+
+
+def start_sync_maintenance(gallery: FaceGallery, store: SharedGalleryStore, interval: float = GALLERY_SNAPSHOT_SAVE_INTERVAL):
+    """
+    Background thread that, every `interval` seconds, applies other processes' writes (so an
+    idle process does not fall far behind), takes over leadership if the leader exited, and
+    on the leader compacts the journal into a new snapshot.
+    """
+    global _maintenance_thread
+    if _maintenance_thread is not None:
+        return
+    _maintenance_stop.clear()
+
+    def run():
+        while not _maintenance_stop.wait(interval):
+            try:
+                if store.is_stale():
+                    store.sync(gallery)
+                if store.try_become_leader():
+                    store.compact_if_needed(gallery)
+            except Exception as e:
+                print(f"Error maintaining shared gallery: {e}")
+
+    _maintenance_thread = threading.Thread(target=run, daemon=True)
+    _maintenance_thread.start()
+
+
+def stop_sync_maintenance(gallery: FaceGallery, store: SharedGalleryStore):
+    """Stops the maintenance thread; the leader compacts any remaining journal entries."""
+    global _maintenance_thread
+    if _maintenance_thread is not None:
+        _maintenance_stop.set()
+        _maintenance_thread.join()
+        _maintenance_thread = None
+    store.compact_if_needed(gallery)
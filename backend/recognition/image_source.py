@@ -0,0 +1,22 @@
+import cv2
+import numpy as np
+
+from metrics import timed_stage
+
+
+def decode_image_bytes(data: bytes | bytearray | memoryview, rgb: bool = False) -> np.ndarray | None:
+    """
+    Decodes an encoded image (JPEG/PNG/...) straight from memory.
+
+    np.frombuffer wraps the bytes without copying, so the only allocation is the decoded
+    array itself. Returns a BGR array (RGB if `rgb`), or None if the data is not an image.
+    """
+    if data is None or len(data) == 0:
+        return None
+    with timed_stage("decode"):
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+        if rgb:
+            cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+    return image
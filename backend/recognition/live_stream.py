@@ -0,0 +1,199 @@
+import asyncio
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+
+from config import LIVE_STREAM_QUEUE_SIZE, LIVE_STREAM_MAX_FRAME_AGE_MS
+from metrics import FACES_PROCESSED, FRAMES_PROCESSED, LIVE_FRAMES_DROPPED, LIVE_FRAME_LATENCY, request_timings_ms, track_request
+from recognition.face_tracker import FaceTracker
+from recognition.gallery import known_faces
+from recognition.image_source import decode_image_bytes
+from recognition.pipeline import recognize_frame
+
+
+class FrameQueue:
+    """
+    Bounded ingest queue of one live stream. put() never blocks: when the queue is full the
+    oldest frame is dropped, so a consumer slower than the source keeps working on recent
+    frames instead of building up a backlog. Used from the event loop only (sources running
+    in threads hand frames over with call_soon_threadsafe).
+    """
+
+    def __init__(self, maxsize: int = LIVE_STREAM_QUEUE_SIZE):
+        self._frames = deque()
+        self._maxsize = max(1, int(maxsize))
+        self._available = asyncio.Event()
+        self._closed = False
+        self.received = 0
+        self.dropped = {} # reason -> frames
+
+    def put(self, payload):
+        """Queues a frame (JPEG bytes or a decoded BGR array), stamped with its arrival time."""
+        if self._closed:
+            return
+        if len(self._frames) >= self._maxsize:
+            self._frames.popleft()
+            self.drop("queue_full")
+        self._frames.append((self.received, time.perf_counter(), payload))
+        self.received += 1
+        self._available.set()
+
+    def drop(self, reason: str):
+        self.dropped[reason] = self.dropped.get(reason, 0) + 1
+        LIVE_FRAMES_DROPPED.inc(reason=reason)
+
+    def close(self, discard: bool = False):
+        """No more frames will arrive; queued ones are still returned unless `discard`."""
+        self._closed = True
+        if discard:
+            self._frames.clear()
+        self._available.set()
+
+    async def get(self) -> tuple | None:
+        """Oldest queued (frame_id, received_at, payload), waiting for one; None once closed and empty."""
+        while not self._frames:
+            if self._closed:
+                return None
+            self._available.clear()
+            await self._available.wait()
+        return self._frames.popleft()
+
+
+class LocalStreamSource:
+    """
+    Reads a local stream source (camera index, RTSP/HTTP URL or video file) with OpenCV in a
+    thread and feeds a FrameQueue. Every frame is grabbed so the capture buffer never lags
+    behind the live source, but only about `target_fps` frames per second are retrieved
+    (decoded into images). Files are read at their own frame rate, like a live source.
+    """
+
+    def __init__(self, source: str, frame_queue: FrameQueue, target_fps: float):
+        self.source = source
+        self._queue = frame_queue
+        self._interval = 1.0 / target_fps
+        self._stop = threading.Event()
+        self._thread = None
+        self._cap = None
+
+    async def start(self):
+        """Opens the source (raises ValueError if it cannot be opened) and starts reading."""
+        source = int(self.source) if self.source.isdigit() else self.source
+        self._cap = await asyncio.to_thread(cv2.VideoCapture, source)
+        if not self._cap.isOpened():
+            self._cap.release()
+            raise ValueError("Could not open the stream source.")
+        self._thread = threading.Thread(target=self._run, args=(asyncio.get_running_loop(),), daemon=True)
+        self._thread.start()
+
+    def _run(self, loop: asyncio.AbstractEventLoop):
+        frame_rate = self._cap.get(cv2.CAP_PROP_FPS)
+        # Files (known frame count) would otherwise be read as fast as they decode
+        frame_period = 1.0 / frame_rate if self._cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0 and frame_rate > 0 else 0.0
+        started = time.perf_counter()
+        next_retrieve = started
+        frames_grabbed = 0
+        try:
+            while not self._stop.is_set():
+                if not self._cap.grab():
+                    break
+                frames_grabbed += 1
+                now = time.perf_counter()
+                if now >= next_retrieve:
+                    ok, frame = self._cap.retrieve()
+                    if ok:
+                        loop.call_soon_threadsafe(self._queue.put, frame)
+                        next_retrieve = max(next_retrieve + self._interval, now)
+                if frame_period:
+                    delay = started + frames_grabbed * frame_period - time.perf_counter()
+                    if delay > 0:
+                        self._stop.wait(delay)
+        except Exception as e:
+            print(f"Error reading live stream source: {e}")
+        finally:
+            self._cap.release()
+            if not self._stop.is_set():
+                loop.call_soon_threadsafe(self._queue.close)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+async def iter_live_results(
+    frame_queue: FrameQueue, target_fps: float, tracking: bool = True, detection_options: dict | None = None,
+    encoding_options: dict | None = None, max_frame_age_ms: float = LIVE_STREAM_MAX_FRAME_AGE_MS, include_timings: bool = False
+):
+    """
+    Async generator over the recognition results of a live stream, one event per recognized
+    frame, until the queue is closed.
+
+    At most `target_fps` frames per second are recognized (frames arriving in between are
+    dropped by the bounded queue) and frames that waited longer than `max_frame_age_ms` are
+    dropped unprocessed, which bounds the latency from receipt to result. Each frame runs
+    through the regular detect -> encode -> match pipeline against the current gallery; with
+    `tracking`, faces are tracked across frames and only re-encoded periodically.
+    """
+    interval = 1.0 / target_fps
+    tracker = FaceTracker() if tracking else None
+    next_due = time.perf_counter()
+    frames_processed = 0
+
+    while True:
+        delay = next_due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        item = await frame_queue.get()
+        if item is None:
+            break
+        frame_id, received_at, payload = item
+        queue_ms = (time.perf_counter() - received_at) * 1000
+        if queue_ms > max_frame_age_ms:
+            frame_queue.drop("stale")
+            continue
+        next_due = max(next_due + interval, time.perf_counter())
+
+        faces = None
+        with track_request("live_frame"):
+            frame = payload if isinstance(payload, np.ndarray) else await asyncio.to_thread(decode_image_bytes, payload)
+            if frame is not None:
+                if known_faces.stale:
+                    await asyncio.to_thread(known_faces.refresh)
+                gallery = known_faces.snapshot() # Enrollments become visible mid-stream
+                faces = await recognize_frame(
+                    gallery, frame, tracker=tracker, detection_options=detection_options, encoding_options=encoding_options
+                )
+                timings = request_timings_ms() if include_timings else None
+        if faces is None:
+            frame_queue.drop("undecodable")
+            yield {"event": "error", "frame_id": frame_id, "detail": "Could not decode frame."}
+            continue
+
+        latency = time.perf_counter() - received_at
+        LIVE_FRAME_LATENCY.observe(latency)
+        FRAMES_PROCESSED.inc()
+        FACES_PROCESSED.inc(len(faces), operation="live")
+        frames_processed += 1
+        event = {
+            "event": "frame",
+            "frame_id": frame_id,
+            "gallery_version": gallery.version,
+            "queue_ms": round(queue_ms, 3),
+            "latency_ms": round(latency * 1000, 3),
+            "frames_dropped": sum(frame_queue.dropped.values()),
+            "faces": faces
+        }
+        if timings is not None:
+            event["timings_ms"] = timings
+        yield event
+
+    done_event = {
+        "event": "done", "frames_received": frame_queue.received, "frames_processed": frames_processed,
+        "frames_dropped": dict(frame_queue.dropped)
+    }
+    if tracker is not None:
+        done_event["tracking_stats"] = tracker.stats()
+    yield done_event
@@ -0,0 +1,36 @@
+import threading
+import time
+import numpy as np
+
+# Importing face_recognition loads every dlib model (detectors, landmark predictors and the
+# encoder: about a second and ~100 MB per process), so it is only imported on first use.
+# With a worker pool the API process then never loads them at all.
+_face_recognition = None
+_load_seconds = None
+_lock = threading.Lock()
+
+
+def face_recognition_api():
+    """The face_recognition module, imported (loading the dlib models) by the first caller."""
+    global _face_recognition, _load_seconds
+    if _face_recognition is None:
+        with _lock:
+            if _face_recognition is None:
+                started = time.perf_counter()
+                import face_recognition
+                _load_seconds = time.perf_counter() - started
+                print(f"Loaded face recognition models in {_load_seconds:.2f}s.")
+                _face_recognition = face_recognition
+    return _face_recognition
+
+
+def warm_up_models():
+    """Loads the models and runs detection and encoding once, so the first real call is not the slow one."""
+    api = face_recognition_api()
+    api.face_locations(np.zeros((64, 64, 3), dtype=np.uint8))
+    api.face_encodings(np.zeros((64, 64, 3), dtype=np.uint8), known_face_locations=[(0, 64, 64, 0)])
+
+
+def model_stats() -> dict:
+    """Whether this process has loaded the models, and how long that took."""
+    return {"loaded": _face_recognition is not None, "load_seconds": round(_load_seconds, 3) if _load_seconds is not None else None}
@@ -0,0 +1,75 @@
+import cv2
+import numpy as np
+
+from config import MOTION_DOWNSAMPLE_WIDTH, MOTION_THRESHOLD, MOTION_SPIKE_THRESHOLD, MOTION_MAX_SKIPPED
+
+# Decisions returned by MotionGate.check()
+SKIP = "skip"
+PROCESS = "process"
+SPIKE = "spike"
+
+
+class MotionGate:
+    """
+    Cheap scene-change test run before face detection.
+
+    Each sampled frame is reduced to a small blurred grayscale thumbnail and compared with
+    the thumbnail of the last frame that was actually processed (so slow drift still adds
+    up). Nearly identical frames are skipped; large differences are reported as spikes so
+    the sampler can sample more densely.
+    """
+
+    def __init__(
+        self,
+        threshold: float = MOTION_THRESHOLD,
+        spike_threshold: float = MOTION_SPIKE_THRESHOLD,
+        downsample_width: int = MOTION_DOWNSAMPLE_WIDTH,
+        max_skipped: int = MOTION_MAX_SKIPPED,
+    ):
+        self.threshold = threshold
+        self.spike_threshold = spike_threshold
+        self.downsample_width = max(8, int(downsample_width))
+        self.max_skipped = max(0, int(max_skipped))
+        self._reference = None
+        self._skipped_in_row = 0
+
+        self.frames_checked = 0
+        self.frames_skipped = 0
+        self.motion_spikes = 0
+
+    def _thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        size = (self.downsample_width, max(1, round(height * self.downsample_width / width)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def check(self, frame: np.ndarray) -> str:
+        """Returns SKIP, PROCESS or SPIKE for a sampled (BGR) frame."""
+        self.frames_checked += 1
+        thumbnail = self._thumbnail(frame)
+
+        if self._reference is None or self._reference.shape != thumbnail.shape:
+            self._reference = thumbnail
+            return PROCESS
+
+        score = float(cv2.absdiff(thumbnail, self._reference).mean())
+        if score < self.threshold and self._skipped_in_row < self.max_skipped:
+            self._skipped_in_row += 1
+            self.frames_skipped += 1
+            return SKIP
+
+        self._reference = thumbnail
+        self._skipped_in_row = 0
+        if score >= self.spike_threshold:
+            self.motion_spikes += 1
+            return SPIKE
+        return PROCESS
+
+    def stats(self) -> dict:
+        return {
+            "frames_checked": self.frames_checked,
+            "frames_skipped_static": self.frames_skipped,
+            "motion_spikes": self.motion_spikes
+        }
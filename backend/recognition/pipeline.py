@@ -0,0 +1,234 @@
+import asyncio
+from collections import deque
+import numpy as np
+
+from metrics import timed_stage
+from recognition.face_matcher import ENCODING_DIMENSIONS
+from recognition.face_tracker import FaceTracker
+from recognition.gallery import GallerySnapshot
+from recognition.video_source import VideoFrameSampler
+from recognition.workers import SharedFrame, detect_and_encode_image_bytes, encode_photo_bytes, run_in_worker, worker_count
+
+
+def match_faces(gallery: GallerySnapshot, detected_faces: list, face_encodings) -> list:
+    """Matches all encodings of one image/frame against the gallery in a single call."""
+    with timed_stage("match"):
+        best_match_indices, best_match_distances = gallery.search(face_encodings)
+
+    identified_faces_info = []
+    for i, best_match_index in enumerate(best_match_indices):
+        face_result = {
+            "box": detected_faces[i]["box"],
+            "match": False,
+            "info": None,
+            "distance": float(best_match_distances[i]) if np.isfinite(best_match_distances[i]) else None
+        }
+
+        if best_match_index >= 0:
+            face_result["match"] = True
+            face_result["info"] = gallery.info[best_match_index]
+
+        identified_faces_info.append(face_result)
+    return identified_faces_info
+
+
+def rematch_faces(gallery: GallerySnapshot, faces: list, face_encodings: np.ndarray) -> list:
+    """
+    Re-runs only the matching step for face results computed earlier (possibly against another
+    gallery version), given the encoding behind each one. All faces are searched in one call;
+    rows that are not finite (encoding failed) stay unmatched. Other keys (box, track_id, ...)
+    are kept.
+    """
+    encodable = np.isfinite(face_encodings).all(axis=1)
+    best_match_indices = np.full(len(faces), -1)
+    best_match_distances = np.full(len(faces), np.nan)
+    if encodable.any():
+        with timed_stage("match"):
+            best_match_indices[encodable], best_match_distances[encodable] = gallery.search(face_encodings[encodable])
+
+    rematched_faces = []
+    for face_result, best_match_index, distance in zip(faces, best_match_indices, best_match_distances):
+        matched = bool(best_match_index >= 0)
+        rematched_faces.append({
+            **face_result,
+            "match": matched,
+            "info": gallery.info[best_match_index] if matched else None,
+            "distance": float(distance) if np.isfinite(distance) else None
+        })
+    return rematched_faces
+
+
+async def _track_and_match(
+    gallery: GallerySnapshot, shared_frame: SharedFrame, detected_faces: list, tracker: FaceTracker, encoding_options: dict | None = None
+) -> tuple[list, np.ndarray]:
+    """
+    Encodes and matches only the faces whose track needs (re-)verification. Also returns the
+    encoding each face's identity is based on (its track's last verified one; NaN if none).
+    """
+    assignments = tracker.update(detected_faces)
+    to_verify = [i for i, (_, needs_verification) in enumerate(assignments) if needs_verification]
+
+    if to_verify:
+        face_encodings = await shared_frame.encode([detected_faces[i]["location"] for i in to_verify], encoding_options)
+        fresh_results = match_faces(gallery, [detected_faces[i] for i in to_verify], face_encodings)
+        for i, face_result, face_encoding in zip(to_verify, fresh_results, face_encodings):
+            tracker.verified(assignments[i][0], face_result, face_encoding)
+
+    identified_faces_info = []
+    identity_encodings = np.full((len(assignments), ENCODING_DIMENSIONS), np.nan, dtype=np.float32)
+    for i, (track, _) in enumerate(assignments):
+        face_result = tracker.carried_result(track)
+        face_result["track_id"] = track.track_id
+        face_result["tracked"] = i not in to_verify # Identity carried forward, not re-encoded
+        identified_faces_info.append(face_result)
+        if track.encoding is not None:
+            identity_encodings[i] = track.encoding
+    return identified_faces_info, identity_encodings
+
+
+async def recognize_frame_with_encodings(
+    gallery: GallerySnapshot, frame: np.ndarray, is_bgr: bool = True, tracker: FaceTracker | None = None, detection_options: dict | None = None,
+    encoding_options: dict | None = None
+) -> tuple[list, np.ndarray]:
+    """recognize_frame() that also returns the encoding behind each face result, row-aligned."""
+    async with SharedFrame(frame, is_bgr) as shared_frame:
+        if tracker is not None:
+            detected_faces = await shared_frame.detect(detection_options)
+            return await _track_and_match(gallery, shared_frame, detected_faces, tracker, encoding_options)
+
+        detected_faces, face_encodings = await shared_frame.detect_and_encode(detection_options, encoding_options)
+        if not detected_faces:
+            return [], face_encodings
+        return match_faces(gallery, detected_faces, face_encodings), face_encodings
+
+
+async def recognize_frame(
+    gallery: GallerySnapshot, frame: np.ndarray, is_bgr: bool = True, tracker: FaceTracker | None = None, detection_options: dict | None = None,
+    encoding_options: dict | None = None
+) -> list:
+    """
+    Detect -> encode (worker pool) -> match (in process) for one image or frame.
+    `detection_options` are passed to detect_faces_in_frame() (detection_scale, roi, ...) and
+    `encoding_options` to get_face_encodings_from_frame() (see recognition.profiles).
+    """
+    identified_faces_info, _ = await recognize_frame_with_encodings(gallery, frame, is_bgr, tracker, detection_options, encoding_options)
+    return identified_faces_info
+
+
+async def _map_in_workers(func, items: list, *args, max_in_flight: int | None = None) -> list:
+    """
+    Runs func(item, *args) for every item on the worker pool, keeping up to `max_in_flight`
+    (default: two per worker process, so no worker waits for its next item) in flight.
+    Results are in item order; items that raised give None.
+    """
+    semaphore = asyncio.Semaphore(max_in_flight or 2 * worker_count())
+
+    async def process(item):
+        async with semaphore:
+            try:
+                return await run_in_worker(func, item, *args)
+            except Exception as e:
+                print(f"Error in worker job {func.__name__}: {e}")
+                return None
+
+    return await asyncio.gather(*(process(item) for item in items))
+
+
+async def detect_and_encode_images(
+    images: list[bytes], detection_options: dict | None = None, encoding_options: dict | None = None, max_in_flight: int | None = None
+) -> list:
+    """
+    Decode -> detect -> encode for many encoded images on the worker pool. Returns, per image,
+    (detected_faces, encodings) or None if it failed.
+    """
+    return await _map_in_workers(detect_and_encode_image_bytes, images, detection_options, encoding_options, max_in_flight=max_in_flight)
+
+
+async def encode_enrollment_photos(
+    photos: list[bytes], detection_options: dict | None = None, encoding_options: dict | None = None, max_in_flight: int | None = None
+) -> list:
+    """encode_photo_bytes() for many enrollment photos on the worker pool, in order."""
+    return await _map_in_workers(encode_photo_bytes, photos, detection_options, encoding_options, max_in_flight=max_in_flight)
+
+
+async def _detect_stage(frame: np.ndarray, detection_options: dict | None) -> tuple[SharedFrame, list]:
+    """Detection only; the shared frame stays open for the (in-order) tracking/encoding stage."""
+    shared_frame = SharedFrame(frame, is_bgr=True)
+    try:
+        return shared_frame, await shared_frame.detect(detection_options)
+    except BaseException:
+        shared_frame.close()
+        raise
+
+
+async def iter_video_results(
+    gallery: GallerySnapshot, sampler: VideoFrameSampler, max_in_flight: int | None = None, tracker: FaceTracker | None = None,
+    detection_options: dict | None = None, encoding_options: dict | None = None
+):
+    """
+    Async generator over the sampled frames of a video, in order.
+
+    Yields (frame_index, timestamp_ms, bgr_frame, faces, face_encodings), the encodings being
+    row-aligned with faces (see recognize_frame_with_encodings()). Decoding runs in a thread and up to
+    `max_in_flight` frames (default: one per worker process) are processed concurrently.
+    With a tracker, only detection runs ahead; association, encoding and matching happen
+    in frame order so tracks see the frames sequentially.
+    """
+    max_in_flight = max_in_flight or worker_count()
+    frames = iter(sampler)
+    in_flight = deque()
+
+    try:
+        while True:
+            sampled = await asyncio.to_thread(next, frames, None)
+            if sampled is not None:
+                frame_index, timestamp_ms, frame = sampled
+                if tracker is not None:
+                    stage = _detect_stage(frame, detection_options)
+                else:
+                    stage = recognize_frame_with_encodings(gallery, frame, detection_options=detection_options, encoding_options=encoding_options)
+                in_flight.append((frame_index, timestamp_ms, frame, asyncio.ensure_future(stage)))
+
+            if in_flight and (sampled is None or len(in_flight) >= max_in_flight):
+                frame_index, timestamp_ms, frame, task = in_flight.popleft()
+                if tracker is None:
+                    faces, face_encodings = await task
+                else:
+                    shared_frame, detected_faces = await task
+                    async with shared_frame:
+                        faces, face_encodings = await _track_and_match(gallery, shared_frame, detected_faces, tracker, encoding_options)
+                yield frame_index, timestamp_ms, frame, faces, face_encodings
+            elif sampled is None:
+                break
+    finally:
+        for *_, task in in_flight:
+            task.cancel()
+            if tracker is not None and task.done() and not task.cancelled() and task.exception() is None:
+                task.result()[0].close()
+
+
+async def replay_video_results(gallery: GallerySnapshot, sampler: VideoFrameSampler, cached_frames: dict):
+    """
+    iter_video_results() for a video whose per-frame results and encodings are already known
+    (`cached_frames`: frame_index -> (faces, face_encodings)): frames are decoded again (for
+    annotation) but detection and encoding are skipped, and all faces of the whole video are
+    re-matched against `gallery` in a single search.
+    """
+    frame_indices = sorted(cached_frames)
+    all_faces = [face for i in frame_indices for face in cached_frames[i][0]]
+    all_encodings = [cached_frames[i][1] for i in frame_indices]
+    if all_faces:
+        rematched = iter(rematch_faces(gallery, all_faces, np.concatenate(all_encodings)))
+    else:
+        rematched = iter(())
+
+    faces_by_frame = {i: [next(rematched) for _ in cached_frames[i][0]] for i in frame_indices}
+
+    frames = iter(sampler)
+    while True:
+        sampled = await asyncio.to_thread(next, frames, None)
+        if sampled is None:
+            break
+        frame_index, timestamp_ms, frame = sampled
+        if frame_index in cached_frames:
+            yield frame_index, timestamp_ms, frame, faces_by_frame[frame_index], cached_frames[frame_index][1]
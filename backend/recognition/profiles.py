@@ -0,0 +1,34 @@
+from config import RECOGNITION_PROFILES, RECOGNITION_PROFILE
+
+# Profile settings by the call they configure: keyword arguments of detect_faces_in_frame()
+# and of get_face_encodings_from_frame() respectively
+DETECTION_SETTINGS = ("detection_model", "upsample", "detection_scale", "prefilter")
+ENCODING_SETTINGS = ("num_jitters", "landmark_model")
+
+
+def resolve_profile(name: str | None = None, detection_scale: float | None = None) -> dict:
+    """
+    Effective settings of a recognition profile (default RECOGNITION_PROFILE) as
+    {"name": ..., setting: value}, with a per-request `detection_scale` overriding the
+    profile's. Raises ValueError for an unknown profile name.
+    """
+    name = name or RECOGNITION_PROFILE
+    if name not in RECOGNITION_PROFILES:
+        raise ValueError(f"Unknown profile: {name}. Available profiles: {', '.join(RECOGNITION_PROFILES)}.")
+    profile = {"name": name, **RECOGNITION_PROFILES[name]}
+    if detection_scale is not None:
+        profile["detection_scale"] = detection_scale
+    return profile
+
+
+def profile_detection_options(profile: dict) -> dict:
+    return {setting: profile[setting] for setting in DETECTION_SETTINGS}
+
+
+def profile_encoding_options(profile: dict) -> dict:
+    return {setting: profile[setting] for setting in ENCODING_SETTINGS}
+
+
+def profile_settings_key(profile: dict) -> tuple:
+    """The settings that determine detection/encoding results, for cache keys (the name is not one)."""
+    return tuple((setting, profile[setting]) for setting in DETECTION_SETTINGS + ENCODING_SETTINGS)
@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from config import RESULT_CACHE_ENABLED, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL_SECONDS
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def content_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def save_and_digest(source, path: str) -> str:
+    """Copies an upload stream to `path` and hashes it in the same pass over the data."""
+    digest = hashlib.sha256()
+    with open(path, "wb") as file_object:
+        while chunk := source.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+            file_object.write(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    LRU cache with a TTL, bounded by entry count and by an approximate byte budget
+    (callers pass each value's size). A budget of 0 disables caching.
+
+    acquire()/release() serialize work on one key, so a retry that arrives while the
+    first attempt is still running waits for it and then finds its result cached.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES if RESULT_CACHE_ENABLED else 0,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = RESULT_CACHE_TTL_SECONDS,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> (expires_at, nbytes, value), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {} # key -> [asyncio.Lock, number of holders/waiters]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, value, nbytes: int):
+        if nbytes > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, nbytes, value)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        self._bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    async def acquire(self, key):
+        key_lock = self._key_locks.setdefault(key, [asyncio.Lock(), 0])
+        key_lock[1] += 1
+        try:
+            await key_lock[0].acquire()
+        except BaseException:
+            self._unref(key, key_lock)
+            raise
+
+    def release(self, key):
+        key_lock = self._key_locks[key]
+        key_lock[0].release()
+        self._unref(key, key_lock)
+
+    def _unref(self, key, key_lock):
+        key_lock[1] -= 1
+        if key_lock[1] == 0:
+            del self._key_locks[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+# Shared by /api/recognize/: whole responses keyed by (content key, gallery version) and
+# gallery-independent detections + encodings keyed by the content key alone.
+result_cache = ResultCache()
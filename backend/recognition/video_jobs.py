@@ -0,0 +1,172 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+
+from config import (
+    MAX_CONCURRENT_JOBS, MAX_QUEUED_JOBS, TRACKING_ENABLED, MOTION_GATING_ENABLED, JOB_LEASE_SECONDS, JOB_HEARTBEAT_INTERVAL, JOB_POLL_INTERVAL
+)
+from database.job_store import (
+    connect_job_store, close_job_store, create_job, get_job, list_jobs, count_jobs, update_owned_job, append_frame_result,
+    claim_job, renew_job_lease, release_job, requeue_expired_jobs, request_job_cancel
+)
+from recognition.face_tracker import FaceTracker
+from recognition.gallery import known_faces
+from recognition.motion import MotionGate
+from recognition.pipeline import iter_video_results
+from recognition.video_source import VideoFrameSampler
+
+# Bounded scheduler for asynchronous video recognition jobs. Job state lives in the job
+# store, which all worker processes share: runners claim queued jobs there (whichever process
+# they were submitted to), renew the claim while running and poll it for cancellation.
+_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}" # This process, as the owner of claimed jobs
+_wakeup = None # asyncio.Event set when a job is submitted to this process
+_runners = []
+_cancel_events = {} # job_id -> asyncio.Event for jobs this process is running
+
+
+class JobQueueFullError(Exception):
+    pass
+
+
+async def start_job_scheduler(num_runners: int = MAX_CONCURRENT_JOBS):
+    """Opens the job store, re-queues jobs whose process died mid-way and starts the runners."""
+    global _wakeup, _runners
+    if _wakeup is not None:
+        return
+    connect_job_store()
+    _wakeup = asyncio.Event()
+    for job_id in requeue_expired_jobs():
+        print(f"Re-queued interrupted job {job_id}; it resumes after its last stored frame.")
+    _runners = [asyncio.create_task(_runner()) for _ in range(max(1, num_runners))]
+    print(f"Job scheduler started with {len(_runners)} runner(s), {count_jobs(('queued',))} job(s) queued.")
+
+
+async def stop_job_scheduler():
+    global _wakeup, _runners
+    for task in _runners:
+        task.cancel()
+    await asyncio.gather(*_runners, return_exceptions=True)
+    _runners = []
+    _wakeup = None
+    close_job_store()
+
+
+def submit_job(job_id: str, filename: str, video_path: str, sample_interval_ms: float | None) -> dict:
+    if _wakeup is None:
+        raise RuntimeError("Job scheduler is not running.")
+    if count_jobs(("queued",)) >= MAX_QUEUED_JOBS:
+        raise JobQueueFullError(f"Too many queued jobs (limit {MAX_QUEUED_JOBS}).")
+    job = create_job(job_id, filename, video_path, sample_interval_ms)
+    _wakeup.set()
+    return job
+
+
+def cancel_job(job_id: str) -> dict | None:
+    """
+    Cancels a queued job immediately, or asks a running one to stop after its current frame
+    (through the job store, so it works whichever process runs the job).
+    """
+    job = get_job(job_id)
+    if job is None:
+        return None
+    outcome = request_job_cancel(job_id)
+    if outcome == "cancelled":
+        _remove_video(job)
+    elif outcome == "cancel_requested" and job_id in _cancel_events:
+        _cancel_events[job_id].set() # Running here: no need to wait for the next heartbeat
+    return get_job(job_id)
+
+
+def _remove_video(job: dict):
+    if os.path.exists(job["video_path"]):
+        os.remove(job["video_path"])
+
+
+async def _next_job() -> dict:
+    """Claims the oldest queued job, waiting (and re-queuing jobs of dead processes) until there is one."""
+    while True:
+        _wakeup.clear()
+        for job_id in requeue_expired_jobs():
+            print(f"Re-queued job {job_id}: its process stopped renewing the lease.")
+        for job in list_jobs(("queued",), limit=MAX_QUEUED_JOBS):
+            if claim_job(job["job_id"], _OWNER, JOB_LEASE_SECONDS):
+                return get_job(job["job_id"])
+        try:
+            await asyncio.wait_for(_wakeup.wait(), JOB_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _heartbeat(job_id: str, cancel_event: asyncio.Event):
+    """Renews this process's claim on a running job and picks up cancellation requests."""
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+        job = renew_job_lease(job_id, _OWNER, JOB_LEASE_SECONDS)
+        if job is None or job["cancel_requested"]:
+            cancel_event.set() # Claim lost (another process resumed the job) or cancelled
+            return
+
+
+async def _runner():
+    while True:
+        job = await _next_job()
+        job_id = job["job_id"]
+        try:
+            await _run_job(job)
+        except asyncio.CancelledError:
+            # Shutdown: leave the job resumable by any process
+            release_job(job_id, _OWNER)
+            raise
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            if update_owned_job(job_id, _OWNER, status="failed", error=str(e), finished_at=time.time(), lease_expires=None):
+                _remove_video(job)
+
+
+async def _run_job(job: dict):
+    """Runs a job this process has claimed, resuming after its last stored frame."""
+    job_id = job["job_id"]
+    cancel_event = _cancel_events[job_id] = asyncio.Event()
+    if job["cancel_requested"]:
+        cancel_event.set()
+    heartbeat = asyncio.create_task(_heartbeat(job_id, cancel_event))
+    sampler = None
+    try:
+        gallery = await asyncio.to_thread(known_faces.refresh)
+        if len(gallery) == 0:
+            raise Exception("No known faces loaded.")
+
+        sampler = await asyncio.to_thread(
+            VideoFrameSampler, job["video_path"], interval_ms=job["sample_interval_ms"], start_frame=job["last_frame_index"] + 1,
+            motion_gate=MotionGate() if MOTION_GATING_ENABLED else None
+        )
+        update_owned_job(
+            job_id, _OWNER, started_at=job["started_at"] or time.time(), gallery_version=gallery.version,
+            frames_total=job["frames_done"] + sampler.expected_samples()
+        )
+        print(f"Job {job_id}: processing {job['filename']} from frame {sampler.start_frame}.")
+
+        started = time.perf_counter()
+        frames_this_run = 0
+        tracker = FaceTracker() if TRACKING_ENABLED else None
+        if not cancel_event.is_set():
+            async for frame_index, timestamp_ms, frame, faces, _ in iter_video_results(gallery, sampler, tracker=tracker):
+                frames_this_run += 1
+                fps = frames_this_run / max(time.perf_counter() - started, 1e-6)
+                if not append_frame_result(job_id, _OWNER, frame_index, timestamp_ms, faces, round(fps, 2)) or cancel_event.is_set():
+                    break
+
+        final_status = "cancelled" if cancel_event.is_set() else "completed"
+        if not update_owned_job(job_id, _OWNER, status=final_status, finished_at=time.time(), lease_expires=None):
+            # Another process took the job over (this one stalled past its lease): it owns the video now
+            print(f"Job {job_id}: claim lost after {frames_this_run} frames, stopped.")
+            return
+        print(f"Job {job_id}: {final_status} ({frames_this_run} frames this run).")
+        _remove_video(job)
+    finally:
+        heartbeat.cancel()
+        _cancel_events.pop(job_id, None)
+        if sampler is not None:
+            sampler.close()
@@ -0,0 +1,148 @@
+import time
+import cv2
+import numpy as np
+
+from config import VIDEO_FRAME_INTERVAL, VIDEO_SAMPLE_INTERVAL_MS, MOTION_DENSE_FRAME_INTERVAL, MOTION_DENSE_DURATION_FRAMES
+from metrics import record_stage
+from recognition.motion import MotionGate, SKIP, SPIKE
+
+
+class VideoFrameSampler:
+    """
+    Reads a video strictly forward and yields only the sampled frames.
+
+    Every frame is demuxed/decoded with grab(), which is cheap compared to a seek, and only
+    the sampled ones are converted to images with retrieve(). Sampling is either every
+    `frame_interval` frames or, if `interval_ms` is given, one frame every `interval_ms`
+    milliseconds of video time.
+
+    Iterating yields (frame_index, timestamp_ms, bgr_frame). `start_frame` (used to resume an
+    interrupted job) costs a single seek before reading forward.
+
+    With a `motion_gate`, sampled frames that are static compared to the last yielded one are
+    dropped here, in the decode thread, and a motion spike switches to sampling every
+    MOTION_DENSE_FRAME_INTERVAL frames for the next MOTION_DENSE_DURATION_FRAMES frames.
+    """
+
+    def __init__(
+        self,
+        video_path: str,
+        frame_interval: int = VIDEO_FRAME_INTERVAL,
+        interval_ms: float | None = VIDEO_SAMPLE_INTERVAL_MS,
+        start_frame: int = 0,
+        motion_gate: MotionGate | None = None,
+    ):
+        self.video_path = video_path
+        self.frame_interval = max(1, int(frame_interval)) # Ensure interval is at least 1
+        self.interval_ms = float(interval_ms) if interval_ms else None
+        self.start_frame = max(0, int(start_frame))
+        self.motion_gate = motion_gate
+        self.dense_frame_interval = max(1, int(MOTION_DENSE_FRAME_INTERVAL))
+        self._dense_until_frame = -1
+
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise Exception(f"Error opening video file: {video_path}")
+
+        self.frame_rate = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        if self.start_frame > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+
+        self.frames_grabbed = 0
+        self.frames_retrieved = 0
+        self.decode_seconds = 0.0
+
+    def video_info(self) -> dict:
+        return {
+            "frame_count": self.frame_count,
+            "frame_rate": self.frame_rate,
+            "width": self.width,
+            "height": self.height
+        }
+
+    def expected_samples(self) -> int:
+        """Estimated number of frames the sampler will yield (from the container metadata)."""
+        remaining = max(0, self.frame_count - self.start_frame)
+        if self.interval_ms is not None and self.frame_rate > 0:
+            return int(np.ceil(remaining * 1000.0 / self.frame_rate / self.interval_ms))
+        first = (-self.start_frame) % self.frame_interval
+        return max(0, (remaining - first + self.frame_interval - 1) // self.frame_interval)
+
+    def _timestamp_ms(self, frame_index: int) -> float:
+        timestamp_ms = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        if timestamp_ms <= 0 and frame_index > 0 and self.frame_rate > 0:
+            timestamp_ms = frame_index * 1000.0 / self.frame_rate
+        return timestamp_ms
+
+    def __iter__(self):
+        frame_index = self.start_frame - 1
+        next_sample_ms = None
+        last_sampled_index = None
+
+        while True:
+            started = time.perf_counter()
+            grabbed = self.cap.grab()
+            self.decode_seconds += time.perf_counter() - started
+            if not grabbed:
+                break # End of video or read error
+            frame_index += 1
+            self.frames_grabbed += 1
+
+            if frame_index <= self._dense_until_frame:
+                # Dense sampling after a motion spike
+                if last_sampled_index is not None and frame_index - last_sampled_index < self.dense_frame_interval:
+                    continue
+                timestamp_ms = self._timestamp_ms(frame_index)
+            elif self.interval_ms is not None:
+                timestamp_ms = self._timestamp_ms(frame_index)
+                if next_sample_ms is not None and timestamp_ms < next_sample_ms:
+                    continue
+                next_sample_ms = timestamp_ms + self.interval_ms
+            else:
+                if frame_index % self.frame_interval != 0:
+                    continue
+                timestamp_ms = self._timestamp_ms(frame_index)
+            last_sampled_index = frame_index
+
+            started = time.perf_counter()
+            retrieved, frame = self.cap.retrieve()
+            self.decode_seconds += time.perf_counter() - started
+            record_stage("video_decode", time.perf_counter() - started)
+            if not retrieved:
+                print(f"Warning: Could not retrieve frame {frame_index}. Skipping it.")
+                continue
+            self.frames_retrieved += 1
+
+            if self.motion_gate is not None:
+                decision = self.motion_gate.check(frame)
+                if decision == SKIP:
+                    continue
+                if decision == SPIKE:
+                    self._dense_until_frame = frame_index + MOTION_DENSE_DURATION_FRAMES
+
+            yield frame_index, timestamp_ms, frame
+
+    def stats(self) -> dict:
+        """Decode throughput so far (time spent inside grab/retrieve only) and motion gating counts."""
+        stats = {
+            "frames_decoded": self.frames_grabbed,
+            "frames_sampled": self.frames_retrieved,
+            "decode_seconds": round(self.decode_seconds, 4),
+            "decode_fps": round(self.frames_grabbed / self.decode_seconds, 2) if self.decode_seconds > 0 else None
+        }
+        if self.motion_gate is not None:
+            stats.update(self.motion_gate.stats())
+        return stats
+
+    def close(self):
+        self.cap.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
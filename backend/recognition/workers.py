@@ -0,0 +1,202 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+
+from config import RECOGNITION_WORKERS
+from metrics import record_collected, run_collecting
+from recognition.face_detector import detect_faces_in_frame
+from recognition.face_encoder import get_face_encodings_from_frame
+from recognition.face_matcher import ENCODING_DIMENSIONS
+from recognition.image_source import decode_image_bytes
+from recognition.models import warm_up_models
+
+# Process pool running the CPU-bound dlib detection/encoding off the event loop.
+# None means no pool was started: jobs then run in a thread of the API process.
+_executor = None
+_num_workers = 0
+
+
+def _init_worker():
+    """Runs once in every worker process: warms up the dlib models before the first job."""
+    warm_up_models()
+
+
+def _detect_job(rgb_frame: np.ndarray, detection_options: dict | None = None) -> list:
+    return detect_faces_in_frame(rgb_frame, **(detection_options or {}))
+
+
+def _encode_job(rgb_frame: np.ndarray, face_locations: list[tuple], encoding_options: dict | None = None) -> np.ndarray:
+    face_encodings = get_face_encodings_from_frame(rgb_frame, face_locations, **(encoding_options or {}))
+    return np.asarray(face_encodings, dtype=np.float32).reshape(-1, ENCODING_DIMENSIONS)
+
+
+def _detect_and_encode_job(
+    rgb_frame: np.ndarray, detection_options: dict | None = None, encoding_options: dict | None = None
+) -> tuple[list, np.ndarray]:
+    detected_faces = _detect_job(rgb_frame, detection_options)
+    return detected_faces, _encode_job(rgb_frame, [d["location"] for d in detected_faces], encoding_options)
+
+
+_FRAME_JOBS = {
+    "detect": _detect_job,
+    "encode": _encode_job,
+    "detect_and_encode": _detect_and_encode_job,
+}
+
+
+def _run_on_shared_frame(job_name: str, shm_name: str, shape: tuple, dtype: str, *args):
+    """Worker-side entry point: reads the frame zero-copy from a shared memory segment."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        frame = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        try:
+            return _FRAME_JOBS[job_name](frame, *args)
+        finally:
+            del frame # Release the buffer export before closing the segment
+    finally:
+        shm.close()
+
+
+def encode_photo_bytes(
+    data: bytes, detection_options: dict | None = None, encoding_options: dict | None = None
+) -> tuple[list, np.ndarray | None] | None:
+    """
+    Worker job for enrollment photos: decodes the uploaded bytes once and runs detection and,
+    if there is exactly one face, encoding on that same array. Returns None if the data is
+    not a decodable image, else the detections and the encoding (or None).
+    """
+    rgb_image = decode_image_bytes(data, rgb=True)
+    if rgb_image is None:
+        return None
+    # Enrollment photos are expected to show a face: no pre-filter that could reject one
+    detected_faces = detect_faces_in_frame(rgb_image, **{**(detection_options or {}), "prefilter": False})
+    if len(detected_faces) != 1:
+        return detected_faces, None
+    face_encodings = get_face_encodings_from_frame(rgb_image, [detected_faces[0]["location"]], **(encoding_options or {}))
+    return detected_faces, face_encodings[0] if face_encodings else None
+
+
+def detect_and_encode_image_bytes(
+    data: bytes, detection_options: dict | None = None, encoding_options: dict | None = None
+) -> tuple[list, np.ndarray] | None:
+    """
+    Worker job for batches: decodes, detects and encodes one encoded image, so only the
+    compressed bytes cross the process boundary. Returns None if the data is not an image.
+    """
+    rgb_image = decode_image_bytes(data, rgb=True)
+    if rgb_image is None:
+        return None
+    return _detect_and_encode_job(rgb_image, detection_options, encoding_options)
+
+
+def start_worker_pool(num_workers: int = RECOGNITION_WORKERS):
+    """Starts the worker processes (spawned, so they do not inherit the server's threads)."""
+    global _executor, _num_workers
+    if _executor is not None or num_workers <= 0:
+        return
+    _executor = ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker
+    )
+    _num_workers = num_workers
+    print(f"Started recognition worker pool with {num_workers} processes.")
+
+
+def shutdown_worker_pool():
+    global _executor, _num_workers
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+        _num_workers = 0
+        print("Recognition worker pool shut down.")
+
+
+async def warm_up_workers():
+    """
+    Starts the worker processes (each loads the models in its initializer before taking a job)
+    by giving each one a warm-up job; without a pool the models are loaded in this process.
+    """
+    if _executor is None:
+        await asyncio.to_thread(warm_up_models)
+        return
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(_executor, warm_up_models) for _ in range(_num_workers)))
+
+
+def worker_count() -> int:
+    """Number of jobs that can usefully run at once."""
+    return max(1, _num_workers)
+
+
+async def run_in_worker(func, *args):
+    """
+    Runs a picklable top-level function in the pool (or a thread if no pool is running).
+    Stage timings and counter increments the job records come back with its result and are
+    recorded here.
+    """
+    if _executor is None:
+        result, collected = await asyncio.to_thread(run_collecting, func, *args)
+    else:
+        result, collected = await asyncio.get_running_loop().run_in_executor(_executor, run_collecting, func, *args)
+    record_collected(collected)
+    return result
+
+
+class SharedFrame:
+    """
+    RGB copy of a frame that several worker jobs (e.g. detect, then encode a subset of the
+    faces) can read. With a pool it lives in a shared memory segment, so it is written once
+    (the BGR->RGB conversion writes straight into it) and never pickled.
+
+    Use as an async context manager so the segment is always released.
+    """
+
+    def __init__(self, frame: np.ndarray, is_bgr: bool = False):
+        self._shm = None
+        if _executor is None:
+            self.rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if is_bgr else frame
+            return
+
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, frame.nbytes))
+        self.rgb = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self._shm.buf)
+        if is_bgr:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        else:
+            self.rgb[...] = frame
+
+    async def _run(self, job_name: str, *args):
+        if self._shm is None:
+            result, collected = await asyncio.to_thread(run_collecting, _FRAME_JOBS[job_name], self.rgb, *args)
+            record_collected(collected)
+            return result
+        return await run_in_worker(_run_on_shared_frame, job_name, self._shm.name, self.rgb.shape, self.rgb.dtype.str, *args)
+
+    async def detect(self, detection_options: dict | None = None) -> list:
+        """`detection_options` are keyword arguments for detect_faces_in_frame() (scale, roi, model, ...)."""
+        return await self._run("detect", detection_options)
+
+    async def encode(self, face_locations: list[tuple], encoding_options: dict | None = None) -> np.ndarray:
+        """`encoding_options` are keyword arguments for get_face_encodings_from_frame() (num_jitters, landmark_model)."""
+        if not face_locations:
+            return np.empty((0, ENCODING_DIMENSIONS), dtype=np.float32)
+        return await self._run("encode", face_locations, encoding_options)
+
+    async def detect_and_encode(self, detection_options: dict | None = None, encoding_options: dict | None = None) -> tuple[list, np.ndarray]:
+        return await self._run("detect_and_encode", detection_options, encoding_options)
+
+    def close(self):
+        if self._shm is not None:
+            del self.rgb # Release the buffer export before closing the segment
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
@@ -1,114 +1,317 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status
+from fastapi import APIRouter, UploadFile, File, Form, Query, HTTPException, status
 from fastapi.responses import JSONResponse
 from typing import Annotated
+import asyncio
+import csv
+import io
+import json
 import os
-import shutil
+import tarfile
+import time
 import uuid 
+import zipfile
 
-from config import FUGITIVES_PHOTO_FOLDER
-from database.mongo import insert_fugitive, get_all_fugitives
-from recognition.face_encoder import get_face_encoding_from_image_file
-from recognition.face_detector import detect_faces_in_image_file
+from config import FUGITIVES_PHOTO_FOLDER, BULK_ENROLL_BATCH_SIZE, BULK_ENROLL_MAX_RECORDS
+from database.mongo import insert_fugitive, insert_fugitives, fugitive_document, list_fugitives, count_fugitives, delete_fugitive
+from recognition.gallery import known_faces, make_face_info
+from recognition.pipeline import encode_enrollment_photos
+from recognition.profiles import resolve_profile, profile_detection_options, profile_encoding_options
+from recognition.workers import run_in_worker, encode_photo_bytes
+from metrics import FACES_PROCESSED, request_timings_ms, timed_stage, tracked_request
 
 router = APIRouter()
 
+PHOTO_EXTENSIONS = ['.jpg', '.jpeg', '.png']
+MANIFEST_FIELDS = ("photo", "name", "age", "gender") # Bulk enrollment manifest columns
+
 @router.post("/fugitives/")
+@tracked_request("add_fugitive")
 async def add_fugitive(
     name: Annotated[str, Form(...)], 
     age: Annotated[int, Form(...)],
     gender: Annotated[str, Form(...)],
-    file: Annotated[UploadFile, File(...)]
+    file: Annotated[UploadFile, File(...)],
+    timings: Annotated[bool, Form()] = False, # Add a per-stage timing breakdown ("timings_ms") to the response
+    profile: Annotated[str | None, Form()] = None # Latency/accuracy profile (RECOGNITION_PROFILES), default RECOGNITION_PROFILE
 ):
     """
     Adds a new fugitive to the database. Requires name, age, gender, and a photo file.
     The photo must contain exactly one detectable face.
     """
+    profile_settings = _resolve_profile(profile)
     # Validate input and file
     if not file.filename:
          raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No file uploaded")
 
     original_filename = file.filename
     file_extension = os.path.splitext(original_filename)[1].lower()
-    if file_extension not in ['.jpg', '.jpeg', '.png']:
+    if file_extension not in PHOTO_EXTENSIONS:
          raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid file type. Only JPG, JPEG, PNG allowed.")
 
-    os.makedirs(FUGITIVES_PHOTO_FOLDER, exist_ok=True)
-
-    # Generate a unique filename to prevent conflicts
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_location = os.path.join(FUGITIVES_PHOTO_FOLDER, unique_filename)
-
-    # Save the uploaded photo temporarily to process it
-    temp_processing_path = file_location 
+    # The photo is decoded in memory; it is only written to disk once it is known to be usable
     try:
-        with open(temp_processing_path, "wb+") as file_object:
-            shutil.copyfileobj(file.file, file_object)
+        photo_bytes = await file.read()
     except Exception as e:
-        print(f"Error saving file {original_filename} to {temp_processing_path}: {e}")
+        print(f"Error reading uploaded file {original_filename}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error saving uploaded file.")
 
     # Process the photo: Detect face and get encoding
     try:
-        face_locations = detect_faces_in_image_file(temp_processing_path)
+        # Decoding, detection and encoding run in the worker pool so the event loop stays responsive
+        processed = await run_in_worker(
+            encode_photo_bytes, photo_bytes, profile_detection_options(profile_settings), profile_encoding_options(profile_settings)
+        )
+    except Exception as e:
+        print(f"Error processing photo {original_filename}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error processing photo: {e}")
 
-        if not face_locations:
-            # Clean up the saved file if no face is found
-            os.remove(temp_processing_path)
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No face detected in the uploaded photo.")
+    if processed is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Could not decode the uploaded photo.")
+    face_locations, encoding = processed
+    FACES_PROCESSED.inc(len(face_locations), operation="add_fugitive")
 
-        # Ensure exactly one face is detected for a fugitive photo
-        if len(face_locations) > 1:
-             os.remove(temp_processing_path) # Clean up the saved file
-             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Multiple faces detected. Please upload a photo with only one person.")
+    if not face_locations:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No face detected in the uploaded photo.")
 
-        # Get encoding for the single detected face
-        encoding = get_face_encoding_from_image_file(temp_processing_path, known_face_location=face_locations[0]['location'])
+    # Ensure exactly one face is detected for a fugitive photo
+    if len(face_locations) > 1:
+         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Multiple faces detected. Please upload a photo with only one person.")
 
-        if encoding is None:
-             # Clean up the saved file
-             os.remove(temp_processing_path)
-             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not generate face encoding from the photo.")
+    if encoding is None:
+         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not generate face encoding from the photo.")
 
-    except Exception as e:
-        # Catch any other processing errors and clean up
-        if os.path.exists(temp_processing_path):
-             os.remove(temp_processing_path)
-        print(f"Error processing photo {original_filename}: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error processing photo: {e}")
+    os.makedirs(FUGITIVES_PHOTO_FOLDER, exist_ok=True)
+
+    # Generate a unique filename to prevent conflicts
+    unique_filename = f"{uuid.uuid4()}{file_extension}"
+    file_location = os.path.join(FUGITIVES_PHOTO_FOLDER, unique_filename)
 
+    try:
+        with timed_stage("photo_write"):
+            await asyncio.to_thread(_save_photos, [(file_location, photo_bytes)])
+    except Exception as e:
+        print(f"Error saving file {original_filename} to {file_location}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error saving uploaded file.")
 
     # Save data to MongoDB
     try:
-        
-        photo_storage_path = os.path.relpath(file_location, FUGITIVES_PHOTO_FOLDER) 
+        fugitive_id = await asyncio.to_thread(insert_fugitive, name, age, gender, unique_filename, encoding)
 
-        fugitive_id = insert_fugitive(name, age, gender, unique_filename, encoding) 
+        # Make the new entry visible to recognition immediately (O(1) append, no reload)
+        gallery = await asyncio.to_thread(known_faces.append, encoding, make_face_info(fugitive_id, name, age, gender, unique_filename))
 
         # Return success response
-        return JSONResponse(content={
+        response = {
             "message": "Fugitive added successfully",
             "fugitive_id": str(fugitive_id), 
             "name": name,
-            "photo_filename": unique_filename
-            },
-            status_code=status.HTTP_201_CREATED
-        )
+            "photo_filename": unique_filename,
+            "gallery_version": gallery.version,
+            "profile": profile_settings
+        }
+        if timings:
+            response["timings_ms"] = request_timings_ms()
+        return JSONResponse(content=response, status_code=status.HTTP_201_CREATED)
 
     except Exception as e:
 
-        if os.path.exists(temp_processing_path):
-            os.remove(temp_processing_path)
+        await asyncio.to_thread(_remove_photos, [file_location])
         print(f"Database error adding fugitive {name}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error saving fugitive to database.")
 
 
+def _resolve_profile(profile: str | None) -> dict:
+    try:
+        return resolve_profile(profile)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def _parse_manifest(filename: str, data: bytes) -> list[dict]:
+    """Records of a CSV manifest (header row) or a JSON one (list of objects, or {"fugitives": [...]})."""
+    text = data.decode("utf-8-sig")
+    if filename.lower().endswith(".json"):
+        records = json.loads(text)
+        if isinstance(records, dict):
+            records = records.get("fugitives")
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise ValueError("JSON manifest must be a list of objects.")
+        return records
+    reader = csv.DictReader(io.StringIO(text))
+    missing = [field for field in MANIFEST_FIELDS if field not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"CSV manifest is missing columns: {', '.join(missing)}")
+    return list(reader)
+
+def _validate_record(record: dict, photo_names: set) -> str | None:
+    """Error message for an unusable manifest record, None if it can be enrolled."""
+    for field in MANIFEST_FIELDS:
+        if record.get(field) in (None, ""):
+            return f"Missing {field}."
+    try:
+        record["age"] = int(record["age"])
+    except (TypeError, ValueError):
+        return "Age must be an integer."
+    record["name"], record["gender"], record["photo"] = str(record["name"]), str(record["gender"]), str(record["photo"])
+    if os.path.splitext(record["photo"])[1].lower() not in PHOTO_EXTENSIONS:
+        return "Invalid photo type. Only JPG, JPEG, PNG allowed."
+    if record["photo"] not in photo_names:
+        return "Photo not found in archive."
+    return None
+
+class _PhotoArchive:
+    """Random access to the members of an uploaded .zip or .tar(.gz) archive, by path."""
+
+    def __init__(self, filename: str, fileobj):
+        lower_name = filename.lower()
+        if lower_name.endswith(".zip"):
+            self._zip = zipfile.ZipFile(fileobj)
+            self._members = {m.filename: m for m in self._zip.infolist() if not m.is_dir()}
+            self._read = self._zip.read
+        elif lower_name.endswith((".tar", ".tar.gz", ".tgz")):
+            self._tar = tarfile.open(fileobj=fileobj)
+            self._members = {m.name: m for m in self._tar.getmembers() if m.isfile()}
+            self._read = lambda member: self._tar.extractfile(member).read()
+        else:
+            raise ValueError("Archive must be a .zip, .tar or .tar.gz file.")
+
+    def names(self) -> set:
+        return set(self._members)
+
+    def read(self, name: str) -> bytes:
+        return self._read(self._members[name])
+
+def _save_photos(photos: list[tuple[str, bytes]]):
+    for file_location, photo_bytes in photos:
+        with open(file_location, "wb") as file_object:
+            file_object.write(photo_bytes)
+
+def _remove_photos(file_locations: list[str]):
+    for file_location in file_locations:
+        if os.path.exists(file_location):
+            os.remove(file_location)
+
+@router.post("/fugitives/bulk")
+async def add_fugitives_bulk(
+    archive: Annotated[UploadFile, File(...)], # .zip or .tar(.gz) of photos
+    manifest: Annotated[UploadFile | None, File()] = None, # CSV/JSON with photo, name, age, gender; default: manifest.csv/.json in the archive
+    profile: Annotated[str | None, Form()] = None
+):
+    """
+    Enrolls many fugitives from an archive of photos and a manifest whose "photo" column holds
+    each record's path inside the archive. Photos are encoded in parallel on the worker pool,
+    records are written in batches with insert_many, and the in-memory gallery is updated once
+    at the end. Records that cannot be enrolled are reported individually.
+    """
+    profile_settings = _resolve_profile(profile)
+    started = time.perf_counter()
+    try:
+        photo_archive = await asyncio.to_thread(_PhotoArchive, archive.filename or "", archive.file)
+        if manifest is not None:
+            manifest_name, manifest_bytes = manifest.filename or "", await manifest.read()
+        else:
+            manifest_name = next((name for name in ("manifest.csv", "manifest.json") if name in photo_archive.names()), None)
+            if manifest_name is None:
+                raise ValueError("No manifest uploaded and no manifest.csv/manifest.json in the archive.")
+            manifest_bytes = await asyncio.to_thread(photo_archive.read, manifest_name)
+        records = _parse_manifest(manifest_name, manifest_bytes)
+    except (ValueError, UnicodeDecodeError, zipfile.BadZipFile, tarfile.TarError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid bulk upload: {e}")
+
+    if len(records) > BULK_ENROLL_MAX_RECORDS:
+        raise HTTPException(status_code=413, detail=f"Too many records (limit {BULK_ENROLL_MAX_RECORDS}).") # Content Too Large
+
+    os.makedirs(FUGITIVES_PHOTO_FOLDER, exist_ok=True)
+    photo_names = photo_archive.names()
+    failures = []
+    new_encodings, new_infos = [], []
+
+    def fail(index: int, record: dict, error: str):
+        failures.append({"record": index, "photo": record.get("photo"), "name": record.get("name"), "error": error})
+
+    valid = []
+    for index, record in enumerate(records):
+        error = _validate_record(record, photo_names)
+        if error:
+            fail(index, record, error)
+        else:
+            valid.append((index, record))
+    print(f"Bulk enrollment: {len(records)} records, {len(valid)} valid.")
+
+    for start in range(0, len(valid), BULK_ENROLL_BATCH_SIZE):
+        batch = valid[start:start + BULK_ENROLL_BATCH_SIZE]
+        photos = await asyncio.to_thread(lambda: [photo_archive.read(record["photo"]) for _, record in batch])
+        # Decoding, detection and encoding of the whole batch run in parallel on the worker pool
+        processed = await encode_enrollment_photos(photos, profile_detection_options(profile_settings), profile_encoding_options(profile_settings))
+
+        documents, enrolled, to_save = [], [], []
+        for (index, record), photo_bytes, result in zip(batch, photos, processed):
+            if result is None:
+                fail(index, record, "Could not decode or process the photo.")
+                continue
+            face_locations, encoding = result
+            if not face_locations:
+                fail(index, record, "No face detected in the photo.")
+            elif len(face_locations) > 1:
+                fail(index, record, "Multiple faces detected.")
+            elif encoding is None:
+                fail(index, record, "Could not generate face encoding from the photo.")
+            else:
+                unique_filename = f"{uuid.uuid4()}{os.path.splitext(record['photo'])[1].lower()}"
+                documents.append(fugitive_document(record["name"], record["age"], record["gender"], unique_filename, encoding))
+                enrolled.append((index, record, unique_filename, encoding))
+                to_save.append((os.path.join(FUGITIVES_PHOTO_FOLDER, unique_filename), photo_bytes))
+        del photos, processed
+
+        try:
+            await asyncio.to_thread(_save_photos, to_save)
+            inserted_ids, errors = await asyncio.to_thread(insert_fugitives, documents)
+        except Exception as e:
+            print(f"Bulk enrollment batch starting at record {batch[0][0]} failed: {e}")
+            await asyncio.to_thread(_remove_photos, [file_location for file_location, _ in to_save])
+            for index, record, _, _ in enrolled:
+                fail(index, record, "Error saving fugitive to database.")
+            continue
+
+        for i, (index, record, unique_filename, encoding) in enumerate(enrolled):
+            if i in errors:
+                _remove_photos([to_save[i][0]])
+                fail(index, record, f"Error saving fugitive to database: {errors[i]}")
+                continue
+            new_encodings.append(encoding)
+            new_infos.append(make_face_info(documents[i]["_id"], record["name"], record["age"], record["gender"], unique_filename))
+
+    # One gallery update (a single new version) for the whole import
+    gallery = await asyncio.to_thread(known_faces.extend, new_encodings, new_infos) if new_infos else known_faces.snapshot()
+    failures.sort(key=lambda failure: failure["record"])
+    elapsed = time.perf_counter() - started
+    print(f"Bulk enrollment: {len(new_infos)} enrolled, {len(failures)} failed in {elapsed:.1f}s.")
+
+    return JSONResponse(content={
+        "message": "Bulk enrollment complete",
+        "records": len(records),
+        "enrolled": len(new_infos),
+        "failed": len(failures),
+        "failures": failures,
+        "gallery_version": gallery.version,
+        "profile": profile_settings,
+        "elapsed_seconds": round(elapsed, 3)
+        },
+        status_code=status.HTTP_201_CREATED if new_infos else status.HTTP_200_OK
+    )
+
+
 @router.get("/fugitives/")
-async def get_fugitives_list():
+async def get_fugitives_list(
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int | None, Query(ge=1)] = None # Page size; all fugitives if omitted
+):
     """
-    Retrieves a list of all fugitives in the database (excluding embeddings).
+    Retrieves a list of fugitives in the database (excluding embeddings, which are projected
+    out in the query). Supports pagination; the total count is in the X-Total-Count header.
     """
     try:
-        fugitives = get_all_fugitives()
+        fugitives = await asyncio.to_thread(list_fugitives, offset, limit)
+        total_count = await asyncio.to_thread(count_fugitives) if limit is not None or offset else len(fugitives)
         
         fugitives_list = []
         for fugitive in fugitives:
@@ -119,7 +322,28 @@ async def get_fugitives_list():
                 "gender": fugitive["gender"],
                 "photo_filename": fugitive["photo_path"]
             })
-        return fugitives_list
+        return JSONResponse(content=fugitives_list, headers={"X-Total-Count": str(total_count)})
     except Exception as e:
         print(f"Error fetching fugitives list: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error retrieving fugitives list.")
+
+
+@router.delete("/fugitives/{fugitive_id}")
+async def remove_fugitive(fugitive_id: str):
+    """
+    Removes a fugitive from the database and from the in-memory gallery.
+    """
+    try:
+        deleted = await asyncio.to_thread(delete_fugitive, fugitive_id)
+    except Exception as e:
+        print(f"Error deleting fugitive {fugitive_id}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error deleting fugitive from database.")
+
+    if deleted is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Fugitive not found")
+
+    await asyncio.to_thread(known_faces.remove, fugitive_id)
+
+    await asyncio.to_thread(_remove_photos, [os.path.join(FUGITIVES_PHOTO_FOLDER, deleted["photo_path"])])
+
+    return {"message": "Fugitive removed successfully", "fugitive_id": fugitive_id, "gallery_version": known_faces.version}
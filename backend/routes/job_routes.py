@@ -0,0 +1,104 @@
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status
+from fastapi.responses import JSONResponse
+from typing import Annotated
+import asyncio
+import os
+import shutil
+import uuid
+
+from config import JOBS_FOLDER
+from database.job_store import get_job, list_jobs, get_frame_results
+from recognition.video_jobs import JobQueueFullError, submit_job, cancel_job
+
+router = APIRouter()
+
+
+def _job_summary(job: dict) -> dict:
+    """Public view of a job: progress and timing, without server-side paths."""
+    summary = {key: value for key, value in job.items() if key not in ("video_path", "owner", "lease_expires")}
+    summary["cancel_requested"] = bool(job["cancel_requested"])
+    frames_total = job["frames_total"]
+    summary["progress"] = round(min(1.0, job["frames_done"] / frames_total), 4) if frames_total else None
+    summary["results_url"] = f"/api/jobs/{job['job_id']}/results"
+    return summary
+
+
+def _save_upload(source, video_path: str):
+    with open(video_path, "wb+") as file_object:
+        shutil.copyfileobj(source, file_object)
+
+
+@router.post("/jobs/")
+async def submit_video_job(
+    file: Annotated[UploadFile, File(...)],
+    sample_interval_ms: Annotated[int | None, Form(gt=0)] = None
+):
+    """
+    Queues a video for recognition and returns a job ID immediately.
+    Poll /api/jobs/{job_id} for progress and /api/jobs/{job_id}/results for (partial) results.
+    """
+    if not file.filename:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No file uploaded")
+
+    mime_type = file.content_type or 'application/octet-stream'
+    if not mime_type.startswith('video/'):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported file type: {mime_type}. Jobs accept videos only.")
+
+    job_id = str(uuid.uuid4())
+    video_path = os.path.join(JOBS_FOLDER, f"{job_id}{os.path.splitext(file.filename)[1].lower()}")
+
+    try:
+        await asyncio.to_thread(_save_upload, file.file, video_path)
+    except Exception as e:
+        print(f"Error saving job video {file.filename} to {video_path}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error saving uploaded file.")
+
+    try:
+        job = submit_job(job_id, file.filename, video_path, sample_interval_ms)
+    except JobQueueFullError as e:
+        os.remove(video_path)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        os.remove(video_path)
+        print(f"Error queueing job for {file.filename}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error queueing recognition job.")
+
+    return JSONResponse(content=_job_summary(job), status_code=status.HTTP_202_ACCEPTED)
+
+
+@router.get("/jobs/")
+async def get_jobs_list():
+    """Lists recognition jobs, oldest first."""
+    return [_job_summary(job) for job in await asyncio.to_thread(list_jobs)]
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Status and progress (frames done/total, fps) of a job."""
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return _job_summary(job)
+
+
+@router.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str, offset: int = 0, limit: int = 500):
+    """Per-frame results processed so far, paginated by frame order."""
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    limit = max(1, min(limit, 5000))
+    return {
+        "job": _job_summary(job),
+        "offset": offset,
+        "results_per_frame": await asyncio.to_thread(get_frame_results, job_id, offset=max(0, offset), limit=limit)
+    }
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_video_job(job_id: str):
+    """Cancels a queued or running job. Results stored so far are kept."""
+    job = cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return _job_summary(job)
@@ -1,316 +1,830 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status, BackgroundTasks
-from fastapi.responses import JSONResponse, FileResponse 
-from typing import Annotated
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, WebSocket, WebSocketDisconnect, WebSocketException, status
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Annotated, Literal
+import asyncio
+import io
+import json
 import os
 import shutil
+import tarfile
 import cv2
 import numpy as np
 import uuid 
 import time 
-
-from config import TEMP_FOLDER, FUGITIVES_PHOTO_FOLDER, VIDEO_FRAME_INTERVAL
-from database.mongo import get_all_fugitives
-from recognition.face_detector import detect_faces_in_frame 
-from recognition.face_encoder import get_face_encodings_from_frame
-from recognition.face_matcher import find_best_match_index
+import zipfile
+
+from config import (
+    TEMP_FOLDER, FUGITIVES_PHOTO_FOLDER, VIDEO_FRAME_INTERVAL, VIDEO_SAMPLE_INTERVAL_MS, TRACKING_ENABLED, MOTION_GATING_ENABLED,
+    BATCH_MAX_IMAGES, BATCH_MAX_BYTES, BATCH_MAX_UPLOAD_BYTES, BATCH_IMAGE_EXTENSIONS, GALLERY_SNAPSHOT_ENABLED, LIVE_STREAM_TARGET_FPS, LIVE_STREAM_MAX_FPS,
+    LIVE_STREAM_QUEUE_SIZE, LIVE_STREAM_MAX_FRAME_AGE_MS, LIVE_STREAM_MAX_FRAME_BYTES, LIVE_STREAM_MAX_CONNECTIONS, LIVE_STREAM_SOURCES
+)
+from database.mongo import load_fugitive_embeddings, fugitive_watermark, list_fugitive_ids
+from recognition.face_tracker import FaceTracker
+from recognition.motion import MotionGate
+from recognition.gallery import GallerySnapshot, known_faces, make_face_info
+from recognition.gallery_store import load_gallery_snapshot, gallery_watermark, save_if_changed, mark_saved
+from recognition.image_source import decode_image_bytes
+from recognition.live_stream import FrameQueue, LocalStreamSource, iter_live_results
+from recognition.profiles import resolve_profile, profile_detection_options, profile_encoding_options, profile_settings_key
+from recognition.pipeline import (
+    recognize_frame, recognize_frame_with_encodings, rematch_faces, detect_and_encode_images, iter_video_results, replay_video_results
+)
+from recognition.artifact_store import LazyImage, artifact_store
+from recognition.result_cache import result_cache, content_digest, save_and_digest
+from recognition.video_source import VideoFrameSampler
+from metrics import FACES_PROCESSED, FRAMES_PROCESSED, IMAGES_PROCESSED, REQUESTS_IN_FLIGHT, request_timings_ms, timed_stage, track_request, tracked_request
 
 router = APIRouter()
 
-_known_face_encodings = []
-_known_face_info = [] # List of dicts (name, age, gender, photo_path) corresponding to encodings
+_live_stream_count = 0 # Open live streams in this process
 
-def load_known_faces():
-    """Loads fugitive data from DB into the in-memory cache."""
-    global _known_face_encodings, _known_face_info
+def load_known_faces() -> bool:
+    """Loads fugitive data from DB into the in-memory gallery (full reload). Returns False if that failed."""
     print("Loading known faces from database into memory...")
     try:
-        fugitives = get_all_fugitives() 
-        _known_face_encodings = [f['embedding'] for f in fugitives]
-        # Store relevant info for display
-        _known_face_info = [{
-            "_id": str(f["_id"]), 
-            "name": f['name'],
-            "age": f['age'],
-            "gender": f['gender'],
-            "photo_filename": f['photo_path'] 
-            } for f in fugitives]
-        print(f"Loaded {len(_known_face_encodings)} known faces.")
+        with track_request("load_known_faces"):
+            # Embeddings arrive decoded into one float32 matrix, row-aligned with the documents
+            fugitives, known_face_matrix = load_fugitive_embeddings()
+            # Store relevant info for display
+            known_face_info = [make_face_info(f["_id"], f['name'], f['age'], f['gender'], f['photo_path']) for f in fugitives]
+            with timed_stage("index_build"):
+                snapshot = known_faces.replace(known_face_matrix, known_face_info)
+        print(f"Loaded {len(snapshot)} known faces ({type(snapshot.index).__name__}), gallery version {snapshot.version}.")
     except Exception as e:
         print(f"Error loading known faces from DB: {e}")
+        return False
+    if GALLERY_SNAPSHOT_ENABLED and not known_faces.shared: # A shared gallery is persisted by the sync store
+        save_if_changed(known_faces)
+    return True
+
+def restore_known_faces() -> bool:
+    """
+    Fills the gallery from the local snapshot (memory-mapped, no database round trip).
+    Returns False if there is none; reconcile_known_faces() should follow otherwise.
+    """
+    if not GALLERY_SNAPSHOT_ENABLED:
+        return False
+    stored = load_gallery_snapshot()
+    if stored is None:
+        return False
+    snapshot = known_faces.replace(stored["matrix"], stored["infos"], adopt=True, centroids=stored["centroids"], index=stored["index"])
+    mark_saved(known_faces)
+    print(f"Restored {len(snapshot)} known faces from local snapshot {stored['name']} ({type(snapshot.index).__name__}).")
+    return True
+
+def reconcile_known_faces():
+    """
+    Brings a gallery restored from the local snapshot up to date with the database: if the
+    database watermark (count, newest _id) differs, only the ids are compared and the added
+    fugitives are fetched, instead of re-reading every embedding.
+    """
+    try:
+        snapshot = known_faces.refresh()
+        watermark = fugitive_watermark()
+        if watermark == gallery_watermark(snapshot):
+            print("Local gallery snapshot is up to date with the database.")
+            return
+
+        database_ids = set(list_fugitive_ids())
+        local_ids = {info["_id"] for info in snapshot.info}
+        removed = known_faces.remove_many(local_ids - database_ids)
+        added_ids = database_ids - local_ids
+        added = 0
+        if added_ids:
+            fugitives, matrix = load_fugitive_embeddings(ids=list(added_ids))
+            # Skip fugitives enrolled through the API (and so already appended) meanwhile
+            present = {info["_id"] for info in known_faces.refresh().info}
+            new_rows = [row for row, f in enumerate(fugitives) if str(f["_id"]) not in present]
+            if new_rows:
+                infos = [make_face_info(fugitives[row]["_id"], fugitives[row]['name'], fugitives[row]['age'], fugitives[row]['gender'], fugitives[row]['photo_path']) for row in new_rows]
+                known_faces.extend(matrix[new_rows], infos)
+                added = len(new_rows)
+        print(f"Reconciled gallery with the database: {added} added, {removed} removed (version {known_faces.version}).")
+    except Exception as e:
+        print(f"Error reconciling gallery snapshot with DB: {e}")
+        return
+    if not known_faces.shared:
+        save_if_changed(known_faces)
+
+async def _current_gallery() -> GallerySnapshot:
+    """
+    Snapshot of the known faces, loading them first if the cache is empty. Other processes'
+    writes to a shared gallery are applied first, in a thread (file locks and I/O).
+    """
+    if known_faces.stale:
+        await asyncio.to_thread(known_faces.refresh)
+    # Ensure known faces are loaded (simple check)
+    if len(known_faces) == 0:
+         await asyncio.to_thread(load_known_faces)
+         if len(known_faces) == 0:
+             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No known faces loaded. Please add fugitives first or check backend logs.")
+    return known_faces.snapshot()
+
+def _resolve_profile(profile: str | None, detection_scale: float | None) -> dict:
+    """The request's recognition profile settings, with its detection_scale override validated and applied."""
+    if detection_scale is not None and not 0 < detection_scale <= 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="detection_scale must be in (0, 1].")
+    try:
+        return resolve_profile(profile, detection_scale)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def _detection_options(profile: dict, roi: str | None) -> dict:
+    """The profile's detection settings plus the validated per-request roi (keyword arguments for detect_faces_in_frame)."""
+    detection_options = profile_detection_options(profile)
+    if roi:
+        try:
+            x, y, w, h = (int(v) for v in roi.split(","))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="roi must be four integers: x,y,w,h")
+        if w <= 0 or h <= 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="roi width and height must be positive.")
+        detection_options["roi"] = [x, y, w, h]
+    return detection_options
+
+def _still_image_options(detection_options: dict) -> dict:
+    """Single images always get the full detector: the pre-filter is only for sampled video and live frames."""
+    return {**detection_options, "prefilter": False}
+
+def _cache_key(
+    mime_type: str, digest: str, profile: dict, detection_options: dict, sample_interval_ms: int | None, tracking: bool, motion_gating: bool
+) -> tuple:
+    """Everything except the gallery that determines what /recognize/ computes for an upload."""
+    options = (profile_settings_key(profile), tuple(detection_options.get("roi") or ()))
+    if mime_type.startswith('image/'):
+        return ("image", digest, options)
+    return ("video", digest, options, sample_interval_ms, tracking, motion_gating)
+
+def _cached_size(results, face_encodings: np.ndarray | None = None) -> int:
+    """Approximate memory footprint of a cached value, charged against the result cache budget."""
+    size = len(json.dumps(results, default=str))
+    if face_encodings is not None:
+        size += face_encodings.nbytes
+    return size
+
+def _draw_results(image: np.ndarray, identified_faces_info: list, detailed_labels: bool) -> np.ndarray:
+    """Annotates a copy of the image: a box per face (green for match, red for no match) and its label."""
+    image_to_annotate = image.copy() # Work on a copy
+
+    for face_data in identified_faces_info:
+        x, y, w, h = face_data["box"]
+        color = (0, 255, 0) if face_data["match"] else (0, 0, 255)
+        thickness = 2
+        cv2.rectangle(image_to_annotate, (x, y), (x+w, y+h), color, thickness)
+
+        # Add text (name and info if matched)
+        label = "Unknown"
+        if face_data["match"]:
+            info = face_data["info"]
+            # Keep label short for video frames
+            label = f"{info['name']} ({info['age']}, {info['gender']})" if detailed_labels else f"{info['name']}"
+
+        # Put text slightly above the box
+        cv2.putText(image_to_annotate, label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, thickness)
+    return image_to_annotate
+
+def _annotated_image(image: np.ndarray, identified_faces_info: list, detailed_labels: bool) -> LazyImage:
+    """Annotated copy of the image, drawn and JPEG-encoded only if its URL is fetched."""
+    return LazyImage(image, lambda frame: _draw_results(frame, identified_faces_info, detailed_labels))
+
+def _save_upload(source, path: str):
+    with open(path, "wb+") as file_object:
+        shutil.copyfileobj(source, file_object)
+
+def _annotated_filename(prefix: str, unique_temp_filename: str) -> str:
+    return f"{prefix}_{os.path.splitext(unique_temp_filename)[0]}.jpg" # Force JPG output
+
+async def _publish_annotated(prefix: str, unique_temp_filename: str, annotated: LazyImage) -> str:
+    """
+    Puts an annotated image in the artifact store (in a thread: it may encode images) and
+    returns its URL (accessible from frontend).
+    """
+    annotated_filename = _annotated_filename(prefix, unique_temp_filename)
+    await asyncio.to_thread(artifact_store.put, annotated_filename, annotated)
+    return f"/api/temp/{annotated_filename}"
+
+async def _cached_response(cached: tuple) -> dict | None:
+    """
+    Rebuilds a response from the result cache, which only names the annotated images: they
+    stay in the artifact store (and its budget). None if any of them is no longer stored.
+    """
+    processing_results, annotated_filenames = cached
+    if not await asyncio.to_thread(artifact_store.renew, annotated_filenames):
+        return None
+    annotated_urls = [f"/api/temp/{annotated_filename}" for annotated_filename in annotated_filenames]
+
+    response = {**processing_results, "cache": "result"}
+    if response["type"] == "image":
+        response["annotated_image_url"] = annotated_urls[0]
+    else:
+        response["annotated_frame_urls"] = annotated_urls
+    return response
 
 @router.post("/recognize/")
+@tracked_request("recognize")
 async def recognize_in_media(
     file: Annotated[UploadFile, File(...)],
-    background_tasks: BackgroundTasks # Used for cleanup
+    sample_interval_ms: Annotated[int | None, Form(gt=0)] = None, # Videos: sample every N ms instead of every VIDEO_FRAME_INTERVAL frames
+    tracking: Annotated[bool, Form()] = TRACKING_ENABLED, # Videos: encode/match tracked faces only periodically
+    detection_scale: Annotated[float | None, Form()] = None, # Detect on a downscaled copy (0 < scale <= 1), default: the profile's
+    roi: Annotated[str | None, Form()] = None, # Region of interest "x,y,w,h"; faces outside it are ignored
+    motion_gating: Annotated[bool, Form()] = MOTION_GATING_ENABLED, # Videos: skip detection on static frames
+    use_cache: Annotated[bool, Form()] = True, # False recomputes (and re-caches) instead of reusing a cached result
+    timings: Annotated[bool, Form()] = False, # Add a per-stage timing breakdown ("timings_ms") to the response
+    profile: Annotated[str | None, Form()] = None # Latency/accuracy profile (RECOGNITION_PROFILES), default RECOGNITION_PROFILE
 ):
 
     if not file.filename:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No file uploaded")
 
-    # Ensure known faces are loaded (simple check)
-    if not _known_face_encodings:
-         load_known_faces()
-         if not _known_face_encodings:
-             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No known faces loaded. Please add fugitives first or check backend logs.")
+    profile_settings = _resolve_profile(profile, detection_scale)
+    detection_options = _detection_options(profile_settings, roi)
+    encoding_options = profile_encoding_options(profile_settings)
+
+    # One consistent gallery view for the whole request, even if enrollments happen meanwhile
+    gallery = await _current_gallery()
 
     os.makedirs(TEMP_FOLDER, exist_ok=True)
 
     unique_temp_filename = f"{uuid.uuid4()}_{file.filename}"
     temp_file_path = os.path.join(TEMP_FOLDER, unique_temp_filename)
 
+    mime_type = file.content_type or 'application/octet-stream' 
+    print(f"Received file: {file.filename}, MIME type: {mime_type}")
+
+    image_bytes = None
     try:
-        with open(temp_file_path, "wb+") as file_object:
-            shutil.copyfileobj(file.file, file_object)
+        if mime_type.startswith('image/'):
+            # Images are decoded straight from the upload bytes, no temp file round trip
+            image_bytes = await file.read()
+            digest = content_digest(image_bytes)
+        else:
+            # Video containers are opened by path, so they still go through a temp file
+            with timed_stage("upload_write"):
+                digest = await asyncio.to_thread(save_and_digest, file.file, temp_file_path)
     except Exception as e:
-        print(f"Error saving temp file {file.filename} to {temp_file_path}: {e}")
+        print(f"Error reading uploaded file {file.filename}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error saving uploaded file.")
 
-    mime_type = file.content_type or 'application/octet-stream' 
-    print(f"Received file: {file.filename}, MIME type: {mime_type}")
+    # Identical uploads reuse earlier work: the whole response while the gallery is unchanged,
+    # otherwise the cached detections and encodings (only matching is re-run)
+    cache_key = _cache_key(mime_type, digest, profile_settings, detection_options, sample_interval_ms, tracking, motion_gating)
+    results_cache_key = ("result", cache_key, gallery.version)
+    encodings_cache_key = ("encodings", cache_key)
 
     # Process File 
     processing_results = {
         "message": "Processing complete",
         "type": "unknown",
+        "gallery_version": gallery.version,
+        "cache": "miss",
         "results": [] 
     }
+    annotated_images = [] # (name prefix, LazyImage) of the published annotated images
 
+    # A retry of an upload that is still being processed waits here and then hits the cache
+    await result_cache.acquire(cache_key)
     try:
+        cached = result_cache.get(results_cache_key) if use_cache else None
+        response = await _cached_response(cached) if cached is not None else None
+        if response is not None:
+            print(f"Result cache hit for {file.filename} (gallery version {gallery.version}).")
+            response["profile"] = profile_settings
+            if timings:
+                response["timings_ms"] = request_timings_ms()
+            return JSONResponse(content=response)
+        cached_encodings = result_cache.get(encodings_cache_key) if use_cache else None
+
         if mime_type.startswith('image/'):
             processing_results["type"] = "image"
             # Process Image
-            image = cv2.imread(temp_file_path)
+            image = await asyncio.to_thread(decode_image_bytes, image_bytes)
             if image is None:
-                 raise Exception(f"Could not read image file: {temp_file_path}")
-
-            # Convert BGR to RGB (face_recognition expects RGB)
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-
-            # Detect faces
-            detected_faces = detect_faces_in_frame(rgb_image) # Returns list with "box" and "location"
-
-            if not detected_faces:
+                 raise Exception(f"Could not decode image file: {file.filename}")
+
+            if cached_encodings is not None:
+                # Same image seen with another gallery version: only re-run matching
+                processing_results["cache"] = "encodings"
+                identified_faces_info = rematch_faces(gallery, *cached_encodings)
+            else:
+                # Detect, encode (worker pool) and match all faces in the image
+                identified_faces_info, face_encodings = await recognize_frame_with_encodings(
+                    gallery, image, detection_options=_still_image_options(detection_options), encoding_options=encoding_options
+                )
+                result_cache.put(encodings_cache_key, (identified_faces_info, face_encodings), _cached_size(identified_faces_info, face_encodings))
+
+            IMAGES_PROCESSED.inc(operation="recognize")
+            FACES_PROCESSED.inc(len(identified_faces_info), operation="recognize")
+            if not identified_faces_info:
                 processing_results["message"] = "No faces detected in image."
-                pass 
-
-            # Get encodings for detected faces
-            face_locations = [d["location"] for d in detected_faces]
-            face_encodings = get_face_encodings_from_frame(rgb_image, face_locations)
-
-            # Match detected faces against known faces
-            identified_faces_info = [] 
-
-            for i, unknown_encoding in enumerate(face_encodings):
-                best_match_index = find_best_match_index(unknown_encoding, _known_face_encodings)
 
-                # Store results for this face
-                face_result = {
-                    "box": detected_faces[i]["box"], 
-                    "match": False,
-                    "info": None 
-                }
-
-                if best_match_index is not None:
-                    # Found a match!
-                    matched_fugitive_info = _known_face_info[best_match_index]
-                    face_result["match"] = True
-                    face_result["info"] = matched_fugitive_info
-                    print(f"Image: Match found for face {i} -> {matched_fugitive_info['name']}")
-
-                identified_faces_info.append(face_result)
+            for i, face_result in enumerate(identified_faces_info):
+                if face_result["match"]:
+                    print(f"Image: Match found for face {i} -> {face_result['info']['name']}")
 
             processing_results["results"] = identified_faces_info
 
-            # Annotate the image with results 
-            image_to_annotate = image.copy() # Work on a copy
-
-            for face_data in identified_faces_info:
-                x, y, w, h = face_data["box"]
-                # Draw bounding box
-                color = (0, 255, 0) if face_data["match"] else (0, 0, 255) # Green for match, Red for no match
-                thickness = 2
-                cv2.rectangle(image_to_annotate, (x, y), (x+w, y+h), color, thickness)
-
-                # Add text (name and info if matched)
-                label = "Unknown"
-                if face_data["match"]:
-                    info = face_data["info"]
-                    label = f"{info['name']} ({info['age']}, {info['gender']})"
-        
-
-                # Put text slightly above the box
-                text_y_offset = 15
-                cv2.putText(image_to_annotate, label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, thickness)
-
+            # Annotated image with results, kept in memory and drawn/encoded when first fetched
+            annotated_images.append(("annotated", _annotated_image(image, identified_faces_info, detailed_labels=True)))
 
-            # Save the annotated image temporarily
-            annotated_filename = f"annotated_{os.path.splitext(unique_temp_filename)[0]}.jpg" # Force JPG output
-            annotated_file_path = os.path.join(TEMP_FOLDER, annotated_filename)
-            cv2.imwrite(annotated_file_path, image_to_annotate)
-
-            # Add cleanup task for the annotated image file
-            background_tasks.add_task(lambda: os.path.exists(annotated_file_path) and os.remove(annotated_file_path))
-
-            # Return the path to the annotated image and the results JSON
-            processing_results["annotated_image_url"] = f"/api/temp/{annotated_filename}" # URL accessible from frontend
+            # Return the URL of the annotated image and the results JSON
+            processing_results["annotated_image_url"] = await _publish_annotated("annotated", unique_temp_filename, annotated_images[-1][1])
 
 
         elif mime_type.startswith('video/'):
             processing_results["type"] = "video"
             # Process Video (Simplified: Process sampled frames)
 
-            cap = cv2.VideoCapture(temp_file_path)
-            if not cap.isOpened():
-                raise Exception(f"Error opening video file: {temp_file_path}")
-
-            frame_rate = cap.get(cv2.CAP_PROP_FPS)
-            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-            processing_results["video_info"] = {
-                "frame_count": frame_count,
-                "frame_rate": frame_rate,
-                "width": frame_width,
-                "height": frame_height
-            }
-            processing_results["results_per_frame"] = [] # Detailed results for processed frames
-            processing_results["annotated_frame_urls"] = [] # Paths to saved annotated frames
-
-            print(f"Video Info: {frame_count} frames, {frame_rate:.2f} FPS, {frame_width}x{frame_height}")
-
-            processed_frame_paths = [] # Keep track of saved annotated frames for cleanup/return
-
-            # Process frames at intervals
-            frame_interval = max(1, int(VIDEO_FRAME_INTERVAL)) # Ensure interval is at least 1
-            frames_indices_to_process = range(0, frame_count, frame_interval)
-            print(f"Processing approximately every {frame_interval} frames.")
-
-
-            for i in frames_indices_to_process:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, i)
-                ret, frame = cap.read()
-
-                if not ret:
-                    print(f"Warning: Could not read frame {i}. Stopping video processing loop.")
-                    break # End of video or read error
-
-                # Convert BGR to RGB
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-                # Detect faces
-                detected_faces = detect_faces_in_frame(rgb_frame) # Returns list with "box" and "location"
+            # Sequential decoder: grab() every frame, retrieve() only the sampled ones (no per-sample seeks)
+            sampler = VideoFrameSampler(
+                temp_file_path, frame_interval=VIDEO_FRAME_INTERVAL, interval_ms=sample_interval_ms or VIDEO_SAMPLE_INTERVAL_MS,
+                motion_gate=MotionGate() if motion_gating else None
+            )
 
+            processing_results["video_info"] = sampler.video_info()
+            processing_results["results_per_frame"] = [] # Detailed results for processed frames
+            processing_results["annotated_frame_urls"] = [] # URLs of the annotated frames
+
+            print(f"Video Info: {sampler.frame_count} frames, {sampler.frame_rate:.2f} FPS, {sampler.width}x{sampler.height}")
+
+            if sampler.interval_ms is not None:
+                print(f"Processing one frame every {sampler.interval_ms:.0f} ms.")
+            else:
+                print(f"Processing approximately every {sampler.frame_interval} frames.")
+
+
+            tracker = None
+            if cached_encodings is not None:
+                # Same video seen with another gallery version: frames are only decoded for
+                # annotation, all cached encodings are re-matched in one search
+                processing_results["cache"] = "encodings"
+                video_results = replay_video_results(gallery, sampler, cached_encodings["frames"])
+            else:
+                tracker = FaceTracker() if tracking else None
+                # Decode, detect/encode (worker pool) and match, several frames in flight at once
+                video_results = iter_video_results(
+                    gallery, sampler, tracker=tracker, detection_options=detection_options, encoding_options=encoding_options
+                )
+            frame_encodings = {} # frame_index -> (faces, encodings) for the encodings cache
+
+            async for i, timestamp_ms, frame, identified_faces_info_this_frame, face_encodings in video_results:
+                frame_encodings[i] = (identified_faces_info_this_frame, face_encodings)
+                FRAMES_PROCESSED.inc()
+                FACES_PROCESSED.inc(len(identified_faces_info_this_frame), operation="recognize")
                 frame_results = {
                     "frame_index": i,
-                    "timestamp_ms": cap.get(cv2.CAP_PROP_POS_MSEC),
+                    "timestamp_ms": timestamp_ms,
                     "faces": []
                 }
 
-                if not detected_faces:
+                if not identified_faces_info_this_frame:
                      # Append frame results even if no faces found
                      processing_results["results_per_frame"].append(frame_results)
                      # Optionally save original frame if needed for display later
-                     continue # Skip encoding/matching for this frame
-
-                # Get encodings
-                face_locations = [d["location"] for d in detected_faces]
-                face_encodings = get_face_encodings_from_frame(rgb_frame, face_locations)
-
-                # Match faces
-                identified_faces_info_this_frame = []
-                for j, unknown_encoding in enumerate(face_encodings):
-                    best_match_index = find_best_match_index(unknown_encoding, _known_face_encodings)
-
-                    face_result = {
-                         "box": detected_faces[j]["box"],
-                         "match": False,
-                         "info": None
-                    }
-
-                    if best_match_index is not None:
-                        matched_fugitive_info = _known_face_info[best_match_index]
-                        face_result["match"] = True
-                        face_result["info"] = matched_fugitive_info
-
-                    identified_faces_info_this_frame.append(face_result)
+                     continue # Nothing to annotate for this frame
 
                 frame_results["faces"] = identified_faces_info_this_frame
                 processing_results["results_per_frame"].append(frame_results)
 
-                frame_to_annotate = frame.copy() # Work on a copy
-
-                for face_data in identified_faces_info_this_frame:
-                     x, y, w, h = face_data["box"]
-                     color = (0, 255, 0) if face_data["match"] else (0, 0, 255)
-                     thickness = 2
-                     cv2.rectangle(frame_to_annotate, (x, y), (x+w, y+h), color, thickness)
-
-                     label = "Unknown"
-                     if face_data["match"]:
-                         info = face_data["info"]
-                         label = f"{info['name']}" # Keep label short for video frames
-
-                     # Put text
-                     cv2.putText(frame_to_annotate, label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, thickness)
-
-                # Save the annotated frame temporarily as an image file
-                annotated_frame_filename = f"frame_{i}_{os.path.splitext(unique_temp_filename)[0]}.jpg"
-                annotated_frame_path = os.path.join(TEMP_FOLDER, annotated_frame_filename)
-                cv2.imwrite(annotated_frame_path, frame_to_annotate)
-                processed_frame_paths.append(annotated_frame_path)
-
-
-            cap.release() # Release the video file handle
-
-            # Add cleanup tasks for all saved annotated frame files
-            for frame_path in processed_frame_paths:
-                 background_tasks.add_task(lambda p=frame_path: os.path.exists(p) and os.remove(p))
-
-            # Return URLs for the annotated frames and the structured results
-            processing_results["annotated_frame_urls"] = [f"/api/temp/{os.path.basename(p)}" for p in processed_frame_paths]
+                # Annotated frame, only drawn and encoded if a client fetches it
+                annotated_images.append((f"frame_{i}", _annotated_image(frame, identified_faces_info_this_frame, detailed_labels=False)))
+                processing_results["annotated_frame_urls"].append(await _publish_annotated(f"frame_{i}", unique_temp_filename, annotated_images[-1][1]))
+
+
+            sampler.close() # Release the video file handle
+            processing_results["decode_stats"] = sampler.stats()
+            print(f"Video decode: {processing_results['decode_stats']}")
+            if cached_encodings is not None:
+                if cached_encodings["tracking_stats"] is not None:
+                    processing_results["tracking_stats"] = cached_encodings["tracking_stats"]
+            else:
+                if tracker is not None:
+                    processing_results["tracking_stats"] = tracker.stats()
+                result_cache.put(
+                    encodings_cache_key, {"frames": frame_encodings, "tracking_stats": processing_results.get("tracking_stats")},
+                    sum(_cached_size(faces, encodings) for faces, encodings in frame_encodings.values())
+                )
 
         else:
             # Unsupported file type based on MIME
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported file type: {mime_type}. Please upload an image or video.")
 
+        result_cache.put(
+            results_cache_key, (processing_results, [_annotated_filename(prefix, unique_temp_filename) for prefix, _ in annotated_images]),
+            _cached_size(processing_results)
+        )
+
     except Exception as e:
         print(f"Error during file processing: {e}")
         # Ensure the initial temp file is also cleaned up on error
         if os.path.exists(temp_file_path):
              os.remove(temp_file_path)
-        # Clean up any annotated frames that might have been saved before the error
-        if 'processed_frame_paths' in locals(): # Check if list was created
-            for frame_path in processed_frame_paths:
-                 if os.path.exists(frame_path):
-                      os.remove(frame_path)
+        if 'sampler' in locals():
+            sampler.close()
+        # Drop any annotated frames that were published before the error
+        await asyncio.to_thread(artifact_store.discard, [_annotated_filename(prefix, unique_temp_filename) for prefix, _ in annotated_images])
 
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error processing media file: {e}")
 
     finally:
+        result_cache.release(cache_key)
         # Ensure the initial temp file is removed after processing (success or failure caught above)
         if os.path.exists(temp_file_path):
              os.remove(temp_file_path)
 
 
-    # Return the final results JSON
+    # Return the final results JSON; profile and timings are not cached with the results,
+    # every response reports its own
+    processing_results = {**processing_results, "profile": profile_settings}
+    if timings:
+        processing_results["timings_ms"] = request_timings_ms()
     return JSONResponse(content=processing_results)
 
 
+_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+async def _read_batch_uploads(files: list[UploadFile]) -> list[tuple[str, bytes]]:
+    """
+    Reads the batch's uploads into memory, refusing (ValueError) as soon as their total
+    size would exceed BATCH_MAX_UPLOAD_BYTES: from the declared sizes before reading
+    anything, then from the bytes actually read.
+    """
+    declared = sum(file.size or 0 for file in files)
+    if declared > BATCH_MAX_UPLOAD_BYTES:
+        raise ValueError(f"Upload is too large (limit {BATCH_MAX_UPLOAD_BYTES} bytes).")
+
+    uploads = []
+    total_bytes = 0
+    for i, file in enumerate(files):
+        chunks = []
+        while chunk := await file.read(_UPLOAD_CHUNK_SIZE):
+            total_bytes += len(chunk)
+            if total_bytes > BATCH_MAX_UPLOAD_BYTES:
+                raise ValueError(f"Upload is too large (limit {BATCH_MAX_UPLOAD_BYTES} bytes).")
+            chunks.append(chunk)
+        uploads.append((file.filename or f"image_{i}", b"".join(chunks)))
+    return uploads
+
+
+def _expand_batch_uploads(uploads: list[tuple[str, bytes]]) -> list[tuple[str, bytes]]:
+    """
+    Unpacks .zip/.tar(.gz) uploads into their image members; other uploads are taken as images.
+    Raises ValueError when the batch exceeds BATCH_MAX_IMAGES or BATCH_MAX_BYTES. Archive
+    members are counted by the bytes they actually expand to, not their declared sizes.
+    """
+    images = []
+    total_bytes = 0
+
+    def add(name: str, declared_size: int, open_member):
+        nonlocal total_bytes
+        if len(images) >= BATCH_MAX_IMAGES:
+            raise ValueError(f"Too many images in batch (limit {BATCH_MAX_IMAGES}).")
+        remaining = BATCH_MAX_BYTES - total_bytes
+        if declared_size > remaining:
+            raise ValueError(f"Batch is too large (limit {BATCH_MAX_BYTES} bytes of images).")
+        with open_member() as member_file:
+            data = member_file.read(remaining + 1)
+        if len(data) > remaining:
+            raise ValueError(f"Batch is too large (limit {BATCH_MAX_BYTES} bytes of images).")
+        total_bytes += len(data)
+        images.append((name, data))
+
+    for filename, data in uploads:
+        lower_name = filename.lower()
+        if lower_name.endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for member in archive.infolist():
+                    if not member.is_dir() and member.filename.lower().endswith(BATCH_IMAGE_EXTENSIONS):
+                        add(member.filename, member.file_size, lambda: archive.open(member))
+        elif lower_name.endswith((".tar", ".tar.gz", ".tgz")):
+            with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+                for member in archive:
+                    if member.isfile() and member.name.lower().endswith(BATCH_IMAGE_EXTENSIONS):
+                        add(member.name, member.size, lambda: archive.extractfile(member))
+        else:
+            add(filename, len(data), lambda: io.BytesIO(data))
+    return images
+
+@router.post("/recognize/batch")
+async def recognize_batch(
+    files: Annotated[list[UploadFile], File(...)], # Images and/or .zip/.tar archives of images
+    detection_scale: Annotated[float | None, Form()] = None,
+    roi: Annotated[str | None, Form()] = None,
+    use_cache: Annotated[bool, Form()] = True,
+    profile: Annotated[str | None, Form()] = None
+):
+    """
+    Recognizes faces in many still images in one request. Decoding, detection and encoding
+    are spread over the worker pool, then all faces of the batch are matched against the
+    gallery in a single search. Matched fugitives are listed once in "fugitives" and
+    referenced by id from each face. No annotated images are produced.
+    """
+    profile_settings = _resolve_profile(profile, detection_scale)
+    detection_options = _detection_options(profile_settings, roi)
+    encoding_options = profile_encoding_options(profile_settings)
+    gallery = await _current_gallery()
+    started = time.perf_counter()
+
+    try:
+        uploads = await _read_batch_uploads(files)
+        images = await asyncio.to_thread(_expand_batch_uploads, uploads)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e)) # Content Too Large; its status constant was renamed in recent Starlette releases
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not read archive: {e}")
+    del uploads
+    if not images:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No images found in the upload.")
+    print(f"Batch recognition: {len(images)} images.")
+
+    # Identical images (within the batch or seen before by /recognize/) are only encoded once
+    digests = await asyncio.to_thread(lambda: [content_digest(data) for _, data in images])
+    encodings_cache_key = lambda digest: ("encodings", _cache_key("image/", digest, profile_settings, detection_options, None, False, False))
+    encodings_by_digest = {}
+    for digest in digests:
+        if digest not in encodings_by_digest:
+            encodings_by_digest[digest] = result_cache.get(encodings_cache_key(digest)) if use_cache else None
+    cached_images = sum(1 for digest in digests if encodings_by_digest[digest] is not None)
+
+    to_encode = {digest: data for digest, (_, data) in zip(digests, images) if encodings_by_digest[digest] is None}
+    encoded = await detect_and_encode_images(list(to_encode.values()), _still_image_options(detection_options), encoding_options)
+    for digest, processed in zip(to_encode, encoded):
+        if processed is None:
+            continue
+        detected_faces, face_encodings = processed
+        faces = [{"box": detected["box"]} for detected in detected_faces[:len(face_encodings)]]
+        encodings_by_digest[digest] = (faces, face_encodings)
+        result_cache.put(encodings_cache_key(digest), (faces, face_encodings), _cached_size(faces, face_encodings))
+
+    # One vectorized match for every face of the batch
+    all_faces, all_encodings = [], []
+    for digest in digests:
+        if encodings_by_digest[digest] is not None:
+            all_faces.extend(encodings_by_digest[digest][0])
+            all_encodings.append(encodings_by_digest[digest][1])
+    matched_faces = iter(rematch_faces(gallery, all_faces, np.concatenate(all_encodings)) if all_faces else ())
+
+    fugitives = {}
+    results = []
+    faces_detected = faces_matched = 0
+    for (filename, _), digest in zip(images, digests):
+        if encodings_by_digest[digest] is None:
+            results.append({"filename": filename, "error": "Could not decode or process image."})
+            continue
+        compact_faces = []
+        for _ in encodings_by_digest[digest][0]:
+            face_result = next(matched_faces)
+            fugitive_id = None
+            if face_result["match"]:
+                fugitive_id = face_result["info"]["_id"]
+                fugitives[fugitive_id] = face_result["info"]
+                faces_matched += 1
+            compact_faces.append({"box": face_result["box"], "fugitive_id": fugitive_id, "distance": face_result["distance"]})
+        faces_detected += len(compact_faces)
+        results.append({"filename": filename, "faces": compact_faces})
+
+    elapsed = time.perf_counter() - started
+    print(f"Batch recognition: {len(results)} images, {faces_detected} faces, {faces_matched} matches in {elapsed:.2f}s.")
+    return JSONResponse(content={
+        "message": "Processing complete",
+        "gallery_version": gallery.version,
+        "profile": profile_settings,
+        "images": len(results),
+        "cached_images": cached_images,
+        "faces_detected": faces_detected,
+        "faces_matched": faces_matched,
+        "elapsed_seconds": round(elapsed, 3),
+        "images_per_second": round(len(results) / max(elapsed, 1e-6), 2),
+        "fugitives": fugitives,
+        "results": results
+    })
+
+def _format_stream_event(event: dict, stream_format: str) -> str:
+    if stream_format == "sse":
+        return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+    return json.dumps(event) + "\n"
+
+async def _stream_recognition_events(
+    gallery: GallerySnapshot, image: np.ndarray | None, temp_file_path: str | None, sample_interval_ms: int | None, tracking: bool,
+    profile: dict, detection_options: dict, motion_gating: bool
+):
+    """
+    Yields one event per processed frame as soon as it is matched, so neither the server
+    nor the client has to hold the whole video's results. For videos it owns (and removes)
+    the temp file; images arrive already decoded.
+    """
+    sampler = None
+    try:
+        if temp_file_path is None:
+            if image is None:
+                raise Exception("Could not decode image file.")
+            faces = await recognize_frame(gallery, image, detection_options=_still_image_options(detection_options), encoding_options=profile_encoding_options(profile))
+            yield {"event": "frame", "frame_index": 0, "timestamp_ms": 0.0, "faces": faces}
+            yield {"event": "done", "frames_processed": 1, "profile": profile}
+            return
+
+        sampler = await asyncio.to_thread(
+            VideoFrameSampler, temp_file_path, frame_interval=VIDEO_FRAME_INTERVAL, interval_ms=sample_interval_ms or VIDEO_SAMPLE_INTERVAL_MS,
+            motion_gate=MotionGate() if motion_gating else None
+        )
+        yield {"event": "video_info", "gallery_version": gallery.version, "expected_frames": sampler.expected_samples(), **sampler.video_info()}
+
+        tracker = FaceTracker() if tracking else None
+        frames_processed = 0
+        video_results = iter_video_results(
+            gallery, sampler, tracker=tracker, detection_options=detection_options, encoding_options=profile_encoding_options(profile)
+        )
+        async for frame_index, timestamp_ms, frame, faces, _ in video_results:
+            frames_processed += 1
+            yield {"event": "frame", "frame_index": frame_index, "timestamp_ms": timestamp_ms, "faces": faces}
+
+        done_event = {"event": "done", "frames_processed": frames_processed, "decode_stats": sampler.stats(), "profile": profile}
+        if tracker is not None:
+            done_event["tracking_stats"] = tracker.stats()
+        yield done_event
+
+    except Exception as e:
+        print(f"Error during streamed processing: {e}")
+        yield {"event": "error", "detail": f"Error processing media file: {e}"}
+
+    finally:
+        if sampler is not None:
+            sampler.close()
+        if temp_file_path is not None and os.path.exists(temp_file_path):
+             os.remove(temp_file_path)
+
+@router.post("/recognize/stream")
+async def recognize_in_media_stream(
+    file: Annotated[UploadFile, File(...)],
+    stream_format: Annotated[Literal["ndjson", "sse"], Form(alias="format")] = "ndjson",
+    sample_interval_ms: Annotated[int | None, Form(gt=0)] = None,
+    tracking: Annotated[bool, Form()] = TRACKING_ENABLED,
+    detection_scale: Annotated[float | None, Form()] = None,
+    roi: Annotated[str | None, Form()] = None,
+    motion_gating: Annotated[bool, Form()] = MOTION_GATING_ENABLED,
+    profile: Annotated[str | None, Form()] = None
+):
+    """
+    Streaming variant of /recognize/: emits each frame's matches as soon as they are computed,
+    as newline-delimited JSON (default) or Server-Sent Events. No annotated frames are produced.
+    """
+    if not file.filename:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No file uploaded")
+
+    mime_type = file.content_type or 'application/octet-stream'
+    if not (mime_type.startswith('image/') or mime_type.startswith('video/')):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported file type: {mime_type}. Please upload an image or video.")
+
+    profile_settings = _resolve_profile(profile, detection_scale)
+    detection_options = _detection_options(profile_settings, roi)
+    gallery = await _current_gallery()
+
+    image = None
+    temp_file_path = None
+    try:
+        if mime_type.startswith('image/'):
+            image = await asyncio.to_thread(decode_image_bytes, await file.read())
+        else:
+            # Video containers need a seekable file for the decoder
+            temp_file_path = os.path.join(TEMP_FOLDER, f"{uuid.uuid4()}_{os.path.basename(file.filename)}")
+            await asyncio.to_thread(_save_upload, file.file, temp_file_path)
+    except Exception as e:
+        print(f"Error reading uploaded file {file.filename}: {e}")
+        if temp_file_path is not None and os.path.exists(temp_file_path):
+             os.remove(temp_file_path)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error saving uploaded file.")
+
+    async def body():
+        async for event in _stream_recognition_events(
+            gallery, image, temp_file_path, sample_interval_ms, tracking, profile_settings, detection_options, motion_gating
+        ):
+            yield _format_stream_event(event, stream_format)
+
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    # The background task also covers clients that disconnect before the stream starts
+    cleanup = BackgroundTask(lambda: temp_file_path is not None and os.path.exists(temp_file_path) and os.remove(temp_file_path))
+    return StreamingResponse(body(), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, background=cleanup)
+
+
+async def _receive_live_frames(websocket: WebSocket, frame_queue: FrameQueue, accept_frames: bool):
+    """
+    Reads client messages into the ingest queue: binary messages are JPEG frames (ignored
+    when a local source feeds the stream) and the text message "stop" ends the stream once
+    the queued frames are done. A disconnect discards whatever is still queued.
+    """
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                frame_queue.close(discard=True)
+                return
+            if message.get("bytes") is not None:
+                if not accept_frames:
+                    continue
+                if len(message["bytes"]) > LIVE_STREAM_MAX_FRAME_BYTES:
+                    frame_queue.drop("too_large")
+                else:
+                    frame_queue.put(message["bytes"])
+            elif (message.get("text") or "").strip().lower() == "stop":
+                frame_queue.close()
+                return
+    except Exception as e:
+        print(f"Error receiving live stream frames: {e}")
+        frame_queue.close(discard=True)
+
+@router.websocket("/recognize/live")
+async def recognize_live(
+    websocket: WebSocket,
+    target_fps: float | None = None, # Frames recognized per second, default LIVE_STREAM_TARGET_FPS
+    source: str | None = None, # Name of a local stream source (LIVE_STREAM_SOURCES) to read instead of client frames
+    tracking: bool = TRACKING_ENABLED,
+    detection_scale: float | None = None,
+    roi: str | None = None,
+    timings: bool = False, # Add a per-stage timing breakdown ("timings_ms") to every frame event
+    profile: str | None = None # Latency/accuracy profile (RECOGNITION_PROFILES), default RECOGNITION_PROFILE
+):
+    """
+    Live recognition over a WebSocket. The client sends JPEG frames as binary messages, or
+    names a configured local `source`, and receives one JSON event per recognized frame
+    ({"event": "frame", "frame_id", "faces", "latency_ms", ...}) as soon as it is matched.
+
+    Frames are not processed best-effort: at most `target_fps` frames per second are
+    recognized, the ingest queue is bounded (LIVE_STREAM_QUEUE_SIZE, oldest dropped first) and
+    frames older than LIVE_STREAM_MAX_FRAME_AGE_MS are dropped, so results stay close to real
+    time however fast frames arrive. Sending "stop" ends the stream with a "done" event.
+    """
+    global _live_stream_count
+    target_fps = target_fps or LIVE_STREAM_TARGET_FPS
+    if not 0 < target_fps <= LIVE_STREAM_MAX_FPS:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=f"target_fps must be in (0, {LIVE_STREAM_MAX_FPS}].")
+    if source is not None and source not in LIVE_STREAM_SOURCES:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=f"Unknown stream source: {source}")
+    try:
+        profile_settings = _resolve_profile(profile, detection_scale)
+        detection_options = _detection_options(profile_settings, roi)
+    except HTTPException as e:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+    if _live_stream_count >= LIVE_STREAM_MAX_CONNECTIONS:
+        raise WebSocketException(code=status.WS_1013_TRY_AGAIN_LATER, reason=f"Too many live streams (limit {LIVE_STREAM_MAX_CONNECTIONS}).")
+
+    _live_stream_count += 1
+    REQUESTS_IN_FLIGHT.inc(operation="live_stream")
+    frame_queue = FrameQueue()
+    stream_source = None
+    receiver = None
+    try:
+        await websocket.accept()
+        if source is not None:
+            stream_source = LocalStreamSource(LIVE_STREAM_SOURCES[source], frame_queue, target_fps)
+            try:
+                await stream_source.start()
+            except ValueError as e:
+                print(f"Error opening live stream source {source}: {e}")
+                stream_source = None
+                await websocket.close(code=status.WS_1011_INTERNAL_ERROR, reason=str(e))
+                return
+        print(f"Live stream started ({source or 'client frames'}, {target_fps} fps).")
+        await websocket.send_json({
+            "event": "ready",
+            "source": source,
+            "target_fps": target_fps,
+            "profile": profile_settings,
+            "queue_size": LIVE_STREAM_QUEUE_SIZE,
+            "max_frame_age_ms": LIVE_STREAM_MAX_FRAME_AGE_MS,
+            "gallery_version": known_faces.version
+        })
+        receiver = asyncio.create_task(_receive_live_frames(websocket, frame_queue, accept_frames=source is None))
+        live_results = iter_live_results(
+            frame_queue, target_fps, tracking, detection_options, profile_encoding_options(profile_settings), include_timings=timings
+        )
+        async for event in live_results:
+            await websocket.send_json(event)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if receiver is not None:
+            receiver.cancel()
+        if stream_source is not None:
+            await asyncio.to_thread(stream_source.stop)
+        _live_stream_count -= 1
+        REQUESTS_IN_FLIGHT.dec(operation="live_stream")
+        print(f"Live stream ended: {frame_queue.received} frames received, dropped {frame_queue.dropped}.")
+
+
 @router.get("/temp/{filename}")
 async def serve_temp_file(filename: str):
-    """Serves temporary annotated image or frame files."""
+    """Serves annotated images and frames from the artifact store, encoding them on first fetch."""
     # Basic sanitization: prevent directory traversal
     if '..' in filename or '/' in filename or '\\' in filename:
          raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid filename.")
 
-    file_path = os.path.join(TEMP_FOLDER, filename)
-
-    # Check if the file exists and is actually within the TEMP_FOLDER
-    if os.path.exists(file_path) and os.path.abspath(file_path).startswith(os.path.abspath(TEMP_FOLDER)):
-        return FileResponse(file_path)
-    else:
+    jpeg_bytes = await asyncio.to_thread(artifact_store.get, filename)
+    if jpeg_bytes is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    return Response(content=jpeg_bytes, media_type="image/jpeg")
 
 # Helper endpoint to serve fugitive photos if the frontend needs them (e.g., for display)
 @router.get("/fugitives/photos/{filename}")
@@ -0,0 +1,65 @@
+import time
+import traceback
+from contextlib import contextmanager
+
+# Progress of the background warm-up phase of this process (see app.lifespan): the app
+# answers liveness probes at once, and is ready for traffic once every step has finished.
+WARMUP_STEPS = ("database", "gallery", "worker_pool", "models", "job_scheduler")
+
+_status = "starting" # starting -> ready, or failed
+_started_at = time.time()
+_finished_at = None
+_current_step = None
+_steps = {} # step -> {"status": "running"/"done"/"failed", "seconds": ...}
+_error = None
+
+
+def is_ready() -> bool:
+    return _status == "ready"
+
+
+def has_failed() -> bool:
+    return _status == "failed"
+
+
+@contextmanager
+def warmup_step(step: str):
+    """Records one warm-up step's progress and duration; an exception fails the warm-up."""
+    global _current_step
+    _current_step = step
+    _steps[step] = {"status": "running", "seconds": None}
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        _steps[step] = {"status": "failed", "seconds": round(time.perf_counter() - started, 3)}
+        raise
+    _steps[step] = {"status": "done", "seconds": round(time.perf_counter() - started, 3)}
+    print(f"Warm-up step {step} done in {_steps[step]['seconds']}s.")
+
+
+def mark_ready():
+    global _status, _finished_at, _current_step
+    _status, _finished_at, _current_step = "ready", time.time(), None
+    print(f"Warm-up complete in {_finished_at - _started_at:.1f}s: ready for traffic.")
+
+
+def mark_failed(error: Exception):
+    """The warm-up cannot complete: readiness (and liveness) probes report it until a restart."""
+    global _status, _finished_at, _error
+    _status, _finished_at, _error = "failed", time.time(), f"{type(error).__name__}: {error}"
+    print(f"Warm-up failed during step {_current_step}: {_error}")
+    traceback.print_exception(error)
+
+
+def warmup_status() -> dict:
+    finished_at = _finished_at or time.time()
+    return {
+        "status": _status,
+        "current_step": _current_step,
+        "steps_done": sum(1 for state in _steps.values() if state["status"] == "done"),
+        "steps_total": len(WARMUP_STEPS),
+        "steps": {step: _steps.get(step, {"status": "pending", "seconds": None}) for step in WARMUP_STEPS},
+        "elapsed_seconds": round(finished_at - _started_at, 3),
+        "error": _error
+    }
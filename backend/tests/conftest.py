@@ -0,0 +1,97 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+# Tests import the backend modules the way the app does (from the backend directory)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FACE_COLOR = (255, 0, 255) # RGB of the faces the fake face_recognition API finds
+
+
+def _magenta_squares(image, number_of_times_to_upsample=1, model="hog"):
+    """Stands in for dlib's detector: every magenta square of at least 8 px is a face."""
+    image = np.asarray(image)
+    mask = ((image[..., 0] > 200) & (image[..., 1] < 60) & (image[..., 2] > 200)).astype(np.uint8)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+    return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h, _ in stats[1:count] if w >= 8 and h >= 8]
+
+
+def _green_level_encodings(image, known_face_locations=None, num_jitters=1, model="small"):
+    """Stands in for dlib's encoder: faces whose `shade`s are 15 or more apart are different people."""
+    encodings = []
+    for top, right, bottom, left in known_face_locations or []:
+        encoding = np.zeros(128)
+        encoding[0] = np.asarray(image)[top:bottom, left:right, 1].mean() / 25.0
+        encodings.append(encoding)
+    return encodings
+
+
+def draw_face(image: np.ndarray, top: int, left: int, size: int = 80, shade: int = 0) -> np.ndarray:
+    """Draws a face of the fake API into an RGB image; `shade` (0-59) picks the person."""
+    image[top:top + size, left:left + size] = (FACE_COLOR[0], shade, FACE_COLOR[2])
+    return image
+
+
+def face_png(shade: int = 0, width: int = 320, height: int = 240) -> bytes:
+    """A PNG with one face of the fake API in it (the colour is the same in RGB and BGR)."""
+    image = draw_face(np.full((height, width, 3), 128, dtype=np.uint8), height // 4, width // 4, shade=shade)
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+@pytest.fixture
+def fake_face_api(monkeypatch):
+    """Replaces the face_recognition models of this process with the magenta-square fakes above."""
+    from recognition import models
+
+    api = SimpleNamespace(
+        face_locations=_magenta_squares, face_encodings=_green_level_encodings,
+        load_image_file=lambda path: cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+    )
+    monkeypatch.setattr(models, "_face_recognition", api)
+    return api
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path, fake_face_api):
+    """
+    A TestClient of the app, ready for traffic, without its lifespan: an in-memory fugitives
+    collection, an empty gallery, no worker pool (jobs run in threads) and uploads in tmp_path.
+    """
+    from fastapi.testclient import TestClient
+
+    import startup
+    from app import app
+    from benchmarks.memory_collection import MemoryCollection
+    from database import job_store, mongo
+    from recognition.artifact_store import artifact_store
+    from recognition.gallery import known_faces
+    from recognition.result_cache import result_cache
+    from routes import fugitive_routes, recognition_routes
+
+    monkeypatch.setattr(mongo, "fugitives_collection", MemoryCollection())
+    monkeypatch.setattr(fugitive_routes, "FUGITIVES_PHOTO_FOLDER", str(tmp_path / "fugitives"))
+    monkeypatch.setattr(recognition_routes, "FUGITIVES_PHOTO_FOLDER", str(tmp_path / "fugitives"))
+    os.makedirs(tmp_path / "temp") # Created on import by config, like the other upload folders
+    monkeypatch.setattr(recognition_routes, "TEMP_FOLDER", str(tmp_path / "temp"))
+    monkeypatch.setattr(recognition_routes, "GALLERY_SNAPSHOT_ENABLED", False)
+    monkeypatch.setattr(startup, "_status", "ready")
+    job_store.connect_job_store(str(tmp_path / "jobs.sqlite3"))
+    known_faces.replace(np.empty((0, 128), dtype=np.float32), [])
+    yield TestClient(app)
+    known_faces.replace(np.empty((0, 128), dtype=np.float32), [])
+    result_cache.clear()
+    artifact_store.clear()
+    job_store.close_job_store()
+
+
+def enroll(client, name: str, shade: int = 0) -> dict:
+    """Adds a fugitive whose photo is face_png(shade); returns the response body."""
+    response = client.post(
+        "/api/fugitives/", data={"name": name, "age": 40, "gender": "unknown"}, files={"file": (f"{name}.png", face_png(shade), "image/png")}
+    )
+    assert response.status_code == 201, response.text
+    return response.json()
@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks import compare, run
+from benchmarks.harness import measure, percentiles
+from benchmarks.synthetic import random_gallery, random_probes
+from recognition.face_matcher import BruteForceIndex
+
+
+def test_percentiles_summarize_latencies():
+    summary = percentiles([float(ms) for ms in range(1, 101)])
+    assert (summary["count"], summary["min_ms"], summary["max_ms"], summary["mean_ms"]) == (100, 1.0, 100.0, 50.5)
+    assert summary["p50_ms"] == 50.5
+    assert percentiles([]) == {"count": 0}
+
+
+def test_measure_times_repeats_after_the_warmup():
+    calls = []
+    result = measure(lambda: calls.append(np.ones(1000)), repeat=5, warmup=2, items_per_call=4, item_name="faces")
+    assert len(calls) == 2 + 5 + 1 # Warm-up, timed calls, one traced call
+    assert result["count"] == 5
+    assert result["faces_per_second"] > 0
+    assert result["peak_traced_bytes"] >= 8000
+
+
+def test_synthetic_probes_match_their_source_rows():
+    gallery = random_gallery(200)
+    probes, sources = random_probes(gallery, 100)
+    indices, _ = BruteForceIndex(gallery).search(probes)
+    enrolled = sources >= 0
+    assert 0 < enrolled.sum() < 100
+    assert (indices[enrolled] == sources[enrolled]).mean() > 0.95
+    assert (indices[~enrolled] == -1).mean() > 0.95
+
+
+def _report(**results):
+    return {"environment": {}, "results": results}
+
+
+def test_compare_flags_slower_latencies_and_lower_throughput():
+    before = _report(gallery={"1000": {"search_1": {"p50_ms": 1.0, "faces_per_second": 1000.0, "count": 50}, "index": "BruteForceIndex"}})
+    after = _report(gallery={"1000": {"search_1": {"p50_ms": 1.5, "faces_per_second": 950.0, "count": 50}, "index": "IVFIndex"}})
+
+    rows = {metric: (change, regressed) for metric, _, _, change, regressed in compare.compare(before, after, threshold=10.0)}
+    assert rows == {
+        "gallery/1000/search_1/faces_per_second": (pytest.approx(-5.0), False),
+        "gallery/1000/search_1/p50_ms": (pytest.approx(50.0), True),
+    }
+
+
+def test_compare_can_fail_on_regressions(tmp_path, capsys):
+    before, after = tmp_path / "before.json", tmp_path / "after.json"
+    before.write_text(json.dumps(_report(encode={"p99_ms": 10.0})))
+    after.write_text(json.dumps(_report(encode={"p99_ms": 20.0})))
+
+    compare.main([str(before), str(after)])
+    assert "1 regression(s)" in capsys.readouterr().out
+    with pytest.raises(SystemExit) as exited:
+        compare.main([str(before), str(after), "--fail-on-regression"])
+    assert exited.value.code == 1
+
+
+def test_run_writes_a_comparable_report(tmp_path, capsys):
+    output = tmp_path / "bench.json"
+    run.main([
+        "--stages", "gallery,quantization,load", "--sizes", "1k", "--queries", "50", "--repeat", "2", "--load-repeat", "1",
+        "--output", str(output)
+    ])
+    report = json.loads(output.read_text())
+
+    assert set(report) == {"environment", "settings", "results", "peak_rss_bytes"}
+    assert report["environment"]["numpy"] == np.__version__
+    gallery = report["results"]["gallery"]["1000"]
+    assert gallery["index"] == "BruteForceIndex"
+    assert gallery["recall_vs_exact"] == 1.0
+    assert set(report["results"]["quantization"]["1000"]) == {"none", "float16", "int8"}
+    assert report["results"]["load"]["1000"]["load_known_faces"]["count"] == 1
+    assert compare.compare(report, report, threshold=10.0) # Every latency and throughput is compared
@@ -0,0 +1,120 @@
+import os
+import time
+
+import numpy as np
+
+from recognition.artifact_store import ArtifactStore, LazyImage
+from recognition.result_cache import ResultCache
+
+
+def _frame(value=0):
+    return np.full((64, 64, 3), value, dtype=np.uint8) # 12 KB raw, a few hundred bytes as JPEG
+
+
+def _lazy(value=0, renders=None):
+    def render(frame):
+        if renders is not None:
+            renders.append(value)
+        return frame
+    return LazyImage(_frame(value), render)
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = ResultCache(max_bytes=100, max_entries=2)
+    cache.put("a", 1, 10)
+    cache.put("b", 2, 10)
+    assert cache.get("a") == 1 # "b" is now the least recently used
+    cache.put("c", 3, 10)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_result_cache_byte_budget_and_ttl():
+    cache = ResultCache(max_bytes=100, max_entries=10, ttl_seconds=0.05)
+    cache.put("too_big", 1, 101)
+    assert cache.get("too_big") is None
+    cache.put("a", 1, 60)
+    cache.put("b", 2, 60)
+    assert cache.get("a") is None and cache.get("b") == 2
+    time.sleep(0.06)
+    assert cache.get("b") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_artifact_store_encodes_before_evicting():
+    renders = []
+    frame_bytes = _frame().nbytes
+    store = ArtifactStore(max_bytes=2 * frame_bytes + 4096, max_entries=10, spill_folder=None, shared_folder=None)
+    for i in range(3):
+        store.put(f"a{i}.jpg", _lazy(i, renders))
+    # Over budget: the least recently used raw frame is encoded instead of anything being dropped
+    assert renders == [0]
+    assert store.stats()["entries"] == 3 and store.stats()["evictions"] == 0
+    assert store.get("a0.jpg")[:2] == b"\xff\xd8"
+
+
+def test_artifact_store_evicts_least_recently_used_beyond_entry_limit():
+    store = ArtifactStore(max_bytes=1 << 30, max_entries=2, spill_folder=None, shared_folder=None)
+    store.put("a.jpg", _lazy())
+    store.put("b.jpg", _lazy())
+    store.get("a.jpg")
+    store.put("c.jpg", _lazy())
+    assert store.get("b.jpg") is None
+    assert store.get("a.jpg") is not None and store.get("c.jpg") is not None
+
+
+def test_artifact_store_spills_evicted_entries(tmp_path):
+    store = ArtifactStore(max_bytes=1 << 30, max_entries=1, spill_folder=str(tmp_path), shared_folder=None)
+    store.put("a.jpg", _lazy())
+    store.put("b.jpg", _lazy())
+    assert store.stats()["spills"] == 1
+    assert store.get("a.jpg")[:2] == b"\xff\xd8"
+    store.clear()
+    assert os.listdir(tmp_path) == []
+
+
+def test_shared_artifacts_are_served_by_other_processes(tmp_path):
+    # Two stores over one folder stand for two worker processes
+    writer = ArtifactStore(spill_folder=None, shared_folder=str(tmp_path))
+    reader = ArtifactStore(spill_folder=None, shared_folder=str(tmp_path))
+    writer.put("a.jpg", _lazy())
+    assert reader.get("a.jpg") == writer.get("a.jpg")
+    assert not any(name.endswith(".tmp") for name in os.listdir(tmp_path))
+
+    writer.discard(["a.jpg"])
+    assert reader.get("a.jpg") is None
+
+
+def test_shared_artifacts_expire(tmp_path):
+    store = ArtifactStore(ttl_seconds=60, spill_folder=None, shared_folder=str(tmp_path))
+    other = ArtifactStore(ttl_seconds=60, spill_folder=None, shared_folder=str(tmp_path))
+    store.put("old.jpg", _lazy())
+    expired = time.time() - 120
+    os.utime(tmp_path / "old.jpg", (expired, expired))
+    assert other.get("old.jpg") is None
+    other.put("new.jpg", _lazy()) # Purges expired files
+    assert os.listdir(tmp_path) == ["new.jpg"]
+
+
+def test_artifact_store_renews_stored_artifacts_only():
+    store = ArtifactStore(ttl_seconds=0.05, spill_folder=None, shared_folder=None)
+    store.put("a.jpg", _lazy())
+    store.put("b.jpg", _lazy())
+    time.sleep(0.03)
+    assert store.renew(["a.jpg"])
+    time.sleep(0.03)
+    assert store.get("a.jpg") is not None # Its TTL restarted with the renewal
+    assert store.get("b.jpg") is None
+    assert not store.renew(["a.jpg", "b.jpg"])
+
+
+def test_shared_artifacts_are_renewed_for_other_processes(tmp_path):
+    store = ArtifactStore(ttl_seconds=60, spill_folder=None, shared_folder=str(tmp_path))
+    other = ArtifactStore(ttl_seconds=60, spill_folder=None, shared_folder=str(tmp_path))
+    store.put("a.jpg", _lazy())
+    almost_expired = time.time() - 50
+    os.utime(tmp_path / "a.jpg", (almost_expired, almost_expired))
+    assert other.renew(["a.jpg"])
+    assert os.path.getmtime(tmp_path / "a.jpg") > almost_expired
+    assert not other.renew(["missing.jpg"])
@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+from metrics import PREFILTER_FRAMES
+from recognition import face_detector
+from tests.conftest import draw_face
+
+
+def _bright_square_detector(image, number_of_times_to_upsample=1, model="hog"):
+    """Stands in for dlib: the bounding box of the bright pixels, if any."""
+    ys, xs = np.nonzero(np.asarray(image)[..., 0] > 200)
+    return [(int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1, int(xs.min()))] if ys.size else []
+
+
+@pytest.fixture
+def frame_with_face(monkeypatch):
+    monkeypatch.setattr(face_detector, "face_recognition_api", lambda: SimpleNamespace(face_locations=_bright_square_detector))
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    frame[200:300, 300:400] = 255
+    return frame
+
+
+def test_detector_min_face_size_follows_upsampling_and_scale():
+    assert face_detector.detector_min_face_size("hog", 0) == 80
+    assert face_detector.detector_min_face_size("hog", 1) == 40
+    assert face_detector.detector_min_face_size("cnn", 1) == 20
+    assert face_detector.detector_min_face_size("hog", 1, scale=0.5) == 80
+
+
+@pytest.mark.skipif(not hasattr(cv2, "CascadeClassifier"), reason="OpenCV build without CascadeClassifier")
+def test_prefilter_keeps_small_faces_in_large_frames(monkeypatch):
+    resized = []
+    real_resize = cv2.resize
+
+    def recording_resize(image, *args, **kwargs):
+        resized.append(real_resize(image, *args, **kwargs))
+        return resized[-1]
+
+    monkeypatch.setattr(face_detector.cv2, "resize", recording_resize)
+    frame = np.zeros((2160, 3840, 3), dtype=np.uint8)
+    face_detector.propose_face_regions(frame, min_face_size=40)
+    # A 40 px face must stay at the cascade's minimum size, so the 4K frame is only halved
+    assert resized[-1].shape[1] == 3840 * face_detector.DETECTION_PREFILTER_MIN_FACE_SIZE // 40
+
+
+def test_prefilter_finds_the_faces_the_detector_finds(monkeypatch, frame_with_face):
+    monkeypatch.setattr(face_detector, "propose_face_regions", lambda image, min_face_size=None: [(150, 450, 350, 250)])
+    expected = face_detector.locate_faces(frame_with_face, prefilter=False)
+    assert expected == [(200, 400, 300, 300)]
+    assert face_detector.locate_faces(frame_with_face, prefilter=True) == expected
+
+
+def test_frames_without_candidates_are_reported_as_filtered(monkeypatch, frame_with_face):
+    monkeypatch.setattr(face_detector, "propose_face_regions", lambda image, min_face_size=None: [])
+    rejected = PREFILTER_FRAMES.value(outcome="rejected")
+    assert face_detector.locate_faces(frame_with_face, prefilter=True) == []
+    assert PREFILTER_FRAMES.value(outcome="rejected") == rejected + 1
+    assert face_detector.prefilter_stats()["frames_rejected"] >= 1
+
+
+
+@pytest.fixture
+def two_faces(fake_face_api):
+    """A 640x480 frame with a face at the top left and one at the bottom right."""
+    frame = np.full((480, 640, 3), 128, dtype=np.uint8)
+    return draw_face(draw_face(frame, 40, 40, size=80), 320, 480, size=120, shade=40)
+
+
+def test_downscaled_detection_is_mapped_back_to_full_resolution(monkeypatch, fake_face_api, two_faces):
+    detected_shapes = []
+    real_face_locations = fake_face_api.face_locations
+    monkeypatch.setattr(fake_face_api, "face_locations", lambda image, **kwargs: detected_shapes.append(image.shape) or real_face_locations(image, **kwargs))
+
+    assert face_detector.locate_faces(two_faces, detection_scale=0.5) == [(40, 120, 120, 40), (320, 600, 440, 480)]
+    assert detected_shapes == [(240, 320, 3)]
+    assert face_detector.locate_faces(two_faces, detection_scale=1.5) == face_detector.locate_faces(two_faces, detection_scale=1.0)
+    assert detected_shapes[1:] == [(480, 640, 3)] * 2 # Scales outside (0, 1) detect at full resolution
+
+
+def test_roi_rectangle_keeps_the_faces_inside_it(two_faces):
+    assert face_detector.locate_faces(two_faces, roi=[400, 300, 240, 180]) == [(320, 600, 440, 480)]
+    assert face_detector.locate_faces(two_faces, roi=[0, 0, 200, 200], detection_scale=0.5) == [(40, 120, 120, 40)]
+    assert face_detector.locate_faces(two_faces, roi=[700, 500, 100, 100]) == [] # Outside the frame
+
+
+def test_roi_mask_keeps_faces_centered_inside_it(two_faces):
+    mask = np.zeros(two_faces.shape[:2], dtype=np.uint8)
+    mask[:, :300] = 1
+    mask[430:, 400:] = 1 # Covers the corner of the second face's box, not its center
+    assert face_detector.locate_faces(two_faces, roi=mask) == [(40, 120, 120, 40)]
+    assert face_detector.locate_faces(two_faces, roi=np.zeros_like(mask)) == []
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import random_gallery, random_probes
+from recognition.face_matcher import BruteForceIndex, FaceIndex, IVFIndex, QuantizedIndex, build_index
+
+
+@pytest.fixture(scope="module")
+def gallery():
+    return random_gallery(5000)
+
+
+@pytest.fixture(scope="module")
+def probes(gallery):
+    return random_probes(gallery, 300)
+
+
+def _recall(index, gallery, probes):
+    """Share of the exact scan's matches that `index` finds too; it must not invent any either."""
+    queries, _ = probes
+    expected, _ = BruteForceIndex(gallery).search(queries)
+    found, _ = index.search(queries)
+    assert np.all(found[expected < 0] == -1)
+    return float(np.mean(found[expected >= 0] == expected[expected >= 0]))
+
+
+def test_face_index_is_abstract():
+    with pytest.raises(TypeError):
+        FaceIndex()
+
+
+def test_brute_force_finds_enrolled_probes(gallery, probes):
+    queries, sources = probes
+    found, _ = BruteForceIndex(gallery).search(queries)
+    assert np.array_equal(found, sources)
+
+
+def test_ivf_recall_matches_brute_force(gallery, probes):
+    index = IVFIndex(gallery, nlist=64, nprobe=8, quantization="none")
+    assert _recall(index, gallery, probes) >= 0.97
+
+
+@pytest.mark.parametrize("quantization", ["float16", "int8"])
+def test_quantized_recall_matches_brute_force(gallery, probes, quantization):
+    assert _recall(QuantizedIndex(gallery, quantization=quantization), gallery, probes) >= 0.99
+
+
+@pytest.mark.parametrize("quantization", ["float16", "int8"])
+def test_quantized_ivf_recall_matches_brute_force(gallery, probes, quantization):
+    index = IVFIndex(gallery, nlist=64, nprobe=8, quantization=quantization)
+    assert _recall(index, gallery, probes) >= 0.97
+
+
+def test_small_galleries_use_brute_force(gallery):
+    assert isinstance(build_index(gallery[:100], min_ann_size=1000), BruteForceIndex)
+    assert isinstance(build_index(gallery, index_type="ivf", min_ann_size=1000, quantization="none"), IVFIndex)
+
+
+def test_ivf_nlist_is_clamped_to_the_training_sample(gallery, probes):
+    index = IVFIndex(gallery, nlist=256, nprobe=8, train_sample_size=100, quantization="none")
+    assert index.nlist == 100
+    assert _recall(index, gallery, probes) >= 0.9
+
+
+def test_ivf_batched_search_matches_single_queries(gallery, probes):
+    queries, _ = probes
+    index = IVFIndex(gallery, nlist=64, nprobe=8, quantization="int8")
+    found, distances = index.search(queries)
+    for q in range(0, queries.shape[0], 37):
+        single_found, single_distances = index.search(queries[q])
+        assert single_found[0] == found[q]
+        assert single_distances[0] == pytest.approx(distances[q])
+
+
+def test_brute_force_decides_on_the_exact_distance():
+    # Large norms make the norm-expanded distance lose its low digits to cancellation
+    known = np.full((3, 128), 40.0, dtype=np.float32)
+    known[1] += 5.0
+    known[2] -= 5.0
+    probe = known[0].copy()
+    probe[0] += 0.599
+    found, distances = BruteForceIndex(known).search(probe, tolerance=0.6)
+    assert found[0] == 0
+    assert distances[0] == pytest.approx(np.linalg.norm(known[0] - probe), rel=1e-6)
@@ -0,0 +1,58 @@
+from recognition.face_tracker import FaceTracker
+
+
+def _faces(*boxes):
+    return [{"box": list(box)} for box in boxes]
+
+
+def _verify_all(tracker, updates, distance=0.3):
+    for track, needs_encoding in updates:
+        if needs_encoding:
+            tracker.verified(track, {"box": track.box, "match": True, "info": {"_id": "f1"}, "distance": distance})
+
+
+def test_moving_face_keeps_its_track():
+    tracker = FaceTracker(iou_threshold=0.3, reverify_interval=10)
+    first = tracker.update(_faces((100, 100, 50, 50)))
+    assert first[0][1] # New track: must be encoded
+    _verify_all(tracker, first)
+
+    second = tracker.update(_faces((105, 102, 50, 50)))
+    assert second[0][0] is first[0][0]
+    assert not second[0][1] # Confident identity carried over
+    assert tracker.carried_result(second[0][0])["box"] == [105, 102, 50, 50]
+    assert tracker.stats()["encoder_calls_saved"] == 1
+
+
+def test_each_detection_gets_its_own_track():
+    tracker = FaceTracker()
+    updates = tracker.update(_faces((0, 0, 50, 50), (200, 0, 50, 50)))
+    _verify_all(tracker, updates)
+    # Listed in the other order: association follows the boxes
+    swapped = tracker.update(_faces((202, 0, 50, 50), (2, 0, 50, 50)))
+    assert swapped[0][0] is updates[1][0] and swapped[1][0] is updates[0][0]
+
+    third = tracker.update(_faces((400, 0, 50, 50)))
+    assert third[0][1] and third[0][0].track_id == 3
+
+
+def test_tracks_expire_after_max_missed_frames():
+    tracker = FaceTracker(max_missed=1)
+    first = tracker.update(_faces((0, 0, 50, 50)))
+    _verify_all(tracker, first)
+    tracker.update([])
+    assert tracker.update(_faces((0, 0, 50, 50)))[0][0] is first[0][0] # Missed once: kept
+    tracker.update([])
+    tracker.update([])
+    assert tracker.update(_faces((0, 0, 50, 50)))[0][0] is not first[0][0]
+
+
+def test_reverification():
+    tracker = FaceTracker(reverify_interval=3, reverify_margin=0.1, tolerance=0.6)
+    updates = tracker.update(_faces((0, 0, 50, 50)))
+    _verify_all(tracker, updates)
+    assert [tracker.update(_faces((0, 0, 50, 50)))[0][1] for _ in range(3)] == [False, False, True]
+
+    uncertain = FaceTracker(reverify_interval=10, reverify_margin=0.1, tolerance=0.6)
+    _verify_all(uncertain, uncertain.update(_faces((0, 0, 50, 50))), distance=0.55)
+    assert uncertain.update(_faces((0, 0, 50, 50)))[0][1] # Too close to the tolerance to carry over
@@ -0,0 +1,166 @@
+import io
+import json
+import os
+import tarfile
+import zipfile
+
+import cv2
+import numpy as np
+import pytest
+
+from database import mongo
+from recognition.gallery import known_faces
+from routes import fugitive_routes
+from tests.conftest import draw_face, enroll, face_png
+
+NO_FACE_PNG = cv2.imencode(".png", np.full((120, 160, 3), 128, dtype=np.uint8))[1].tobytes()
+TWO_FACES_PNG = cv2.imencode(
+    ".png", draw_face(draw_face(np.full((120, 240, 3), 128, dtype=np.uint8), 20, 10, size=60), 20, 150, size=60, shade=40)
+)[1].tobytes()
+
+
+def _zip(files: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _tar(files: dict) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in files.items():
+            member = tarfile.TarInfo(name)
+            member.size = len(data)
+            archive.addfile(member, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def _bulk(client, archive_name: str, archive: bytes, manifest: tuple | None = None):
+    files = {"archive": (archive_name, archive, "application/octet-stream")}
+    if manifest is not None:
+        files["manifest"] = manifest
+    return client.post("/api/fugitives/bulk", files=files)
+
+
+def test_bulk_enrollment_reports_each_failed_record(client, tmp_path):
+    manifest = "\n".join([
+        "photo,name,age,gender",
+        "photos/alice.png,Alice,34,female",
+        "photos/empty.png,Nobody,40,male",
+        "photos/group.png,Group,40,male",
+        "photos/missing.png,Missing,40,male",
+        "photos/bob.png,Bob,forty,male",
+        "photos/notes.txt,Notes,40,male",
+        "photos/carol.png,,29,female",
+        "photos/dave.png,Dave,51,male",
+    ])
+    archive = _zip({
+        "manifest.csv": manifest, "photos/alice.png": face_png(shade=0), "photos/empty.png": NO_FACE_PNG,
+        "photos/group.png": TWO_FACES_PNG, "photos/bob.png": face_png(shade=10), "photos/notes.txt": "not a photo",
+        "photos/carol.png": face_png(shade=20), "photos/dave.png": face_png(shade=30),
+    })
+
+    response = _bulk(client, "photos.zip", archive)
+    assert response.status_code == 201
+    body = response.json()
+    assert (body["records"], body["enrolled"], body["failed"]) == (8, 2, 6)
+    assert [(failure["record"], failure["error"]) for failure in body["failures"]] == [
+        (1, "No face detected in the photo."),
+        (2, "Multiple faces detected."),
+        (3, "Photo not found in archive."),
+        (4, "Age must be an integer."),
+        (5, "Invalid photo type. Only JPG, JPEG, PNG allowed."),
+        (6, "Missing name."),
+    ]
+
+    # Only the enrolled records reach the database, the photo folder and the gallery
+    assert sorted(fugitive["name"] for fugitive in client.get("/api/fugitives/").json()) == ["Alice", "Dave"]
+    assert len(os.listdir(tmp_path / "fugitives")) == 2
+    assert sorted(info["name"] for info in known_faces.snapshot().info) == ["Alice", "Dave"]
+    assert body["gallery_version"] == known_faces.version
+
+
+def test_bulk_enrollment_takes_a_separate_json_manifest_in_batches(client, monkeypatch):
+    monkeypatch.setattr(fugitive_routes, "BULK_ENROLL_BATCH_SIZE", 2)
+    version = known_faces.version
+    records = [{"photo": f"{shade}.png", "name": f"Person {shade}", "age": 30, "gender": "male"} for shade in (0, 10, 20, 30, 40)]
+    archive = _tar({f"{shade}.png": face_png(shade=shade) for shade in (0, 10, 20, 30, 40)})
+
+    response = _bulk(client, "photos.tar.gz", archive, ("people.json", json.dumps({"fugitives": records}), "application/json"))
+    assert response.status_code == 201
+    assert response.json()["enrolled"] == 5
+    assert len(known_faces) == 5
+    assert known_faces.version == version + 1 # One gallery update for the whole import
+
+
+def test_records_the_database_rejects_are_reported(client, tmp_path, monkeypatch):
+    def insert_rejecting_duplicates(documents):
+        rejected = {i: "E11000 duplicate key error" for i, document in enumerate(documents) if document["name"] == "Twin"}
+        mongo.fugitives_collection.insert_many([document for i, document in enumerate(documents) if i not in rejected])
+        return [document["_id"] for i, document in enumerate(documents) if i not in rejected], rejected
+
+    monkeypatch.setattr(fugitive_routes, "insert_fugitives", insert_rejecting_duplicates)
+    manifest = "photo,name,age,gender\na.png,Alice,34,female\nb.png,Twin,34,female\n"
+    response = _bulk(client, "photos.zip", _zip({"manifest.csv": manifest, "a.png": face_png(shade=0), "b.png": face_png(shade=10)}))
+
+    body = response.json()
+    assert body["enrolled"] == 1
+    assert body["failures"] == [
+        {"record": 1, "photo": "b.png", "name": "Twin", "error": "Error saving fugitive to database: E11000 duplicate key error"}
+    ]
+    assert len(os.listdir(tmp_path / "fugitives")) == 1 # The rejected record's photo is removed again
+    assert [info["name"] for info in known_faces.snapshot().info] == ["Alice"]
+
+
+def test_nothing_enrolled_is_not_created(client):
+    manifest = "photo,name,age,gender\nempty.png,Nobody,40,male\n"
+    response = _bulk(client, "photos.zip", _zip({"manifest.csv": manifest, "empty.png": NO_FACE_PNG}))
+    assert response.status_code == 200
+    assert response.json()["enrolled"] == 0
+
+
+@pytest.mark.parametrize("archive_name, archive, detail", [
+    ("photos.zip", _zip({"a.png": b""}), "No manifest uploaded"),
+    ("photos.rar", b"", "Archive must be a .zip, .tar or .tar.gz file."),
+    ("photos.zip", b"not a zip", "File is not a zip file"),
+    ("photos.zip", _zip({"manifest.csv": "photo,name\na.png,Alice\n"}), "CSV manifest is missing columns: age, gender"),
+])
+def test_unusable_uploads_are_rejected(client, archive_name, archive, detail):
+    response = _bulk(client, archive_name, archive)
+    assert response.status_code == 400
+    assert detail in response.json()["detail"]
+
+
+def test_too_many_records_are_rejected(client, monkeypatch):
+    monkeypatch.setattr(fugitive_routes, "BULK_ENROLL_MAX_RECORDS", 1)
+    manifest = "photo,name,age,gender\na.png,Alice,34,female\nb.png,Bob,34,male\n"
+    assert _bulk(client, "photos.zip", _zip({"manifest.csv": manifest})).status_code == 413
+
+
+def _recognized_names(client, shade: int) -> list:
+    response = client.post("/api/recognize/", files={"file": ("probe.png", face_png(shade=shade), "image/png")}, data={"use_cache": "false"})
+    return [face["info"]["name"] for face in response.json()["results"] if face["match"]]
+
+
+def test_deleted_fugitive_is_no_longer_recognized(client, tmp_path):
+    alice = enroll(client, "Alice", shade=0)
+    enroll(client, "Bob", shade=40)
+    assert _recognized_names(client, shade=0) == ["Alice"]
+
+    response = client.delete(f"/api/fugitives/{alice['fugitive_id']}")
+    assert response.status_code == 200
+    assert response.json()["gallery_version"] == known_faces.version
+    assert [info["name"] for info in known_faces.snapshot().info] == ["Bob"]
+    assert not (tmp_path / "fugitives" / alice["photo_filename"]).exists()
+    assert _recognized_names(client, shade=0) == []
+    assert _recognized_names(client, shade=40) == ["Bob"]
+
+
+@pytest.mark.parametrize("fugitive_id", ["0123456789abcdef01234567", "not-an-object-id"])
+def test_deleting_an_unknown_fugitive_is_not_found(client, fugitive_id):
+    enroll(client, "Alice")
+    version = known_faces.version
+    assert client.delete(f"/api/fugitives/{fugitive_id}").status_code == 404
+    assert known_faces.version == version
@@ -0,0 +1,92 @@
+import numpy as np
+
+from benchmarks.synthetic import random_gallery, random_probes
+from recognition.gallery import FaceGallery
+
+
+def _infos(start, count):
+    return [{"_id": f"f{i}", "name": f"Fugitive {i}"} for i in range(start, start + count)]
+
+
+def test_append_is_searchable_and_bumps_the_version():
+    rows = random_gallery(10)
+    gallery = FaceGallery(initial_capacity=4)
+    gallery.replace(rows[:5], _infos(0, 5))
+    version = gallery.version
+    for row in range(5, 10): # Grows past the initial capacity
+        gallery.append(rows[row], _infos(row, 1)[0])
+
+    snapshot = gallery.snapshot()
+    assert len(snapshot) == 10
+    assert snapshot.version == version + 5
+    indices, _ = snapshot.search(rows)
+    assert indices.tolist() == list(range(10))
+
+
+def test_remove_compacts_and_keeps_ids_aligned():
+    rows = random_gallery(6)
+    gallery = FaceGallery()
+    gallery.replace(rows, _infos(0, 6))
+    assert gallery.remove_many(["f1", "f4", "missing"]) == 2
+    assert not gallery.remove("f1")
+
+    snapshot = gallery.snapshot()
+    assert [info["_id"] for info in snapshot.info] == ["f0", "f2", "f3", "f5"]
+    indices, _ = snapshot.search(rows[[0, 1, 5]])
+    assert [snapshot.info[i]["_id"] if i >= 0 else None for i in indices] == ["f0", None, "f5"]
+
+
+def test_snapshots_are_isolated_from_later_writes():
+    rows = random_gallery(4)
+    gallery = FaceGallery(initial_capacity=8)
+    gallery.replace(rows[:2], _infos(0, 2))
+    before = gallery.snapshot()
+    matrix_before = before.matrix.copy()
+
+    gallery.extend(rows[2:], _infos(2, 2)) # Written into spare rows the old snapshot cannot see
+    gallery.remove("f0")
+
+    assert len(before) == 2
+    assert np.array_equal(before.matrix, matrix_before)
+    assert [info["_id"] for info in before.info] == ["f0", "f1"]
+    assert before.search(rows[3:4])[0].tolist() == [-1]
+    assert len(gallery.snapshot()) == 3
+
+
+def test_reindex_swaps_the_index_without_a_new_version():
+    rows = random_gallery(50)
+    gallery = FaceGallery()
+    gallery.replace(rows[:40], _infos(0, 40))
+    gallery.extend(rows[40:], _infos(40, 10))
+    snapshot = gallery.snapshot()
+
+    gallery._reindex(snapshot, gallery._layout)
+
+    reindexed = gallery.snapshot()
+    assert reindexed.version == snapshot.version
+    assert reindexed.index is not snapshot.index
+    assert reindexed.pending_count == 0
+    probes, _ = random_probes(rows, 20)
+    assert np.array_equal(reindexed.search(probes)[0], snapshot.search(probes)[0])
+
+
+def test_appends_after_an_adopted_matrix_go_to_a_tail():
+    rows = random_gallery(30)
+    adopted = rows[:20].copy()
+    adopted.flags.writeable = False # Like a memory-mapped snapshot
+    gallery = FaceGallery(initial_capacity=4)
+    gallery.replace(adopted, _infos(0, 20), adopt=True)
+    for row in range(20, 30):
+        gallery.append(rows[row], _infos(row, 1)[0])
+
+    snapshot = gallery.snapshot()
+    assert np.shares_memory(snapshot.matrix, adopted) # Not copied
+    assert snapshot.tail_matrix.shape[0] == 10 and len(snapshot) == 30
+    assert snapshot.search(rows)[0].tolist() == list(range(30))
+    assert np.array_equal(snapshot.rows()[0], rows)
+
+    gallery.remove("f5")
+    after = gallery.snapshot()
+    assert len(after) == 29 and after.tail_matrix.shape[0] == 0
+    assert [after.info[i]["_id"] for i in after.search(rows[[4, 25]])[0]] == ["f4", "f25"]
+    assert len(snapshot) == 30 # The earlier snapshot still sees the tail it had
@@ -0,0 +1,117 @@
+import functools
+import json
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import random_gallery, random_probes
+from database import mongo
+from recognition import gallery_store
+from recognition.face_matcher import IVFIndex
+from recognition.gallery import FaceGallery, known_faces
+from routes import recognition_routes
+
+
+def _infos(count):
+    return [{"_id": f"{i:024x}", "name": f"Fugitive {i}"} for i in range(count)]
+
+
+@pytest.fixture
+def saved_state(monkeypatch):
+    """save_if_changed() starts from "nothing saved yet" in every test."""
+    monkeypatch.setattr(gallery_store, "_saved_version", None)
+    monkeypatch.setattr(gallery_store, "_saved_index", None)
+
+
+def test_snapshot_round_trip_memory_maps_the_matrix(tmp_path):
+    rows = random_gallery(50)
+    gallery = FaceGallery()
+    snapshot = gallery.replace(rows, _infos(50))
+    gallery_store.save_gallery_snapshot(snapshot, str(tmp_path))
+
+    stored = gallery_store.load_gallery_snapshot(str(tmp_path))
+    assert isinstance(stored["matrix"], np.memmap)
+    assert np.array_equal(stored["matrix"], rows)
+    assert stored["infos"] == _infos(50)
+    assert stored["watermark"] == {"count": 50, "max_id": f"{49:024x}"}
+    assert stored["index"] is None and stored["centroids"] is None # Brute force: rebuilt on load
+
+    restored = FaceGallery()
+    restored.replace(stored["matrix"], stored["infos"], adopt=True)
+    probes, _ = random_probes(rows, 20)
+    assert np.array_equal(restored.snapshot().search(probes)[0], snapshot.search(probes)[0])
+
+
+def test_ivf_layout_is_restored_without_retraining(tmp_path):
+    rows = random_gallery(400)
+    gallery = FaceGallery()
+    snapshot = gallery.replace(rows, _infos(400), index=IVFIndex(rows, nlist=8, quantization="none"))
+    gallery_store.save_gallery_snapshot(snapshot, str(tmp_path))
+
+    stored = gallery_store.load_gallery_snapshot(str(tmp_path))
+    assert np.array_equal(stored["centroids"], snapshot.index.centroids)
+    assert isinstance(stored["index"], IVFIndex)
+    assert np.array_equal(stored["index"].order, snapshot.index.order)
+
+    restored = FaceGallery()
+    restored.replace(stored["matrix"], stored["infos"], adopt=True, centroids=stored["centroids"], index=stored["index"])
+    assert restored.snapshot().index is stored["index"]
+    probes, _ = random_probes(rows, 20)
+    assert np.array_equal(restored.snapshot().search(probes)[0], snapshot.search(probes)[0])
+
+
+def test_saving_replaces_the_previous_snapshot(tmp_path):
+    gallery = FaceGallery()
+    first = gallery_store.save_gallery_snapshot(gallery.replace(random_gallery(5), _infos(5)), str(tmp_path))
+    second = gallery_store.save_gallery_snapshot(gallery.replace(random_gallery(6), _infos(6)), str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ["current.json", f"{second}.json", f"{second}.npy"]
+    assert first != second
+    assert len(gallery_store.load_gallery_snapshot(str(tmp_path))["infos"]) == 6
+
+
+def test_unusable_snapshots_are_ignored(tmp_path):
+    assert gallery_store.load_gallery_snapshot(str(tmp_path)) is None # Nothing saved yet
+
+    gallery = FaceGallery()
+    name = gallery_store.save_gallery_snapshot(gallery.replace(random_gallery(5), _infos(5)), str(tmp_path))
+    metadata_path = tmp_path / f"{name}.json"
+    metadata = json.loads(metadata_path.read_text())
+    metadata_path.write_text(json.dumps({**metadata, "infos": _infos(4)}))
+    assert gallery_store.load_gallery_snapshot(str(tmp_path)) is None # Matrix and metadata disagree
+    metadata_path.write_text(json.dumps({**metadata, "format": gallery_store.SNAPSHOT_FORMAT + 1}))
+    assert gallery_store.load_gallery_snapshot(str(tmp_path)) is None
+
+
+def test_save_if_changed_only_writes_new_versions(tmp_path, saved_state):
+    rows = random_gallery(6)
+    gallery = FaceGallery()
+    assert not gallery_store.save_if_changed(gallery, str(tmp_path)) # Empty galleries are not saved
+    gallery.replace(rows[:5], _infos(5))
+    assert gallery_store.save_if_changed(gallery, str(tmp_path))
+    assert not gallery_store.save_if_changed(gallery, str(tmp_path))
+    gallery.append(rows[5], _infos(6)[5])
+    assert gallery_store.save_if_changed(gallery, str(tmp_path))
+    assert len(gallery_store.load_gallery_snapshot(str(tmp_path))["infos"]) == 6
+
+
+def test_restored_gallery_is_reconciled_with_the_database(client, tmp_path, monkeypatch, saved_state):
+    folder = str(tmp_path / "gallery")
+    os.makedirs(folder)
+    monkeypatch.setattr(recognition_routes, "GALLERY_SNAPSHOT_ENABLED", True)
+    monkeypatch.setattr(recognition_routes, "load_gallery_snapshot", functools.partial(gallery_store.load_gallery_snapshot, folder))
+    monkeypatch.setattr(recognition_routes, "save_if_changed", functools.partial(gallery_store.save_if_changed, folder=folder))
+
+    rows = random_gallery(3)
+    ids = [mongo.insert_fugitive(name, 40, "unknown", f"{name}.png", row) for name, row in zip(("Alice", "Bob", "Carol"), rows)]
+    assert recognition_routes.load_known_faces() # Full load, saved as the local snapshot
+
+    mongo.delete_fugitive(str(ids[1])) # Changes made while the process was down
+    dave = mongo.insert_fugitive("Dave", 40, "unknown", "Dave.png", random_gallery(1, seed=1)[0])
+    known_faces.replace(np.empty((0, 128), dtype=np.float32), [])
+
+    assert recognition_routes.restore_known_faces()
+    assert [info["name"] for info in known_faces.snapshot().info] == ["Alice", "Bob", "Carol"]
+    recognition_routes.reconcile_known_faces()
+    assert sorted(info["name"] for info in known_faces.snapshot().info) == ["Alice", "Carol", "Dave"]
+    assert gallery_store.load_gallery_snapshot(folder)["watermark"] == {"count": 3, "max_id": str(dave)}
@@ -0,0 +1,95 @@
+import threading
+import time
+
+from benchmarks.synthetic import random_gallery
+from recognition import gallery_sync
+from recognition.gallery import FaceGallery
+from recognition.gallery_sync import SharedGalleryStore
+
+
+def _infos(start, count):
+    return [{"_id": f"f{i}", "name": f"Fugitive {i}"} for i in range(start, start + count)]
+
+
+def _join(folder):
+    """A worker process's gallery, joined to the shared store in `folder`."""
+    gallery = FaceGallery(initial_capacity=4)
+    store = SharedGalleryStore(str(folder))
+    gallery.attach_shared_store(store)
+    store.sync(gallery)
+    return gallery, store
+
+
+def test_enrollments_reach_other_processes_without_copying_the_shared_matrix(tmp_path):
+    rows = random_gallery(30)
+    leader, leader_store = _join(tmp_path)
+    assert leader_store.try_become_leader()
+    leader.replace(rows[:20], _infos(0, 20))
+    worker, _ = _join(tmp_path)
+    assert len(worker.refresh()) == 20
+
+    worker.extend(rows[20:25], _infos(20, 5))
+    snapshot = leader.refresh()
+    # The appended rows sit in a per-process tail next to the mapped snapshot matrix
+    assert snapshot.matrix.shape[0] == 20 and not snapshot.matrix.flags.writeable
+    assert snapshot.tail_matrix.shape[0] == 5
+    assert snapshot.search(rows[:25])[0].tolist() == list(range(25))
+
+    assert leader_store.compact_if_needed(leader)
+    compacted = worker.refresh()
+    assert compacted.matrix.shape[0] == 25 and compacted.tail_matrix.shape[0] == 0
+    assert compacted.pending_count == 0
+    assert compacted.search(rows[:25])[0].tolist() == list(range(25))
+
+
+def test_removals_reach_other_processes(tmp_path):
+    rows = random_gallery(10)
+    leader, leader_store = _join(tmp_path)
+    leader_store.try_become_leader()
+    leader.replace(rows, _infos(0, 10))
+    worker, _ = _join(tmp_path)
+    worker.append(rows[0] + 0.001, {"_id": "extra", "name": "Extra"})
+
+    assert leader.remove_many(["f3", "extra"]) == 2
+    snapshot = worker.refresh()
+    assert len(snapshot) == 9
+    assert "f3" not in {info["_id"] for info in snapshot.info}
+    assert snapshot.search(rows[3:4])[0].tolist() == [-1]
+
+
+def test_compaction_does_not_block_other_processes(tmp_path, monkeypatch):
+    rows = random_gallery(5001)
+    leader, leader_store = _join(tmp_path)
+    leader_store.try_become_leader()
+    leader.replace(rows[:4000], _infos(0, 4000))
+    worker, _ = _join(tmp_path)
+    worker.extend(rows[4000:5000], _infos(4000, 1000))
+
+    # Hold the leader's compaction after it started writing the new snapshot
+    writing, resume = threading.Event(), threading.Event()
+    write_gallery_snapshot = gallery_sync.write_gallery_snapshot
+
+    def slow_write(*args, **kwargs):
+        writing.set()
+        resume.wait(10)
+        return write_gallery_snapshot(*args, **kwargs)
+
+    monkeypatch.setattr(gallery_sync, "write_gallery_snapshot", slow_write)
+    compaction = threading.Thread(target=leader_store.compact_if_needed, args=(leader,))
+    compaction.start()
+    assert writing.wait(10)
+
+    started = time.perf_counter()
+    worker.snapshot()
+    worker.append(rows[5000], {"_id": "during", "name": "During"})
+    assert len(worker.refresh()) == 5001
+    assert time.perf_counter() - started < 5
+
+    resume.set()
+    compaction.join()
+    # The write made during the compaction carried over to the new snapshot's journal
+    snapshot = worker.refresh()
+    assert snapshot.matrix.shape[0] == 5000 and snapshot.tail_matrix.shape[0] == 1
+    assert snapshot.search(rows[4999:5001])[0].tolist() == [4999, 5000]
+    assert leader_store.compact_if_needed(leader)
+    assert len(worker.refresh().matrix) == 5001
@@ -0,0 +1,59 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from metrics import track_request
+from recognition.image_source import decode_image_bytes
+from recognition.workers import encode_photo_bytes
+from tests.conftest import draw_face, enroll, face_png
+
+
+@pytest.fixture
+def bgr_image():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, size=(48, 64, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("wrap", [bytes, bytearray, memoryview])
+def test_decodes_from_memory(bgr_image, wrap):
+    data = wrap(cv2.imencode(".png", bgr_image)[1].tobytes())
+    assert np.array_equal(decode_image_bytes(data), bgr_image)
+    assert np.array_equal(decode_image_bytes(data, rgb=True), bgr_image[..., ::-1])
+
+
+@pytest.mark.parametrize("data", [None, b"", b"not an image"])
+def test_undecodable_data_is_none(data):
+    assert decode_image_bytes(data) is None
+
+
+def test_decoding_is_timed_as_a_stage(bgr_image):
+    with track_request("test_decode") as timings:
+        decode_image_bytes(cv2.imencode(".png", bgr_image)[1].tobytes())
+    assert timings["decode"] > 0
+
+
+def test_enrollment_photos_are_decoded_and_encoded_once(fake_face_api):
+    detected_faces, encoding = encode_photo_bytes(face_png(shade=0))
+    assert [face["box"] for face in detected_faces] == [[80, 60, 80, 80]]
+    assert encoding.shape == (128,)
+
+    two_faces = cv2.imencode(".png", draw_face(draw_face(np.full((120, 240, 3), 128, dtype=np.uint8), 20, 10, size=60), 20, 150, size=60))[1]
+    detected_faces, encoding = encode_photo_bytes(two_faces.tobytes())
+    assert (len(detected_faces), encoding) == (2, None)
+    assert encode_photo_bytes(b"not an image") is None
+
+
+def test_uploads_are_not_written_to_disk(client, tmp_path):
+    enroll(client, "Alice")
+    response = client.post("/api/recognize/", files={"file": ("probe.png", face_png(), "image/png")})
+    assert response.status_code == 200
+    assert os.listdir(tmp_path / "temp") == []
+
+    response = client.post(
+        "/api/fugitives/", data={"name": "Broken", "age": 40, "gender": "unknown"}, files={"file": ("broken.png", b"not an image", "image/png")}
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Could not decode the uploaded photo."
+    assert len(os.listdir(tmp_path / "fugitives")) == 1 # Alice's photo only
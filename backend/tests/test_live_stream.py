@@ -0,0 +1,51 @@
+import asyncio
+
+from metrics import LIVE_FRAMES_DROPPED
+from recognition.live_stream import FrameQueue
+
+
+def test_full_queue_drops_the_oldest_frames():
+    async def fill_and_drain():
+        frame_queue = FrameQueue(maxsize=2)
+        for payload in ("a", "b", "c", "d"):
+            frame_queue.put(payload)
+        frame_queue.close()
+        drained = []
+        while (item := await frame_queue.get()) is not None:
+            drained.append(item)
+        return frame_queue, drained
+
+    dropped_before = LIVE_FRAMES_DROPPED.value(reason="queue_full")
+    frame_queue, drained = asyncio.run(fill_and_drain())
+
+    assert [(frame_id, payload) for frame_id, _, payload in drained] == [(2, "c"), (3, "d")]
+    assert frame_queue.received == 4
+    assert frame_queue.dropped == {"queue_full": 2}
+    assert LIVE_FRAMES_DROPPED.value(reason="queue_full") == dropped_before + 2
+
+
+def test_get_waits_for_a_frame_and_ends_once_closed():
+    async def consume():
+        frame_queue = FrameQueue(maxsize=4)
+        consumer = asyncio.create_task(frame_queue.get())
+        await asyncio.sleep(0)
+        assert not consumer.done() # Nothing queued yet
+        frame_queue.put(b"jpeg")
+        first = await consumer
+        frame_queue.close()
+        frame_queue.put(b"late") # Ignored once closed
+        return first, await frame_queue.get()
+
+    (frame_id, _, payload), after_close = asyncio.run(consume())
+    assert (frame_id, payload) == (0, b"jpeg")
+    assert after_close is None
+
+
+def test_close_can_discard_queued_frames():
+    async def close_and_get():
+        frame_queue = FrameQueue(maxsize=4)
+        frame_queue.put("a")
+        frame_queue.close(discard=True)
+        return await frame_queue.get()
+
+    assert asyncio.run(close_and_get()) is None
@@ -0,0 +1,87 @@
+import pytest
+
+import metrics
+from metrics import Counter, Histogram, record_collected, render_metrics, run_collecting, timed_stage, track_request
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Metrics created by a test are registered in a throwaway registry."""
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    return metrics.REGISTRY
+
+
+def test_render_follows_the_text_exposition_format(registry):
+    counter = Counter("test_events_total", "Events seen.", ("kind",))
+    histogram = Histogram("test_duration_seconds", "Durations.", buckets=(0.1, 1.0))
+    counter.inc(kind='say "hi"')
+    counter.inc(2, kind='say "hi"')
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    lines = render_metrics().splitlines()
+    assert lines[:3] == [
+        "# HELP test_events_total Events seen.",
+        "# TYPE test_events_total counter",
+        'test_events_total{kind="say \\"hi\\""} 3',
+    ]
+    assert lines[3:] == [
+        "# HELP test_duration_seconds Durations.",
+        "# TYPE test_duration_seconds histogram",
+        'test_duration_seconds_bucket{le="0.1"} 1',
+        'test_duration_seconds_bucket{le="1.0"} 2',
+        'test_duration_seconds_bucket{le="+Inf"} 3',
+        "test_duration_seconds_sum 5.55",
+        "test_duration_seconds_count 3",
+    ]
+
+
+def test_track_request_collects_stages_and_counts_errors():
+    errors_before = metrics.REQUEST_ERRORS.value(operation="test_failing")
+
+    with track_request("test_ok") as timings:
+        assert metrics.REQUESTS_IN_FLIGHT._values[("test_ok",)] == 1
+        with timed_stage("decode"):
+            pass
+        with timed_stage("decode"):
+            pass
+        breakdown = metrics.request_timings_ms()
+    assert set(timings) == {"decode"}
+    assert set(breakdown) == {"decode", "total"}
+    assert metrics.REQUESTS_IN_FLIGHT._values[("test_ok",)] == 0
+
+    with pytest.raises(RuntimeError):
+        with track_request("test_failing"):
+            raise RuntimeError("boom")
+    assert metrics.REQUEST_ERRORS.value(operation="test_failing") == errors_before + 1
+    assert metrics.REQUESTS_IN_FLIGHT._values[("test_failing",)] == 0
+    assert metrics.request_timings_ms() == {} # Outside any request
+
+
+def test_worker_counts_and_stages_are_recorded_by_the_caller():
+    def job():
+        metrics.FACES_PROCESSED.inc(3, operation="test_worker")
+        metrics.record_stage("detect", 0.25)
+        return "done"
+
+    result, collected = run_collecting(job)
+    assert result == "done"
+    assert metrics.FACES_PROCESSED.value(operation="test_worker") == 0 # Deferred, not recorded in the "worker"
+
+    with track_request("test_worker") as timings:
+        record_collected(collected)
+    assert metrics.FACES_PROCESSED.value(operation="test_worker") == 3
+    assert timings == {"detect": 0.25}
+
+
+def test_metrics_endpoint_serves_the_registry():
+    from fastapi.testclient import TestClient
+
+    from app import app
+
+    response = TestClient(app).get("/api/metrics") # Available during the warm-up too
+    assert response.status_code == 200
+    assert response.headers["content-type"] == metrics.CONTENT_TYPE
+    assert "# TYPE recognition_stage_seconds histogram" in response.text
+    assert "# TYPE recognition_gallery_size gauge" in response.text
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from benchmarks.memory_collection import MemoryCollection
+from benchmarks.synthetic import random_gallery
+from database import mongo
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = MemoryCollection()
+    monkeypatch.setattr(mongo, "fugitives_collection", collection)
+    return collection
+
+
+def _insert(collection, embedding, legacy=False):
+    document = mongo.fugitive_document("Someone", 40, "female", "photo.jpg", embedding)
+    if legacy:
+        document["embedding"] = [float(value) for value in embedding] # BSON array of doubles
+    return collection.insert_one(document).inserted_id
+
+
+def test_load_migrates_legacy_array_embeddings(collection):
+    embeddings = random_gallery(5)
+    ids = [_insert(collection, embedding, legacy=i % 2 == 0) for i, embedding in enumerate(embeddings)]
+
+    fugitives, matrix = mongo.load_fugitive_embeddings(batch_size=2)
+    assert [doc["_id"] for doc in fugitives] == ids
+    assert all("embedding" not in doc for doc in fugitives)
+    assert matrix.dtype == np.float32 and np.array_equal(matrix, embeddings)
+
+    stored = [collection.find_one({"_id": _id})["embedding"] for _id in ids]
+    assert all(isinstance(embedding, bytes) for embedding in stored)
+    assert np.array_equal(np.stack([mongo.decode_embedding(embedding) for embedding in stored]), embeddings)
+
+    # Nothing left to migrate: a second load reads the packed form
+    _, reloaded = mongo.load_fugitive_embeddings()
+    assert np.array_equal(reloaded, embeddings)
+
+
+def test_load_grows_past_the_estimated_count(collection, monkeypatch):
+    embeddings = random_gallery(4)
+    for embedding in embeddings:
+        _insert(collection, embedding)
+    monkeypatch.setattr(collection, "estimated_document_count", lambda: 1) # Stale metadata
+    _, matrix = mongo.load_fugitive_embeddings()
+    assert np.array_equal(matrix, embeddings)
+
+
+def test_load_only_requested_ids(collection):
+    embeddings = random_gallery(3)
+    ids = [_insert(collection, embedding) for embedding in embeddings]
+    fugitives, matrix = mongo.load_fugitive_embeddings(ids=[str(ids[2])])
+    assert [doc["_id"] for doc in fugitives] == [ids[2]]
+    assert np.array_equal(matrix, embeddings[2:])
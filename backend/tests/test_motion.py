@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_video
+from config import MOTION_DENSE_FRAME_INTERVAL
+from recognition.motion import PROCESS, SKIP, SPIKE, MotionGate
+from recognition.video_source import VideoFrameSampler
+
+
+def _gray(level: int, width: int = 160, height: int = 120) -> np.ndarray:
+    return np.full((height, width, 3), level, dtype=np.uint8)
+
+
+def test_static_frames_are_skipped_up_to_max_skipped():
+    gate = MotionGate(threshold=2.0, spike_threshold=50.0, max_skipped=3)
+    decisions = [gate.check(_gray(100)) for _ in range(6)]
+    assert decisions == [PROCESS, SKIP, SKIP, SKIP, PROCESS, SKIP]
+    assert gate.stats() == {"frames_checked": 6, "frames_skipped_static": 4, "motion_spikes": 0}
+
+
+def test_slow_drift_is_measured_against_the_last_processed_frame():
+    gate = MotionGate(threshold=2.0, spike_threshold=50.0)
+    assert [gate.check(_gray(level)) for level in (100, 101, 102, 103, 104)] == [PROCESS, SKIP, PROCESS, SKIP, PROCESS]
+
+
+def test_large_changes_are_spikes():
+    gate = MotionGate(threshold=2.0, spike_threshold=50.0)
+    assert [gate.check(_gray(level)) for level in (0, 30, 200)] == [PROCESS, PROCESS, SPIKE]
+    assert gate.motion_spikes == 1
+
+
+def test_a_new_frame_shape_starts_over():
+    gate = MotionGate()
+    assert gate.check(_gray(100)) == PROCESS
+    assert gate.check(_gray(100, width=160, height=160)) == PROCESS # Another aspect ratio
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    # 100 frames at 10 fps: a still scene for the first half, then a panning face
+    face = np.full((64, 64, 3), 200, dtype=np.uint8)
+    return synthetic_video(str(tmp_path_factory.mktemp("video") / "clip.avi"), width=160, height=120, fps=10.0, seconds=10.0, face=face)
+
+
+def _sample(video, frame_interval: int, motion_gate: MotionGate) -> tuple[list, dict]:
+    sampler = VideoFrameSampler(video, frame_interval=frame_interval, interval_ms=None, motion_gate=motion_gate)
+    try:
+        return [frame_index for frame_index, _, _ in sampler], sampler.stats()
+    finally:
+        sampler.close()
+
+
+def test_sampler_drops_the_still_part_of_a_video(video):
+    frames, stats = _sample(video, 1, MotionGate(threshold=2.0, spike_threshold=1000.0, max_skipped=10))
+    still = [frame_index for frame_index in frames if frame_index < 50]
+    assert still == [0, 11, 22, 33, 44] # Only every (max_skipped + 1)-th frame of a static scene
+    assert len(frames) - len(still) > len(still)
+    assert stats["frames_checked"] == 100
+    assert stats["frames_skipped_static"] == 100 - len(frames)
+
+
+def test_motion_spikes_switch_to_dense_sampling(video):
+    sparse, _ = _sample(video, 30, MotionGate(threshold=0.0, spike_threshold=1000.0))
+    dense, stats = _sample(video, 30, MotionGate(threshold=0.0, spike_threshold=1.0))
+    assert sparse == [0, 30, 60, 90]
+    assert stats["motion_spikes"] >= 1
+    assert set(sparse) < set(dense)
+    assert all(frame_index % MOTION_DENSE_FRAME_INTERVAL == 0 for frame_index in dense)
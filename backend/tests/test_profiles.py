@@ -0,0 +1,53 @@
+import pytest
+
+from config import RECOGNITION_PROFILE, RECOGNITION_PROFILES
+from recognition.profiles import profile_detection_options, profile_settings_key, resolve_profile
+from tests.conftest import enroll, face_png
+
+
+def test_default_profile_is_resolved_with_its_name():
+    profile = resolve_profile()
+    assert profile == {"name": RECOGNITION_PROFILE, **RECOGNITION_PROFILES[RECOGNITION_PROFILE]}
+
+
+def test_detection_scale_overrides_the_profile():
+    profile = resolve_profile("accurate", detection_scale=0.5)
+    assert profile["detection_scale"] == 0.5
+    assert profile_detection_options(profile)["detection_model"] == "cnn"
+    assert RECOGNITION_PROFILES["accurate"]["detection_scale"] == 1.0 # The configured profile is left alone
+    assert profile_settings_key(profile) != profile_settings_key(resolve_profile("accurate"))
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match="Unknown profile: turbo"):
+        resolve_profile("turbo")
+
+
+@pytest.fixture
+def enrolled(client):
+    enroll(client, "someone", shade=50) # Recognition needs a non-empty gallery
+    return client
+
+
+def _recognize(client, **form):
+    return client.post("/api/recognize/", files={"file": ("face.png", face_png(), "image/png")}, data=form)
+
+
+def test_recognize_reports_the_effective_profile(enrolled):
+    response = _recognize(enrolled, profile="fast", detection_scale="0.5")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["profile"]["name"] == "fast"
+    assert body["profile"]["detection_scale"] == 0.5
+    assert len(body["results"]) == 1
+
+
+def test_profiles_do_not_share_cached_results(enrolled):
+    assert _recognize(enrolled, profile="fast").json()["cache"] == "miss"
+    assert _recognize(enrolled, profile="fast").json()["cache"] == "result"
+    assert _recognize(enrolled, profile="accurate").json()["cache"] == "miss"
+
+
+@pytest.mark.parametrize("form", [{"profile": "turbo"}, {"detection_scale": "0"}, {"detection_scale": "1.5"}])
+def test_invalid_profile_settings_are_rejected(enrolled, form):
+    assert _recognize(enrolled, **form).status_code == 400
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+import app as app_module
+import startup
+
+
+@pytest.fixture
+def starting(client, monkeypatch):
+    """The app as it is while warming up; startup's module state is restored afterwards."""
+    for name, value in (("_status", "starting"), ("_steps", {}), ("_current_step", None), ("_finished_at", None), ("_error", None)):
+        monkeypatch.setattr(startup, name, value)
+    return client
+
+
+def test_api_calls_get_503_until_the_warm_up_is_done(starting):
+    response = starting.get("/api/fugitives/")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
+    assert response.json()["warmup"]["status"] == "starting"
+    assert starting.get("/api/health/ready").status_code == 503
+
+    startup.mark_ready()
+    assert starting.get("/api/fugitives/").status_code == 200
+    assert starting.get("/api/health/ready").json()["status"] == "ready"
+
+
+@pytest.mark.parametrize("path", ["/api/health/live", "/api/status", "/api/metrics"])
+def test_probes_and_monitoring_are_available_while_warming_up(starting, path):
+    assert starting.get(path).status_code == 200
+
+
+def test_live_streams_are_refused_while_warming_up(starting):
+    from starlette.websockets import WebSocketDisconnect
+
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with starting.websocket_connect("/api/recognize/live"):
+            pass
+    assert closed.value.code == 1013
+
+
+def _stub_warm_up_steps(monkeypatch, failing_step=None):
+    def step(name):
+        def run(*args, **kwargs):
+            if name == failing_step:
+                raise RuntimeError(f"{name} unavailable")
+        return run
+
+    async def warm_up_workers():
+        step("warm_up_workers")()
+
+    async def start_job_scheduler():
+        step("start_job_scheduler")()
+
+    for name in ("connect_db", "load_gallery", "start_worker_pool"):
+        monkeypatch.setattr(app_module, name, step(name))
+    monkeypatch.setattr(app_module, "warm_up_workers", warm_up_workers)
+    monkeypatch.setattr(app_module, "start_job_scheduler", start_job_scheduler)
+
+
+def test_warm_up_runs_every_step_then_marks_ready(starting, monkeypatch):
+    _stub_warm_up_steps(monkeypatch)
+    asyncio.run(app_module.warm_up())
+
+    assert startup.is_ready()
+    status = startup.warmup_status()
+    assert status["steps_done"] == status["steps_total"]
+    assert all(step["status"] == "done" for step in status["steps"].values())
+
+
+def test_failed_warm_up_fails_the_liveness_probe(starting, monkeypatch):
+    _stub_warm_up_steps(monkeypatch, failing_step="load_gallery")
+    asyncio.run(app_module.warm_up())
+
+    status = startup.warmup_status()
+    assert status["status"] == "failed"
+    assert status["steps"]["gallery"]["status"] == "failed"
+    assert status["steps"]["worker_pool"]["status"] == "pending"
+    assert status["error"] == "RuntimeError: load_gallery unavailable"
+    assert starting.get("/api/health/live").status_code == 503
+    assert starting.get("/api/fugitives/").json()["detail"] == "Service failed to start."
@@ -0,0 +1,204 @@
+import io
+import json
+import os
+import zipfile
+
+import cv2
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_video
+from recognition.artifact_store import artifact_store
+from routes import recognition_routes
+from tests.conftest import FACE_COLOR, enroll, face_png
+
+
+@pytest.fixture
+def fugitives(client):
+    """Alice and Bob enrolled; returns their ids by name."""
+    return {name: enroll(client, name, shade=shade)["fugitive_id"] for name, shade in (("Alice", 0), ("Bob", 40))}
+
+
+def _face_bmp(shade: int) -> bytes:
+    return cv2.imencode(".bmp", cv2.imdecode(np.frombuffer(face_png(shade=shade), dtype=np.uint8), cv2.IMREAD_COLOR))[1].tobytes()
+
+
+def _zip(files: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _batch(client, files: list, **form):
+    return client.post("/api/recognize/batch", files=[("files", file) for file in files], data=form)
+
+
+def test_batch_recognizes_images_and_archive_members(client, fugitives):
+    files = [
+        ("alice.png", face_png(shade=0), "image/png"),
+        ("broken.png", b"not an image", "image/png"),
+        ("more.zip", _zip({"bob.png": face_png(shade=40), "stranger.png": face_png(shade=20), "notes.txt": "skipped"}), "application/zip"),
+    ]
+    response = _batch(client, files)
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["images"], body["faces_detected"], body["faces_matched"], body["cached_images"]) == (4, 3, 2, 0)
+    assert set(body["fugitives"]) == {fugitives["Alice"], fugitives["Bob"]}
+
+    results = {result["filename"]: result for result in body["results"]}
+    assert results["broken.png"] == {"filename": "broken.png", "error": "Could not decode or process image."}
+    assert [face["fugitive_id"] for face in results["alice.png"]["faces"]] == [fugitives["Alice"]]
+    assert [face["fugitive_id"] for face in results["bob.png"]["faces"]] == [fugitives["Bob"]]
+    assert [face["fugitive_id"] for face in results["stranger.png"]["faces"]] == [None]
+
+    # A second submission reuses the cached encodings of every image that could be processed
+    assert _batch(client, files).json()["cached_images"] == 3
+
+
+def test_identical_images_are_encoded_once(client, fugitives, fake_face_api, monkeypatch):
+    detected = []
+    real_face_locations = fake_face_api.face_locations
+    monkeypatch.setattr(fake_face_api, "face_locations", lambda image, **kwargs: detected.append(image) or real_face_locations(image, **kwargs))
+
+    body = _batch(client, [(f"copy{i}.png", face_png(shade=0), "image/png") for i in range(3)], use_cache="false").json()
+    assert body["faces_matched"] == 3
+    assert len(detected) == 1
+
+
+@pytest.mark.parametrize("limit, value", [("BATCH_MAX_IMAGES", 2), ("BATCH_MAX_BYTES", 500_000), ("BATCH_MAX_UPLOAD_BYTES", 500_000)])
+def test_batches_over_the_limits_are_too_large(client, fugitives, monkeypatch, limit, value):
+    monkeypatch.setattr(recognition_routes, limit, value)
+    # Three 230 KB bitmaps, deflated into a small archive: its expanded size is what counts
+    images = {f"{shade}.bmp": _face_bmp(shade=shade) for shade in (0, 20, 40)}
+    archive = _zip(images)
+    assert len(archive) < 500_000 < sum(len(data) for data in images.values())
+
+    if limit == "BATCH_MAX_UPLOAD_BYTES":
+        response = _batch(client, [(name, data, "image/bmp") for name, data in images.items()])
+    else:
+        response = _batch(client, [("faces.zip", archive, "application/zip")])
+    assert response.status_code == 413
+    assert "limit" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("files, detail", [
+    ([("faces.zip", b"not a zip", "application/zip")], "Could not read archive"),
+    ([("faces.zip", _zip({"notes.txt": "no images"}), "application/zip")], "No images found in the upload."),
+])
+def test_unusable_batches_are_rejected(client, fugitives, files, detail):
+    response = _batch(client, files)
+    assert response.status_code == 400
+    assert detail in response.json()["detail"]
+
+
+def _recognize(client, shade: int = 0, **form):
+    return client.post("/api/recognize/", files={"file": ("probe.png", face_png(shade=shade), "image/png")}, data=form).json()
+
+
+def test_repeated_uploads_reuse_the_cached_result(client, fugitives):
+    first = _recognize(client)
+    second = _recognize(client)
+    assert (first["cache"], second["cache"]) == ("miss", "result")
+    assert second["annotated_image_url"] == first["annotated_image_url"]
+    assert second["results"] == first["results"]
+    annotated = client.get(second["annotated_image_url"])
+    assert annotated.status_code == 200
+    assert annotated.headers["content-type"] == "image/jpeg"
+
+    assert _recognize(client, use_cache="false")["cache"] == "miss"
+
+
+def test_gallery_changes_only_rerun_matching(client, fugitives):
+    assert [face["match"] for face in _recognize(client, shade=20)["results"]] == [False]
+    enroll(client, "Carol", shade=20)
+
+    response = _recognize(client, shade=20)
+    assert response["cache"] == "encodings"
+    assert [face["info"]["name"] for face in response["results"]] == ["Carol"]
+
+
+def test_results_whose_annotated_image_is_gone_are_recomputed(client, fugitives):
+    first = _recognize(client)
+    artifact_store.clear() # e.g. evicted or expired
+    assert client.get(first["annotated_image_url"]).status_code == 404
+
+    second = _recognize(client)
+    assert second["cache"] == "encodings" # The cached result cannot be served without its image
+    assert client.get(second["annotated_image_url"]).status_code == 200
+
+
+def test_faces_outside_the_roi_are_ignored(client, fugitives):
+    assert len(_recognize(client, roi="60,40,120,120")["results"]) == 1
+    response = _recognize(client, roi="200,0,120,240")
+    assert response["results"] == []
+    assert response["message"] == "No faces detected in image."
+
+
+@pytest.mark.parametrize("roi", ["1,2,3", "a,b,c,d", "0,0,0,10"])
+def test_invalid_rois_are_rejected(client, fugitives, roi):
+    response = client.post("/api/recognize/", files={"file": ("probe.png", face_png(), "image/png")}, data={"roi": roi})
+    assert response.status_code == 400
+
+
+def _stream(client, name: str, data: bytes, content_type: str, **form):
+    return client.post("/api/recognize/stream", files={"file": (name, data, content_type)}, data=form)
+
+
+def _sse_events(text: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in text.strip().split("\n\n"):
+        name_line, data_line = block.split("\n")
+        assert name_line.startswith("event: ") and data_line.startswith("data: ")
+        events.append((name_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return events
+
+
+def test_image_results_are_streamed_as_ndjson(client, fugitives):
+    response = _stream(client, "probe.png", face_png(shade=0), "image/png")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    frame, done = [json.loads(line) for line in response.text.splitlines()]
+    assert frame["event"] == "frame"
+    assert [face["info"]["name"] for face in frame["faces"]] == ["Alice"]
+    assert done["event"] == "done"
+    assert done["frames_processed"] == 1
+
+
+def test_video_frames_are_streamed_as_server_sent_events(client, fugitives, tmp_path):
+    face = np.full((64, 64, 3), FACE_COLOR, dtype=np.uint8) # Magenta reads the same in BGR
+    video_path = synthetic_video(str(tmp_path / "clip.avi"), width=320, height=240, fps=10.0, seconds=2.0, face=face)
+    with open(video_path, "rb") as video_file:
+        video = video_file.read()
+
+    response = _stream(
+        client, "clip.avi", video, "video/x-msvideo", format="sse", sample_interval_ms="200", tracking="false", motion_gating="false"
+    )
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _sse_events(response.text)
+
+    assert events[0][0] == "video_info"
+    frames = [data for name, data in events[1:-1]]
+    assert [name for name, _ in events[1:-1]] == ["frame"] * len(frames)
+    assert len(frames) == events[0][1]["expected_frames"] == 10
+    assert [data["timestamp_ms"] for data in frames] == sorted(data["timestamp_ms"] for data in frames)
+    assert all([face["info"]["name"] for face in data["faces"] if face["match"]] == ["Alice"] for data in frames)
+    assert events[-1][0] == "done"
+    assert events[-1][1]["frames_processed"] == len(frames)
+    assert os.listdir(tmp_path / "temp") == [] # The uploaded video is removed once streamed
+
+
+def test_undecodable_images_end_the_stream_with_an_error(client, fugitives):
+    events = [json.loads(line) for line in _stream(client, "broken.png", b"not an image", "image/png").text.splitlines()]
+    assert [event["event"] for event in events] == ["error"]
+
+
+@pytest.mark.parametrize("content_type, form, status_code", [
+    ("text/plain", {}, 400),
+    ("image/png", {"format": "xml"}, 422),
+    ("video/mp4", {"sample_interval_ms": "0"}, 422),
+])
+def test_invalid_stream_requests_are_rejected(client, fugitives, content_type, form, status_code):
+    assert _stream(client, "probe.png", face_png(), content_type, **form).status_code == status_code
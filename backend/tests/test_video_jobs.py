@@ -0,0 +1,158 @@
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_video
+from database import job_store
+from recognition import video_jobs
+from recognition.gallery import FaceGallery
+from recognition.video_source import VideoFrameSampler
+
+
+SAMPLE_INTERVAL_MS = 50.0 # Every frame of the 10 fps test clip
+
+
+@pytest.fixture
+def store(tmp_path):
+    job_store.connect_job_store(str(tmp_path / "jobs.db"))
+    yield
+    job_store.close_job_store()
+
+
+@pytest.fixture
+def video(tmp_path):
+    return synthetic_video(str(tmp_path / "clip.avi"), width=160, height=120, fps=10.0, seconds=2.0, num_faces=0)
+
+
+def _frame_count(video_path):
+    sampler = VideoFrameSampler(video_path)
+    try:
+        return sampler.frame_count
+    finally:
+        sampler.close()
+
+
+def _create(job_id, video_path="missing.avi"):
+    return job_store.create_job(job_id, "clip.avi", video_path, SAMPLE_INTERVAL_MS)
+
+
+def test_only_one_owner_claims_a_job(store):
+    _create("a")
+    assert job_store.claim_job("a", "owner-1", 30)
+    assert not job_store.claim_job("a", "owner-2", 30)
+    assert job_store.get_job("a")["owner"] == "owner-1"
+
+
+def test_requeue_only_takes_expired_leases(store):
+    _create("alive")
+    _create("dead")
+    job_store.claim_job("alive", "owner-1", 30)
+    job_store.claim_job("dead", "owner-2", -1) # Lease already expired: its owner stopped renewing
+    assert job_store.requeue_expired_jobs() == ["dead"]
+    assert job_store.get_job("alive")["status"] == "running"
+    assert job_store.get_job("dead")["status"] == "queued"
+    assert job_store.get_job("dead")["owner"] is None
+
+
+def test_frame_results_require_the_owner(store):
+    _create("a")
+    job_store.claim_job("a", "owner-1", 30)
+    assert not job_store.append_frame_result("a", "owner-2", 0, 0.0, [], None)
+    assert job_store.append_frame_result("a", "owner-1", 0, 0.0, [], None)
+    assert job_store.get_job("a")["frames_done"] == 1
+    assert len(job_store.get_frame_results("a")) == 1
+
+
+def test_cancel_queued_and_running_jobs(store):
+    _create("queued")
+    _create("running")
+    job_store.claim_job("running", "owner-1", 30)
+    assert job_store.request_job_cancel("queued") == "cancelled"
+    assert job_store.request_job_cancel("running") == "cancel_requested"
+    assert job_store.get_job("running")["status"] == "running"
+    assert job_store.renew_job_lease("running", "owner-1", 30)["cancel_requested"]
+    assert job_store.request_job_cancel("missing") is None
+
+
+async def _fake_results(gallery, sampler, tracker=None, delay=0.0):
+    for frame_index, timestamp_ms, frame in sampler:
+        await asyncio.sleep(delay)
+        yield frame_index, timestamp_ms, frame, [], np.zeros((0, 128))
+
+
+def _use_fake_recognition(monkeypatch, delay=0.0):
+    gallery = FaceGallery()
+    gallery.append(np.zeros(128, dtype=np.float32), {"_id": "f1", "name": "Someone"})
+    monkeypatch.setattr(video_jobs, "known_faces", gallery)
+    monkeypatch.setattr(video_jobs, "iter_video_results", lambda gallery, sampler, tracker=None: _fake_results(gallery, sampler, tracker, delay))
+    monkeypatch.setattr(video_jobs, "MOTION_GATING_ENABLED", False) # Every sampled frame reaches recognition
+    monkeypatch.setattr(video_jobs, "JOB_HEARTBEAT_INTERVAL", 0.02)
+    monkeypatch.setattr(video_jobs, "JOB_POLL_INTERVAL", 0.02)
+
+
+async def _wait_for_status(job_id, statuses, timeout=10.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        job = job_store.get_job(job_id)
+        if job["status"] in statuses:
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"Job {job_id} still {job_store.get_job(job_id)['status']}")
+
+
+def _stored_results(tmp_path, job_id):
+    job_store.connect_job_store(str(tmp_path / "jobs.db"))
+    try:
+        return job_store.get_frame_results(job_id)
+    finally:
+        job_store.close_job_store()
+
+
+def test_interrupted_job_resumes_after_last_stored_frame(tmp_path, video, monkeypatch):
+    _use_fake_recognition(monkeypatch)
+    expected = _frame_count(video)
+    job_store.connect_job_store(str(tmp_path / "jobs.db"))
+    _create("resume", video)
+    # A process that died after storing two frames, its lease long expired
+    job_store.claim_job("resume", "dead-owner", -1)
+    job_store.append_frame_result("resume", "dead-owner", 0, 0.0, [], None)
+    job_store.append_frame_result("resume", "dead-owner", 1, 100.0, [], None)
+
+    async def run():
+        await video_jobs.start_job_scheduler(num_runners=1)
+        try:
+            return await _wait_for_status("resume", ("completed", "failed"))
+        finally:
+            await video_jobs.stop_job_scheduler()
+
+    job = asyncio.run(run())
+    assert job["status"] == "completed"
+    results = [result["frame_index"] for result in _stored_results(tmp_path, "resume")]
+    assert results == sorted(set(results)) # Nothing processed twice
+    assert results == list(range(expected))
+    assert not os.path.exists(video)
+
+
+def test_cancel_request_stops_a_running_job(tmp_path, video, monkeypatch):
+    _use_fake_recognition(monkeypatch, delay=0.05)
+    job_store.connect_job_store(str(tmp_path / "jobs.db"))
+
+    async def run():
+        await video_jobs.start_job_scheduler(num_runners=1)
+        try:
+            video_jobs.submit_job("cancel", "clip.avi", video, SAMPLE_INTERVAL_MS)
+            await _wait_for_status("cancel", ("running",))
+            # As another worker process would: only through the job store
+            assert job_store.request_job_cancel("cancel") == "cancel_requested"
+            return await _wait_for_status("cancel", ("cancelled", "completed", "failed"))
+        finally:
+            await video_jobs.stop_job_scheduler()
+
+    expected = _frame_count(video)
+    job = asyncio.run(run())
+    assert job["status"] == "cancelled"
+    assert job["frames_done"] < expected
+    assert not os.path.exists(video)
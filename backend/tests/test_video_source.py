@@ -0,0 +1,39 @@
+import pytest
+
+from benchmarks.synthetic import synthetic_video
+from recognition.video_source import VideoFrameSampler
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    # 100 frames at 10 fps
+    return synthetic_video(str(tmp_path_factory.mktemp("video") / "clip.avi"), width=160, height=120, fps=10.0, seconds=10.0, num_faces=0)
+
+
+def _sample(video, **options):
+    sampler = VideoFrameSampler(video, **options)
+    try:
+        return [frame_index for frame_index, _, _ in sampler], sampler
+    finally:
+        sampler.close()
+
+
+def test_samples_every_frame_interval(video):
+    frames, sampler = _sample(video, frame_interval=30, interval_ms=None)
+    assert frames == [0, 30, 60, 90]
+    assert sampler.expected_samples() == len(frames)
+    assert sampler.stats()["frames_decoded"] == 100
+    assert sampler.stats()["frames_sampled"] == 4
+
+
+def test_samples_by_video_time(video):
+    frames, sampler = _sample(video, interval_ms=1000)
+    assert len(frames) == sampler.expected_samples() == 10
+    assert frames[0] == 0 and all(9 <= b - a <= 11 for a, b in zip(frames, frames[1:]))
+
+
+def test_resumes_from_start_frame(video):
+    frames, sampler = _sample(video, frame_interval=30, interval_ms=None, start_frame=31)
+    assert frames == [60, 90]
+    assert sampler.expected_samples() == 2
+    assert sampler.stats()["frames_decoded"] == 69
@@ -0,0 +1,59 @@
+import asyncio
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+pytest.importorskip("face_recognition")
+
+from metrics import track_request
+from recognition import workers
+
+
+@pytest.fixture(scope="module")
+def pool():
+    workers.start_worker_pool(1)
+    asyncio.run(workers.warm_up_workers())
+    yield
+    workers.shutdown_worker_pool()
+
+
+def _frame():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, size=(120, 160, 3), dtype=np.uint8)
+
+
+def test_shared_frame_round_trip_matches_in_process_encoding(pool):
+    frame = _frame()
+    locations = [(10, 70, 70, 10), (40, 150, 110, 80)]
+    expected = workers._encode_job(frame, locations)
+
+    async def encode_in_pool():
+        async with workers.SharedFrame(frame) as shared_frame:
+            assert shared_frame._shm is not None # Read by the worker from shared memory, not pickled
+            return shared_frame._shm.name, await shared_frame.encode(locations)
+
+    shm_name, encodings = asyncio.run(encode_in_pool())
+    assert encodings.shape == (2, workers.ENCODING_DIMENSIONS)
+    assert np.array_equal(encodings, expected)
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=shm_name) # Released on exit
+
+
+def test_bgr_frames_are_converted_once_into_shared_memory(pool):
+    frame = _frame()
+
+    async def convert():
+        async with workers.SharedFrame(frame, is_bgr=True) as shared_frame:
+            return shared_frame.rgb.copy()
+
+    assert np.array_equal(asyncio.run(convert()), frame[..., ::-1])
+
+
+def test_worker_stage_timings_reach_the_request_breakdown(pool):
+    async def encode():
+        with track_request("test_encode") as timings:
+            await workers.run_in_worker(workers._encode_job, _frame(), [(10, 70, 70, 10)])
+        return timings
+
+    assert asyncio.run(encode())["encode"] > 0